@@ -18,6 +18,12 @@ PARTITION BY toYYYYMM(ts)
 ORDER BY (ts)
 SETTINGS index_granularity = 8192;
 
+-- 1s / 1m / 1h rollup tiers of dealer_flow_metrics_v1 (AggregatingMergeTree + materialized views)
+-- are created by the ClickHouse writer at startup, see dealer_flow/metric_rollups.py.
+
+-- Per-instrument greek snapshots (dealer_instrument_greeks_v1, ORDER BY (instrument, ts), daily
+-- partitions, GREEK_HISTORY_TTL_DAYS) are created by the writer too, see dealer_flow/greek_history.py.
+
 CREATE TABLE IF NOT EXISTS dealer_flow.deribit_instrument_summaries_v1
 (
     received_ts DateTime64(3, 'UTC') CODEC(Delta, ZSTD(1)),
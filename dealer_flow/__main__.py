@@ -1,16 +1,30 @@
 """
-Convenience entrypoint: launches collector and API concurrently
+Convenience entrypoint.
+
+    python -m dealer_flow           launches collector and API concurrently (processor runs separately)
+    python -m dealer_flow single    collector + processor + publisher + API in one event loop
+    python -m dealer_flow run       every service as a supervised child process (see supervisor.py)
 """
 import asyncio
-from dealer_flow.deribit_ws import run as ws_run
-from dealer_flow.rest_service import app  # ensures FastAPI import
-import uvicorn
+import sys
+
 
 async def main():
+    from dealer_flow.deribit_ws import main_run_collector as ws_run
+    from dealer_flow.rest_service import app  # ensures FastAPI import
+    import uvicorn
+
     task_ws = asyncio.create_task(ws_run())
     config = uvicorn.Config(app, host="0.0.0.0", port=8000, log_level="info")
     server = uvicorn.Server(config)
     await asyncio.gather(task_ws, server.serve())
 
 if __name__ == "__main__":
-    asyncio.run(main())
+    if len(sys.argv) > 1 and sys.argv[1] == "single":
+        from dealer_flow.single_process import run_single_process
+        asyncio.run(run_single_process())
+    elif len(sys.argv) > 1 and sys.argv[1] == "run":
+        from dealer_flow.supervisor import main as run_supervised
+        run_supervised(sys.argv[2:])
+    else:
+        asyncio.run(main())
@@ -0,0 +1,407 @@
+# dealer_flow/backtest.py
+"""
+Batch backtest over stored instrument summaries (deribit_instrument_summaries_v1 or the
+Parquet cold tier) without replaying traffic through the processor.
+
+    python -m dealer_flow.backtest --source clickhouse --start 2025-06-01 --end 2025-07-01 \\
+        --step 1 --workers 8 --material-ratio 0.2 --out june.parquet
+
+The time grid (start, start+step, …) is cut into slices of --slice-hours, one per process-pool
+task. A slice loads the last summary of every instrument as of its first step (carry-in)
+plus the summaries inside it. Greeks are computed once per summary row with greek_calc.greeks,
+exactly as the processor does per tick, and then frozen until the instrument's next row.
+An instrument leaves the state at its expiry, or after --idle-seconds without a row, as in the
+processor's expiry wheel.
+A numba kernel walks the grid and recomputes the processor's roll-up for every step. It uses
+the same dollar scalings as roll_up, the first per-strike gamma sign change as
+gamma_flip_distance, and it re-aggregates only when a row arrived. HPP and the scenario
+come from hpp_score.hpp / rules.classify themselves, with static material_ratio / alpha /
+beta (the live AdaptiveThresholds are path-dependent and not reproduced).
+
+Inputs differ from the live feed. Greeks use each summary's underlying_price rather than the
+index, and "price" is the underlying of the most recently updated front-expiry instrument.
+Given the same per-instrument state, the output matches what maybe_publish() would publish.
+"""
+import argparse
+import datetime as dt
+import logging
+import time
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
+from typing import Dict, Optional
+
+import numpy as np
+import pandas as pd
+from numba import njit
+
+from dealer_flow.config import settings
+from dealer_flow.dealer_net import infer_dealer_net
+from dealer_flow.greek_calc import greeks as bs_greeks
+from dealer_flow.hpp_score import hpp
+from dealer_flow.rules import classify
+from dealer_flow.tick_schema import instrument_fields
+
+if __name__ == "__main__" and not logging.getLogger().hasHandlers():
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(name)s:%(lineno)d - BACKTEST: %(message)s")
+logger = logging.getLogger(__name__)
+
+SUMMARIES_TABLE = "deribit_instrument_summaries_v1"
+EVENT_COLUMNS = ["received_ts", "instrument_name", "underlying_price", "open_interest", "mark_iv"]
+CARRY_IN_LOOKBACK_SECONDS = 7 * 86400  # instruments not updated for a week are left out of the carry-in
+YEAR_SECONDS = 365 * 24 * 3600
+OUTPUT_COLUMNS = ["ts", "price", "msg_rate", "NGI", "VSS", "CHL_24h", "VOLG", "flip_pct", "HPP", "scenario"]
+
+
+# ----------------------------------------------------------------- sources
+
+class FrameSource:
+    """Summaries already in memory (EVENT_COLUMNS, received_ts in epoch ms)."""
+
+    def __init__(self, frame: pd.DataFrame):
+        self.frame = frame.sort_values("received_ts", kind="stable")
+
+    def _range(self, after_ms: int, upto_ms: int) -> pd.DataFrame:
+        ts = self.frame["received_ts"].to_numpy()
+        lo, hi = np.searchsorted(ts, after_ms, side="right"), np.searchsorted(ts, upto_ms, side="right")
+        return self.frame.iloc[lo:hi]
+
+    def carry_in(self, t0: float) -> pd.DataFrame:
+        t0_ms = int(round(t0 * 1000))
+        window = self._range(t0_ms - CARRY_IN_LOOKBACK_SECONDS * 1000, t0_ms)
+        return window.groupby("instrument_name", sort=False).tail(1)[EVENT_COLUMNS]
+
+    def events(self, t0: float, t1: float) -> pd.DataFrame:
+        return self._range(int(round(t0 * 1000)), int(round(t1 * 1000)))[EVENT_COLUMNS]
+
+
+class ClickHouseSource:
+    def __init__(self, database: str, currency: str):
+        self.database = database
+        self.prefix = f"{currency}-"
+
+    def _query(self, sql: str, params: dict) -> pd.DataFrame:
+        from dealer_flow.clickhouse_writer import get_ch_client  # only this source needs ClickHouse
+
+        client = get_ch_client(use_numpy=False)
+        try:
+            data = client.execute(sql, {**params, "prefix": self.prefix}, columnar=True)
+        finally:
+            client.disconnect()
+        if not data:
+            return pd.DataFrame({c: [] for c in EVENT_COLUMNS})
+        return pd.DataFrame(dict(zip(EVENT_COLUMNS, data)))
+
+    def carry_in(self, t0: float) -> pd.DataFrame:
+        return self._query(
+            f"SELECT argMax(toUnixTimestamp64Milli(received_ts), received_ts), instrument_name, "
+            f"argMax(underlying_price, received_ts), argMax(open_interest, received_ts), argMax(mark_iv, received_ts) "
+            f"FROM {self.database}.{SUMMARIES_TABLE} "
+            f"WHERE received_ts > toDateTime64(%(a)s, 3, 'UTC') AND received_ts <= toDateTime64(%(b)s, 3, 'UTC') "
+            f"AND startsWith(instrument_name, %(prefix)s) GROUP BY instrument_name",
+            {"a": t0 - CARRY_IN_LOOKBACK_SECONDS, "b": t0},
+        )
+
+    def events(self, t0: float, t1: float) -> pd.DataFrame:
+        return self._query(
+            f"SELECT toUnixTimestamp64Milli(received_ts), instrument_name, underlying_price, open_interest, mark_iv "
+            f"FROM {self.database}.{SUMMARIES_TABLE} "
+            f"WHERE received_ts > toDateTime64(%(a)s, 3, 'UTC') AND received_ts <= toDateTime64(%(b)s, 3, 'UTC') "
+            f"AND startsWith(instrument_name, %(prefix)s) ORDER BY received_ts",
+            {"a": t0, "b": t1},
+        )
+
+
+class ParquetSource:
+    """<root>/summaries/currency=<CUR>/date=…/*.parquet as written by parquet_export. Needs pyarrow."""
+
+    def __init__(self, root: str, currency: str):
+        self.path = f"{root.rstrip('/')}/summaries/currency={currency}"
+
+    def _frame(self, after: float, upto: float) -> FrameSource:
+        import pyarrow.dataset as ds
+
+        dates = [dt.datetime.fromtimestamp(t, tz=dt.timezone.utc).strftime("%Y-%m-%d") for t in (after, upto)]
+        dataset = ds.dataset(self.path, format="parquet", partitioning="hive")
+        flt = ((ds.field("date") >= dates[0]) & (ds.field("date") <= dates[1])
+               & (ds.field("received_ts") > int(after * 1000)) & (ds.field("received_ts") <= int(upto * 1000)))
+        return FrameSource(dataset.to_table(columns=EVENT_COLUMNS, filter=flt).to_pandas())
+
+    def carry_in(self, t0: float) -> pd.DataFrame:
+        return self._frame(t0 - CARRY_IN_LOOKBACK_SECONDS, t0).carry_in(t0)
+
+    def events(self, t0: float, t1: float) -> pd.DataFrame:
+        return self._frame(t0, t1).frame[EVENT_COLUMNS]
+
+
+# ----------------------------------------------------------------- dealer sign
+
+def infer_sign(instruments: pd.DataFrame) -> np.ndarray:
+    return infer_dealer_net(instruments.copy())["dealer_side_mult"].to_numpy(dtype=np.float64)
+
+
+def inverted_sign(instruments: pd.DataFrame) -> np.ndarray:
+    return -infer_sign(instruments)
+
+
+DEALER_SIGNS = {"infer": infer_sign, "invert": inverted_sign}
+
+
+# ----------------------------------------------------------------- kernels
+
+def event_greeks(ts_ms: np.ndarray, S: np.ndarray, strike: np.ndarray, expiry: np.ndarray,
+                 option_type: np.ndarray, mark_iv: np.ndarray):
+    """Processor greeks for each summary row: BS where sigma, T and S are positive, else 0."""
+    T = np.maximum(expiry - ts_ms / 1000.0, 0.0) / YEAR_SECONDS
+    sigma = mark_iv / 100.0
+    out = [np.zeros(len(ts_ms)) for _ in range(4)]
+    ok = (sigma > 0) & (T > 0) & (S > 0)
+    if ok.any():
+        calc = bs_greeks(S[ok], strike[ok], T[ok], 0.0, sigma[ok], option_type[ok].astype(np.float64))
+        for arr, c in zip(out, calc):
+            arr[ok] = c
+    for arr in out:
+        np.nan_to_num(arr, copy=False, nan=0.0)
+    return out
+
+
+@njit
+def _walk(grid, ev_ts, ev_inst, ev_g, ev_v, ev_c, ev_vg, ev_n, ev_S,
+          g, v, c, vg, n, S, upd, present, mult, expiry, strike_idx, strikes, idle):
+    steps = grid.shape[0]
+    n_inst = g.shape[0]
+    out = np.full((steps, 8), np.nan)  # NGI, VSS, CHL_24h, VOLG, total_notional, flip_strike, spot, events
+    strike_sum = np.zeros(strikes.shape[0])
+    strike_seen = np.zeros(strikes.shape[0], np.bool_)
+    e = 0
+    n_ev = ev_ts.shape[0]
+    last_S = np.nan
+    edge = -np.inf  # spot must be re-picked once the front expiry passes
+    evict_at = -np.inf  # next settlement / idle deadline among present instruments
+    ngi = vss = chl = volg = tot = flip = spot = 0.0
+    any_present = False
+    for k in range(steps):
+        t = grid[k]
+        applied = 0
+        while e < n_ev and ev_ts[e] <= t:
+            j = ev_inst[e]
+            g[j] = ev_g[e]
+            v[j] = ev_v[e]
+            c[j] = ev_c[e]
+            vg[j] = ev_vg[e]
+            n[j] = ev_n[e]
+            S[j] = ev_S[e]
+            upd[j] = ev_ts[e]
+            present[j] = True
+            any_present = True
+            last_S = ev_S[e]
+            e += 1
+            applied += 1
+        rolled = k == 0 or applied > 0 or t >= evict_at
+        if rolled:
+            ngi = vss = chl = volg = tot = 0.0
+            strike_sum[:] = 0.0
+            strike_seen[:] = False
+            evict_at = np.inf
+            any_present = False
+            for i in range(n_inst):
+                if present[i]:
+                    deadline = expiry[i]
+                    if idle > 0 and upd[i] + idle < deadline:
+                        deadline = upd[i] + idle
+                    if deadline <= t:  # evicted, as processor.lifecycle does live
+                        present[i] = False
+                        continue
+                    evict_at = min(evict_at, deadline)
+                    any_present = True
+                    ngi += g[i] * mult[i] * n[i] * 0.01
+                    vss += v[i] * mult[i] * n[i] * 0.01
+                    chl += c[i] * mult[i] * n[i] * (1 / 365.0)
+                    volg += vg[i] * mult[i] * n[i] * 0.01
+                    tot += n[i]
+                    strike_sum[strike_idx[i]] += g[i] * mult[i]
+                    strike_seen[strike_idx[i]] = True
+            flip = np.nan
+            prev = np.nan
+            for s in range(strikes.shape[0]):
+                if strike_seen[s]:
+                    sign = np.sign(strike_sum[s])
+                    if prev == prev and sign != prev:
+                        flip = strikes[s]
+                        break
+                    prev = sign
+        if rolled or t >= edge:
+            front = np.inf
+            freshest = -np.inf
+            spot = last_S
+            for i in range(n_inst):  # freshest underlying of the front expiry
+                if present[i] and expiry[i] > t and S[i] > 0:
+                    if expiry[i] < front or (expiry[i] == front and upd[i] > freshest):
+                        front = expiry[i]
+                        freshest = upd[i]
+                        spot = S[i]
+            edge = front
+        if any_present:
+            out[k, 0] = ngi
+            out[k, 1] = vss
+            out[k, 2] = chl
+            out[k, 3] = volg
+            out[k, 4] = tot
+            out[k, 5] = flip
+            out[k, 6] = spot
+        out[k, 7] = applied
+    return out
+
+
+# ----------------------------------------------------------------- slices
+
+def run_slice(source, grid: np.ndarray, step: float, material_ratio: float = 0.1,
+              alpha: float = 0.1, beta: float = 0.1, dealer_sign: str = "infer",
+              idle_seconds: float = settings.instrument_idle_timeout_seconds) -> Dict[str, np.ndarray]:
+    """
+    Metrics for each grid timestamp. One extra warm-up step before grid[0] supplies the
+    previous published price for HPP's spot-move sign and the scenario's spot change.
+    Instruments drop out at expiry or after idle_seconds without a row (0 → expiry only).
+    """
+    t_warm = float(grid[0]) - step
+    carry = source.carry_in(t_warm)
+    events = source.events(t_warm, float(grid[-1]))
+    names = pd.unique(pd.concat([carry["instrument_name"], events["instrument_name"]], ignore_index=True))
+    fields = [instrument_fields(str(name)) for name in names]
+    keep = np.array([f is not None for f in fields], dtype=bool)
+    names = names[keep]
+    fields = [f for f in fields if f is not None]
+    inst = pd.DataFrame({
+        "instrument": names,
+        "strike": np.array([f[0] for f in fields], dtype=np.float64),
+        "expiry_ts": np.array([f[1] for f in fields], dtype=np.float64),
+        "option_type": np.array([f[2] for f in fields], dtype=np.int8),
+    })
+    index = pd.Index(names)
+    strikes, strike_idx = np.unique(inst["strike"].to_numpy(), return_inverse=True)
+
+    def rows(frame: pd.DataFrame):
+        j = index.get_indexer(frame["instrument_name"])
+        frame, j = frame[j >= 0], j[j >= 0]
+        S = frame["underlying_price"].to_numpy(dtype=np.float64)
+        ts = frame["received_ts"].to_numpy(dtype=np.int64)
+        g, v, c, vg = event_greeks(ts, S, inst["strike"].to_numpy()[j], inst["expiry_ts"].to_numpy()[j],
+                                   inst["option_type"].to_numpy()[j], frame["mark_iv"].to_numpy(dtype=np.float64))
+        notional = np.where(S > 0, frame["open_interest"].to_numpy(dtype=np.float64) * S, 0.0)
+        return ts / 1000.0, j.astype(np.int64), g, v, c, vg, notional, S
+
+    state = [np.zeros(len(names)) for _ in range(7)]  # g, v, c, vg, notional, S, last update ts
+    present = np.zeros(len(names), dtype=np.bool_)
+    cts, cj, *cvals = rows(carry)
+    for arr, vals in zip(state, cvals + [cts]):
+        arr[cj] = vals
+    present[cj] = True
+
+    walk_grid = np.concatenate(([t_warm], np.asarray(grid, dtype=np.float64)))
+    out = _walk(walk_grid, *rows(events), *state, present, DEALER_SIGNS[dealer_sign](inst),
+                inst["expiry_ts"].to_numpy(), strike_idx.astype(np.int64), strikes, float(idle_seconds))
+
+    NGI, VSS, CHL, VOLG, total_notional, flip_strike, price, applied = (out[:, i] for i in range(8))
+    valid = ~np.isnan(NGI) & (price > 0)  # maybe_publish() skips ticks without spot or greeks
+    prev = np.full(len(price), np.nan)
+    last = np.nan
+    for i in range(len(price)):  # previous *published* price
+        prev[i] = last
+        if valid[i]:
+            last = price[i]
+    prev = np.where(np.isnan(prev), price, prev)  # first publish: last_pub_price starts at spot
+    spot_move_sign = np.sign(price - prev)
+    spot_change_pct = np.where(prev > 0, price / prev - 1.0, 0.0)
+    HPP = hpp(spot_move_sign, NGI, VSS, CHL, alpha=alpha, beta=beta)
+    adv = np.where(total_notional > 0, total_notional * 0.001, 1.0)
+
+    sel = np.flatnonzero(valid[1:]) + 1  # drop the warm-up step
+    scenario = np.array([
+        classify({"NGI": NGI[i], "VSS": VSS[i], "CHL_24h": CHL[i], "HPP": HPP[i]}, adv_usd=adv[i],
+                 spot_change_pct=spot_change_pct[i], material_ratio=material_ratio)
+        for i in sel
+    ], dtype=object)
+    return {
+        "ts": np.round(walk_grid[sel] * 1000).astype(np.int64),
+        "price": price[sel], "msg_rate": applied[sel].astype(np.int32),
+        "NGI": NGI[sel], "VSS": VSS[sel], "CHL_24h": CHL[sel], "VOLG": VOLG[sel],
+        "flip_pct": flip_strike[sel] / price[sel] - 1.0, "HPP": HPP[sel], "scenario": scenario,
+    }
+
+
+_worker_source = None
+
+
+def _init_worker(source):
+    global _worker_source
+    _worker_source = source  # shipped once per worker instead of once per slice
+
+
+def _run_worker_slice(grid: np.ndarray, **params) -> Dict[str, np.ndarray]:
+    return run_slice(_worker_source, grid, **params)
+
+
+def backtest(source, start_ts: float, end_ts: float, step: float = 1.0, slice_seconds: float = 6 * 3600,
+             workers: Optional[int] = None, **params) -> pd.DataFrame:
+    """Runs the grid [start_ts, end_ts) slice by slice, in a process pool unless workers == 1."""
+    grid = start_ts + step * np.arange(int(np.ceil((end_ts - start_ts) / step)))
+    per_slice = max(int(slice_seconds // step), 1)
+    chunks = [grid[i:i + per_slice] for i in range(0, len(grid), per_slice)]
+    t0 = time.perf_counter()
+    if workers == 1 or len(chunks) == 1:
+        results = [run_slice(source, c, step=step, **params) for c in chunks]
+    else:
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=(source,)) as pool:
+            results = list(pool.map(partial(_run_worker_slice, step=step, **params), chunks))
+    frame = pd.DataFrame({c: np.concatenate([r[c] for r in results]) for c in OUTPUT_COLUMNS}) if results \
+        else pd.DataFrame(columns=OUTPUT_COLUMNS)
+    logger.info(f"{len(grid)} steps in {len(chunks)} slices → {len(frame)} rows in {time.perf_counter() - t0:.1f}s")
+    return frame
+
+
+def _parse_time(value: str) -> float:
+    try:
+        return float(value)
+    except ValueError:
+        d = dt.datetime.fromisoformat(value)
+        if d.tzinfo is None:
+            d = d.replace(tzinfo=dt.timezone.utc)
+        return d.timestamp()
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Recompute dealer-flow metrics from stored instrument summaries")
+    ap.add_argument("--source", choices=("clickhouse", "parquet"), default="clickhouse")
+    ap.add_argument("--parquet-root", help="parquet_export root (with --source parquet)")
+    ap.add_argument("--currency", default=settings.currency)
+    ap.add_argument("--start", required=True, help="epoch seconds or ISO date/time (UTC)")
+    ap.add_argument("--end", required=True, help="epoch seconds or ISO date/time (UTC)")
+    ap.add_argument("--step", type=float, default=1.0, help="grid step in seconds (processor publishes every 1s)")
+    ap.add_argument("--slice-hours", type=float, default=6.0)
+    ap.add_argument("--workers", type=int, default=None)
+    ap.add_argument("--material-ratio", type=float, default=0.1)
+    ap.add_argument("--alpha", type=float, default=0.1)
+    ap.add_argument("--beta", type=float, default=0.1)
+    ap.add_argument("--dealer-sign", choices=tuple(DEALER_SIGNS), default="infer")
+    ap.add_argument("--idle-seconds", type=float, default=settings.instrument_idle_timeout_seconds,
+                    help="drop instruments without a summary for this long, like the live processor (0 → expiry only)")
+    ap.add_argument("--out", required=True, help=".parquet (needs pyarrow) or .csv")
+    args = ap.parse_args()
+
+    if args.source == "parquet":
+        if not args.parquet_root:
+            ap.error("--parquet-root is required with --source parquet")
+        source = ParquetSource(args.parquet_root, args.currency)
+    else:
+        source = ClickHouseSource(settings.clickhouse_db_name, args.currency)
+    frame = backtest(source, _parse_time(args.start), _parse_time(args.end), args.step, args.slice_hours * 3600,
+                     args.workers, material_ratio=args.material_ratio, alpha=args.alpha, beta=args.beta,
+                     dealer_sign=args.dealer_sign, idle_seconds=args.idle_seconds)
+    if args.out.endswith(".csv"):
+        frame.to_csv(args.out, index=False)
+    else:
+        frame.to_parquet(args.out, index=False)
+    logger.info(f"Wrote {len(frame)} rows to {args.out}; scenarios: {frame['scenario'].value_counts().to_dict()}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,323 @@
+# dealer_flow/bench.py
+"""
+Hot-path microbenchmarks with a stored baseline and regression gating.
+
+    python -m dealer_flow.bench                      # run all, compare with bench_baseline.json
+    python -m dealer_flow.bench -k publish -k greeks # only names containing one of the filters
+    python -m dealer_flow.bench --update-baseline    # re-record the baseline (commit the JSON)
+
+Each benchmark builds its inputs once, then times the hot call: the fastest of --repeats runs
+of the per-call time (the least noisy statistic on a shared box), with the loop count auto-sized
+to ~--min-time seconds. The processor is driven through FakeRedis, so nothing outside the
+process is touched.
+
+Baselines are machine-dependent. A fixed numpy + pure-Python workload ("calibration") is timed
+before and after every run, and results are compared after scaling by calibration_now /
+calibration_baseline. The run exits 1 if any benchmark is slower than baseline × (1 + --tolerance),
+and 2 if a benchmark could not run. On small shared VMs raise --tolerance or re-run.
+"""
+import argparse
+import asyncio
+import json
+import logging
+import os
+import platform
+import sys
+import time
+from typing import Callable, Dict, List, Optional, Tuple
+
+import numpy as np
+import orjson
+import pandas as pd
+
+if __name__ == "__main__" and not logging.getLogger().hasHandlers():
+    logging.basicConfig(level=logging.WARNING, format="%(asctime)s %(levelname)s %(name)s:%(lineno)d - BENCH: %(message)s")
+logger = logging.getLogger(__name__)
+
+BASELINE_PATH = os.path.join(os.path.dirname(__file__), "bench_baseline.json")
+DEFAULT_TOLERANCE = 0.25
+
+BENCHMARKS: Dict[str, Callable[[], Callable[[], object]]] = {}
+
+
+def bench(name: str):
+    """Registers a setup function; it returns the zero-argument callable that gets timed."""
+    def register(setup):
+        BENCHMARKS[name] = setup
+        return setup
+    return register
+
+
+class FakeRedis:
+    """Just enough of the aioredis surface for maybe_publish / resolve_instruments."""
+
+    def __init__(self):
+        self.xadds = 0
+        self.hashes: Dict[str, dict] = {}
+
+    async def xadd(self, stream, fields, **kwargs):
+        self.xadds += 1
+        return b"0-0"
+
+    async def xrevrange(self, stream, count=1):
+        return []
+
+    async def hset(self, key, field, value):
+        self.hashes.setdefault(key, {})[field] = value
+        return 1
+
+    async def hgetall(self, key):
+        return dict(self.hashes.get(key, {}))
+
+
+def _chain(n_instruments: int):
+    from dealer_flow.synthetic_feed import SyntheticChain
+
+    strikes = max(n_instruments // 2 // 20, 1)  # 20 expiries × strikes × (C, P)
+    return SyntheticChain(expiry_days=tuple(range(1, 21)), strikes_per_expiry=strikes,
+                          strike_step=max(100000.0 / strikes, 1.0), spot=60000.0)
+
+
+# ----------------------------------------------------------------- benchmarks
+
+def _greeks_setup(n: int):
+    from dealer_flow.greek_calc import greeks
+
+    rng = np.random.default_rng(0)
+    S = np.full(n, 60000.0)
+    K = rng.uniform(30000, 90000, n)
+    T = rng.uniform(1 / 365, 1.0, n)
+    sigma = rng.uniform(0.3, 1.0, n)
+    cp = rng.integers(0, 2, n).astype(np.float64)
+    greeks(S[:2], K[:2], T[:2], 0.0, sigma[:2], cp[:2])  # JIT outside the timing
+    return lambda: greeks(S, K, T, 0.0, sigma, cp)
+
+
+for _n in (1_000, 10_000, 100_000):
+    bench(f"greeks_{_n}")(lambda n=_n: _greeks_setup(n))
+
+
+@bench("roll_up_5000")
+def _roll_up():
+    from dealer_flow.vanna_charm_volga import roll_up
+
+    rng = np.random.default_rng(1)
+    df = pd.DataFrame({c: rng.normal(size=5000) for c in ("gamma", "vanna", "charm", "volga")})
+    df["notional_usd"] = rng.uniform(0, 1e6, 5000)
+    return lambda: roll_up(df)
+
+
+@bench("gamma_flip_200")
+def _gamma_flip():
+    from dealer_flow.gamma_flip import gamma_flip_distance
+
+    strikes = np.arange(40000.0, 80000.0, 200.0)
+    by_strike = pd.Series(np.tanh((strikes - 61000.0) / 5000.0), index=strikes)
+    return lambda: gamma_flip_distance(by_strike, 60000.0)
+
+
+def _reset_processor(proc):
+    proc.greek_store.clear()
+    proc.tick_times.clear()
+    proc.spot[0] = 60000.0
+    proc.last_pub_price[0] = 0.0
+
+
+@bench("parse_ticker_json")
+def _parse_json():
+    from dealer_flow import processor as proc
+
+    chain = _chain(500)
+    now_ms = int(time.time() * 1000)
+    frames = [orjson.dumps({"method": "subscription", "params": {
+        "channel": f"ticker.{chain.names[i]}.100ms", "data": chain.ticker(i, now_ms)}}) for i in range(len(chain))]
+    _reset_processor(proc)
+
+    def run():
+        for f in frames:
+            proc.handle_raw_message(f)
+    return run
+
+
+@bench("tick_batch_500")
+def _tick_batch():
+    from dealer_flow import processor as proc
+    from dealer_flow.tick_schema import TickEncoder, decode
+
+    chain = _chain(500)
+    now_ms = int(time.time() * 1000)
+    enc = TickEncoder(proc.instrument_registry)
+    records = decode([enc.encode(f"ticker.{name}.100ms", chain.ticker(i, now_ms))[0]
+                      for i, name in enumerate(chain.names)])
+    _reset_processor(proc)
+    return lambda: proc.handle_tick_batch(records)
+
+
+def _publish_setup(n: int):
+    from dealer_flow import processor as proc
+    from dealer_flow.tick_schema import TickEncoder, decode
+
+    chain = _chain(n)
+    now_ms = int(time.time() * 1000)
+    enc = TickEncoder(proc.instrument_registry)
+    _reset_processor(proc)
+    proc.handle_tick_batch(decode([enc.encode(f"ticker.{name}.100ms", chain.ticker(i, now_ms))[0]
+                                   for i, name in enumerate(chain.names)]))
+    redis = FakeRedis()
+    loop = asyncio.new_event_loop()
+    return lambda: loop.run_until_complete(proc.maybe_publish(redis))
+
+
+for _n in (500, 5_000, 50_000):
+    bench(f"maybe_publish_{_n}")(lambda n=_n: _publish_setup(n))
+
+
+@bench("ch_parse_metrics")
+def _ch_metrics():
+    from dealer_flow.clickhouse_writer import ColumnBuffer, METRICS_COLUMNS, parse_dealer_metrics
+
+    payload = orjson.dumps({"ts": time.time(), "price": 60000.0, "msg_rate": 120, "NGI": 1.5e6, "VSS": -2e5,
+                            "CHL_24h": 3e4, "VOLG": 1e5, "flip_pct": 0.012, "HPP": 1.2e6, "scenario": "Neutral"})
+    buf = ColumnBuffer(METRICS_COLUMNS)
+
+    def run():
+        parse_dealer_metrics(payload, buf)
+        if len(buf) > 10000:
+            buf.clear()
+    return run
+
+
+@bench("ch_parse_book_summary_1000")
+def _ch_summary():
+    from dealer_flow.clickhouse_writer import ColumnBuffer, SUMMARY_COLUMNS, parse_book_summary_message
+
+    chain = _chain(1000)
+    message = orjson.dumps({"ts": time.time(), "summary_data": chain.book_summary(int(time.time() * 1000))})
+    buf = ColumnBuffer(SUMMARY_COLUMNS)
+
+    def run():
+        parse_book_summary_message(message, buf)
+        buf.clear()
+    return run
+
+
+# ----------------------------------------------------------------- runner
+
+def calibrate() -> float:
+    """Time of a fixed numpy + interpreter workload; used to scale baselines across machines."""
+    data = np.random.default_rng(42).random(200_000)
+    keys = [f"BTC-{i}" for i in range(20_000)]
+
+    def work():
+        np.sort(data)
+        d = {}
+        for i, k in enumerate(keys):
+            d[k] = {"gamma": i * 0.5, "strike": float(i)}
+        return orjson.dumps(d)
+    return _time(work, repeats=9, min_time=0.5)
+
+
+def _time(fn: Callable[[], object], repeats: int, min_time: float) -> float:
+    fn()  # warm caches / JIT
+    number = 1
+    while True:
+        t0 = time.perf_counter()
+        for _ in range(number):
+            fn()
+        elapsed = time.perf_counter() - t0
+        if elapsed >= min_time / repeats or number >= 1 << 20:
+            break
+        number *= 2
+    samples = [elapsed / number]
+    for _ in range(repeats - 1):
+        t0 = time.perf_counter()
+        for _ in range(number):
+            fn()
+        samples.append((time.perf_counter() - t0) / number)
+    return float(min(samples))
+
+
+def run(filters: Optional[List[str]] = None, repeats: int = 5, min_time: float = 1.0) -> Tuple[Dict[str, float], Dict[str, str]]:
+    results, errors = {}, {}
+    for name, setup in BENCHMARKS.items():
+        if filters and not any(f in name for f in filters):
+            continue
+        try:
+            results[name] = _time(setup(), repeats, min_time)
+        except Exception as e:  # e.g. aioredis / ClickHouse deps missing for processor benches
+            errors[name] = f"{type(e).__name__}: {e}"
+    return results, errors
+
+
+def compare(results: Dict[str, float], calibration: float, baseline: dict,
+            tolerance: float = DEFAULT_TOLERANCE) -> List[Tuple[str, float, Optional[float], str]]:
+    """[(name, seconds, baseline seconds scaled to this machine or None, 'ok' | 'REGRESSION' | 'new')]"""
+    scale = calibration / baseline["calibration_s"] if baseline.get("calibration_s") else 1.0
+    rows = []
+    for name, seconds in results.items():
+        base = baseline.get("benchmarks", {}).get(name)
+        if base is None:
+            rows.append((name, seconds, None, "new"))
+            continue
+        expected = base * scale
+        rows.append((name, seconds, expected, "REGRESSION" if seconds > expected * (1 + tolerance) else "ok"))
+    return rows
+
+
+def load_baseline(path: str = BASELINE_PATH) -> dict:
+    if not os.path.exists(path):
+        return {}
+    with open(path) as f:
+        return json.load(f)
+
+
+def _fmt(seconds: Optional[float]) -> str:
+    if seconds is None:
+        return "-"
+    for unit, scale in (("s", 1.0), ("ms", 1e-3), ("us", 1e-6)):
+        if seconds >= scale:
+            return f"{seconds / scale:.2f}{unit}"
+    return f"{seconds * 1e9:.0f}ns"
+
+
+def main():
+    ap = argparse.ArgumentParser(description="dealer_flow hot-path microbenchmarks")
+    ap.add_argument("-k", dest="filters", action="append", help="only benchmarks whose name contains this (repeatable)")
+    ap.add_argument("--repeats", type=int, default=5)
+    ap.add_argument("--min-time", type=float, default=1.0, help="seconds of timed calls per benchmark")
+    ap.add_argument("--tolerance", type=float, default=DEFAULT_TOLERANCE, help="allowed slowdown vs baseline (0.25 = 25%%)")
+    ap.add_argument("--baseline", default=BASELINE_PATH)
+    ap.add_argument("--update-baseline", action="store_true")
+    args = ap.parse_args()
+
+    calibration = calibrate()
+    results, errors = run(args.filters, args.repeats, args.min_time)
+    calibration = min(calibration, calibrate())  # bracket the run; a CPU-steal burst inflates only one side
+
+    if args.update_baseline:
+        baseline = load_baseline(args.baseline)
+        old_scale = calibration / baseline["calibration_s"] if baseline.get("calibration_s") else 1.0
+        merged = {k: v * old_scale for k, v in baseline.get("benchmarks", {}).items()}  # keep benchmarks not re-run
+        merged.update(results)
+        with open(args.baseline, "w") as f:
+            json.dump({"calibration_s": calibration, "python": platform.python_version(),
+                       "machine": platform.machine(), "benchmarks": dict(sorted(merged.items()))}, f, indent=2)
+            f.write("\n")
+        print(f"Baseline written to {args.baseline} ({len(results)} benchmarks, calibration {_fmt(calibration)})")
+    else:
+        rows = compare(results, calibration, load_baseline(args.baseline), args.tolerance)
+        print(f"{'benchmark':32} {'time':>10} {'baseline':>10}  status   (calibration {_fmt(calibration)})")
+        for name, seconds, expected, verdict in rows:
+            ratio = f"{seconds / expected:5.2f}x" if expected else ""
+            print(f"{name:32} {_fmt(seconds):>10} {_fmt(expected):>10}  {verdict:10} {ratio}")
+    for name, err in errors.items():
+        print(f"{name:32} {'ERROR':>10}  {err}")
+
+    if errors:
+        sys.exit(2)
+    if not args.update_baseline and any(r[3] == "REGRESSION" for r in rows):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
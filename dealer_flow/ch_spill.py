@@ -0,0 +1,212 @@
+# dealer_flow/ch_spill.py
+"""
+Local append-only spill for the ClickHouse writer.
+
+When an insert fails, the batch's raw stream payloads are appended here and fsynced,
+and only then are the stream ids acked. A drain task later replays them into
+ClickHouse, oldest first. One directory per table:
+
+    spill-<first_ms>.seg     sequence of records  <I len><I crc32><payload bytes>
+    spill-<first_ms>.seg.pos drained byte offset (written after each successful insert)
+
+Only the newest segment is appended to; iter_chunks() seals it before reading it. Replay is
+at-least-once: a crash between an insert and the .pos update re-inserts that chunk.
+A torn record at the tail (crash mid-append) ends the segment.
+
+Only availability errors spill (is_unavailable: network, timeouts, overload codes). A batch
+ClickHouse rejects for its content is bisected (insert_or_bisect) until the offending payloads
+are isolated; those go to a dead-letter SpillQueue that is never drained, and the rest is
+inserted. A segment whose drain keeps failing for other reasons is moved aside (quarantine())
+so it cannot hold up the table forever.
+"""
+import logging
+import os
+import socket
+import struct
+import threading
+import time
+import zlib
+from typing import Awaitable, Callable, Iterator, List, Optional, Tuple
+
+from clickhouse_driver import errors as ch_errors
+
+logger = logging.getLogger(__name__)
+
+RECORD_HEADER = struct.Struct("<II")  # payload length, crc32
+SEGMENT_PREFIX = "spill-"
+SEGMENT_SUFFIX = ".seg"
+POS_SUFFIX = ".pos"
+
+# Server-side error codes that mean "try again later", not "this data is wrong"
+TRANSIENT_SERVER_CODES = {
+    3,    # UNEXPECTED_END_OF_FILE
+    159,  # TIMEOUT_EXCEEDED
+    202,  # TOO_MANY_SIMULTANEOUS_QUERIES
+    203,  # NO_FREE_CONNECTION
+    209,  # SOCKET_TIMEOUT
+    210,  # NETWORK_ERROR
+    241,  # MEMORY_LIMIT_EXCEEDED
+    242,  # TABLE_IS_READ_ONLY
+    252,  # TOO_MANY_PARTS
+    319,  # UNKNOWN_STATUS_OF_INSERT
+    425,  # SYSTEM_ERROR
+    999,  # KEEPER_EXCEPTION
+}
+
+
+def is_unavailable(exc: BaseException) -> bool:
+    """True for errors worth spilling and retrying; False when ClickHouse rejected the data."""
+    if isinstance(exc, (ch_errors.NetworkError, ch_errors.SocketTimeoutError, ch_errors.UnexpectedPacketFromServerError,
+                        ConnectionError, TimeoutError, socket.timeout, EOFError)):
+        return True
+    if isinstance(exc, ch_errors.ServerException):
+        return exc.code in TRANSIENT_SERVER_CODES
+    return isinstance(exc, OSError)
+
+
+async def insert_or_bisect(insert: Callable[[List[bytes]], Awaitable[None]], payloads: List[bytes],
+                           reject: Callable[[List[bytes], BaseException], Awaitable[None]]) -> List[bytes]:
+    """
+    insert(payloads), halving on rejection until single payloads are left; those go to reject().
+    Returns the payloads not inserted because ClickHouse is unavailable (the caller spills them).
+    """
+    try:
+        await insert(payloads)
+        return []
+    except Exception as e:
+        if is_unavailable(e):
+            logger.error(f"ClickHouse unavailable ({type(e).__name__}: {e}); {len(payloads)} payloads left to spill.")
+            return payloads
+        if len(payloads) <= 1:
+            await reject(payloads, e)
+            return []
+        logger.warning(f"Insert of {len(payloads)} payloads rejected ({e}); bisecting.")
+    mid = len(payloads) // 2
+    left = await insert_or_bisect(insert, payloads[:mid], reject)
+    if left:
+        return left + payloads[mid:]
+    return await insert_or_bisect(insert, payloads[mid:], reject)
+
+
+class SpillQueue:
+    def __init__(self, directory: str, rotate_bytes: int = 64 * 1024 * 1024):
+        self.directory = directory
+        self.rotate_bytes = rotate_bytes
+        os.makedirs(directory, exist_ok=True)
+        self._f = None
+        self._active: Optional[str] = None
+        self._active_bytes = 0
+        self._lock = threading.Lock()  # append() runs on executor threads, seal() on the drain path
+
+    def segments(self) -> List[str]:
+        """Segment file names, oldest first (includes the active one)."""
+        return sorted(f for f in os.listdir(self.directory)
+                      if f.startswith(SEGMENT_PREFIX) and f.endswith(SEGMENT_SUFFIX))
+
+    def backlog_bytes(self) -> int:
+        total = 0
+        for name in self.segments():
+            total += os.path.getsize(self._path(name)) - self._read_pos(name)
+        return total
+
+    def __bool__(self):
+        return bool(self.segments())
+
+    def _path(self, name: str) -> str:
+        return os.path.join(self.directory, name)
+
+    def append(self, payloads: List[bytes]) -> int:
+        """Appends and fsyncs; returns bytes written. Blocking — run it off the event loop."""
+        with self._lock:
+            return self._append(payloads)
+
+    def _append(self, payloads: List[bytes]) -> int:
+        if self._f is None or self._active_bytes >= self.rotate_bytes:
+            self._seal()
+            self._active = f"{SEGMENT_PREFIX}{int(time.time() * 1000):015d}{SEGMENT_SUFFIX}"
+            self._f = open(self._path(self._active), "ab")
+            self._active_bytes = self._f.tell()
+        parts = []
+        for p in payloads:
+            parts.append(RECORD_HEADER.pack(len(p), zlib.crc32(p)))
+            parts.append(p)
+        data = b"".join(parts)
+        self._f.write(data)
+        self._f.flush()
+        os.fsync(self._f.fileno())
+        self._active_bytes += len(data)
+        return len(data)
+
+    def seal(self):
+        with self._lock:
+            self._seal()
+
+    def _seal(self):
+        if self._f is not None:
+            self._f.close()
+            self._f = None
+            self._active = None
+
+    def _read_pos(self, name: str) -> int:
+        try:
+            with open(self._path(name) + POS_SUFFIX, "rb") as f:
+                return int(f.read() or 0)
+        except FileNotFoundError:
+            return 0
+
+    def drained_offset(self, name: str) -> int:
+        return self._read_pos(name)
+
+    def mark(self, name: str, offset: int):
+        tmp = self._path(name) + POS_SUFFIX + ".tmp"
+        with open(tmp, "wb") as f:
+            f.write(str(offset).encode())
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, self._path(name) + POS_SUFFIX)
+
+    def remove(self, name: str):
+        if name == self._active:
+            self.seal()
+        for path in (self._path(name), self._path(name) + POS_SUFFIX):
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+
+    def quarantine(self, name: str, directory: str) -> str:
+        """Moves a segment (and its drained position) out of the queue; returns its new path."""
+        if name == self._active:
+            self.seal()
+        os.makedirs(directory, exist_ok=True)
+        for suffix in ("", POS_SUFFIX):
+            try:
+                os.replace(self._path(name) + suffix, os.path.join(directory, name + suffix))
+            except FileNotFoundError:
+                pass
+        return os.path.join(directory, name)
+
+    def iter_chunks(self, name: str, max_payloads: int = 1000) -> Iterator[Tuple[int, List[bytes]]]:
+        """Yields (end_offset, payloads) from the drained position onwards; stops at a torn tail."""
+        if name == self._active:
+            self.seal()
+        with open(self._path(name), "rb") as f:
+            good = self._read_pos(name)
+            f.seek(good)
+            chunk: List[bytes] = []
+            while True:
+                header = f.read(RECORD_HEADER.size)
+                if len(header) < RECORD_HEADER.size:
+                    break
+                length, crc = RECORD_HEADER.unpack(header)
+                payload = f.read(length)
+                if len(payload) < length or zlib.crc32(payload) != crc:
+                    logger.warning(f"Spill segment {name}: torn record at offset {good}, ignoring the rest")
+                    break
+                good = f.tell()
+                chunk.append(payload)
+                if len(chunk) >= max_payloads:
+                    yield good, chunk
+                    chunk = []
+            if chunk:
+                yield good, chunk
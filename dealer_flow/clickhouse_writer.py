@@ -1,10 +1,14 @@
 # dealer_flow/clickhouse_writer.py
 import asyncio
+import functools
 import logging
+import os
 import time
 import orjson
+from concurrent.futures import ThreadPoolExecutor
 from typing import List, Dict, Any
 
+import numpy as np
 import aioredis
 from clickhouse_driver import Client as ClickHouseClient
 from clickhouse_driver.errors import ServerException as ClickHouseServerException
@@ -12,6 +16,9 @@ from clickhouse_driver.errors import ServerException as ClickHouseServerExceptio
 from dealer_flow.config import settings
 from dealer_flow.redis_stream import get_redis, STREAM_KEY_METRICS # Existing metrics stream
 from dealer_flow.processor import wait_for_redis
+from dealer_flow.metric_rollups import ensure_rollups
+from dealer_flow.ch_spill import SpillQueue, insert_or_bisect, is_unavailable
+from dealer_flow import greek_history
 # New stream key from collector
 STREAM_KEY_BOOK_SUMMARIES_FEED = "deribit_book_summaries_feed" # Must match collector
 
@@ -27,14 +34,31 @@ logger = logging.getLogger(__name__)
 TABLE_DEALER_METRICS = "dealer_flow_metrics_v1"
 TABLE_INSTRUMENT_SUMMARIES = "deribit_instrument_summaries_v1"
 
+# Under CH_SPILL_DIR, beside the per-table spill directories
+DEAD_LETTER_DIR = "dead_letter"  # payloads ClickHouse rejected; never replayed automatically
+QUARANTINE_DIR = "quarantine"    # spill segments whose drain kept failing
+
 # Consumer group and name for Redis streams
 GROUP_NAME_CH_WRITER = "ch_writer_group"
 CONSUMER_NAME_CH_WRITER = "ch_writer_consumer_1"
 
-BATCH_SIZE = 100  # How many messages to accumulate before writing to ClickHouse
-BATCH_MAX_AGE_SECONDS = 10 # Max age of a batch before writing, even if not full
+BATCH_SIZE = 100  # Initial / minimum XREADGROUP count; batch rows adapt (AdaptiveBatcher)
+STATS_LOG_INTERVAL_SECONDS = 60
+
+# Column layouts (insert order) with the numpy dtype each buffer is converted to.
+# DateTime64(3) columns are sent as int64 epoch milliseconds; NaN in a Nullable column inserts NULL.
+METRICS_COLUMNS = {
+    "ts": "i8", "price": "f8", "msg_rate": "i4", "NGI": "f8", "VSS": "f8", "CHL_24h": "f8",
+    "VOLG": "f8", "flip_pct": "f8", "HPP": "f8", "scenario": "O",
+}
+SUMMARY_COLUMNS = {
+    "received_ts": "i8", "instrument_name": "O", "underlying_price": "f8", "underlying_index": "O",
+    "quote_currency": "O", "open_interest": "f8", "volume": "f8", "volume_usd": "f8",
+    "bid_iv": "f8", "ask_iv": "f8", "mark_iv": "f8", "interest_rate": "f8",
+}
+
 
-def get_ch_client():
+def get_ch_client(use_numpy: bool = True):
     logger.info(f"Connecting to ClickHouse: host={settings.clickhouse_host}, port={settings.clickhouse_port}, db={settings.clickhouse_db_name}")
     try:
         client = ClickHouseClient(
@@ -45,7 +69,7 @@ def get_ch_client():
             password=settings.clickhouse_password,
             connect_timeout=10,
             send_receive_timeout=60,
-            # settings={'use_numpy': True} # If sending numpy dtypes directly, but we parse to Python types
+            settings={'use_numpy': use_numpy}, # writer inserts are columnar numpy arrays
         )
         client.execute("SELECT 1") # Test connection
         logger.info("Successfully connected to ClickHouse.")
@@ -68,122 +92,470 @@ async def ensure_redis_stream_group(redis: aioredis.Redis, stream_key: str, grou
             logger.error(f"Failed to create consumer group '{group_name}' for '{stream_key}': {e}", exc_info=True)
             raise # Re-raise if it's an unexpected error
 
-def parse_dealer_metrics(data_str: bytes) -> Dict[str, Any]:
+
+class ColumnBuffer:
+    """
+    Append-only per-column lists for one table. Parsers write values straight into
+    `cols[name]`; to_numpy() turns them into one array per column for a columnar insert.
+    """
+
+    def __init__(self, columns: Dict[str, str]):
+        self.columns = columns
+        self.cols: Dict[str, list] = {c: [] for c in columns}
+
+    def __len__(self):
+        return len(self.cols[next(iter(self.columns))])
+
+    def clear(self):
+        for c in self.cols.values():
+            c.clear()
+
+    def to_numpy(self) -> List[np.ndarray]:
+        out = []
+        for name, dtype in self.columns.items():
+            values = self.cols[name]
+            if dtype == "O":
+                out.append(np.array([v if v is not None else "" for v in values], dtype=object))
+            else:
+                out.append(np.array(values, dtype=dtype)) # None → NaN for f8
+        return out
+
+
+class RecordBuffer:
+    """
+    ColumnBuffer counterpart for streams that already carry numpy records (greek_history):
+    parsers append whole structured arrays, to_numpy() concatenates them once and splits
+    the result into one contiguous array per field. No Python object per row, except for
+    fixed-width byte fields, which a String column needs as str.
+    """
+
+    def __init__(self, dtype: np.dtype):
+        self.dtype = dtype
+        self.columns = dtype.names
+        self.chunks: List[np.ndarray] = []
+        self._rows = 0
+
+    def __len__(self):
+        return self._rows
+
+    def append(self, records: np.ndarray):
+        self.chunks.append(records)
+        self._rows += len(records)
+
+    def clear(self):
+        self.chunks.clear()
+        self._rows = 0
+
+    def to_numpy(self) -> List[np.ndarray]:
+        records = np.concatenate(self.chunks) if self.chunks else np.empty(0, dtype=self.dtype)
+        return [np.char.decode(records[name], "ascii").astype(object) if records.dtype[name].kind == "S"
+                else np.ascontiguousarray(records[name]) for name in self.columns]
+
+
+def new_buffer(columns):
+    """RecordBuffer for a structured dtype, ColumnBuffer for a {column: dtype} layout."""
+    return RecordBuffer(columns) if isinstance(columns, np.dtype) else ColumnBuffer(columns)
+
+
+def _ms(ts) -> int:
+    return int(float(ts) * 1000)
+
+
+def parse_dealer_metrics(data_str: bytes, buf: ColumnBuffer) -> int:
     # Assuming data_str is the raw JSON bytes from Redis stream 'd' field
     payload = orjson.loads(data_str)
-    # Ensure all expected fields are present, with defaults for ClickHouse schema
-    return {
-        "ts": payload.get("ts", time.time()), # Convert to ClickHouse DateTime
-        "price": payload.get("price"),
-        "msg_rate": payload.get("msg_rate"),
-        "NGI": payload.get("NGI"),
-        "VSS": payload.get("VSS"),
-        "CHL_24h": payload.get("CHL_24h"),
-        "VOLG": payload.get("VOLG"),
-        "flip_pct": payload.get("flip_pct"), # Already nullable in CH
-        "HPP": payload.get("HPP"),
-        "scenario": payload.get("scenario", "Unknown"),
-    }
-
-def parse_instrument_summary(summary_item: Dict[str, Any], received_ts: float) -> Dict[str, Any]:
+    c = buf.cols
+    c["ts"].append(_ms(payload.get("ts", time.time())))
+    c["price"].append(payload.get("price"))
+    c["msg_rate"].append(payload.get("msg_rate") or 0)
+    c["NGI"].append(payload.get("NGI"))
+    c["VSS"].append(payload.get("VSS"))
+    c["CHL_24h"].append(payload.get("CHL_24h"))
+    c["VOLG"].append(payload.get("VOLG"))
+    c["flip_pct"].append(payload.get("flip_pct")) # None → NaN → NULL
+    c["HPP"].append(payload.get("HPP"))
+    c["scenario"].append(payload.get("scenario", "Unknown"))
+    return 1
+
+def parse_instrument_summary(summary_item: Dict[str, Any], received_ts_ms: int, buf: ColumnBuffer):
     # Parse a single instrument summary from the book_summary array
-    return {
-        "received_ts": received_ts,
-        "instrument_name": summary_item.get("instrument_name"),
-        "underlying_price": summary_item.get("underlying_price"),
-        "underlying_index": summary_item.get("underlying_index"),
-        "quote_currency": summary_item.get("quote_currency"),
-        "open_interest": summary_item.get("open_interest"),
-        "volume": summary_item.get("volume"),
-        "volume_usd": summary_item.get("volume_usd"),
-        "bid_iv": summary_item.get("bid_iv"),
-        "ask_iv": summary_item.get("ask_iv"),
-        "mark_iv": summary_item.get("mark_iv"),
-        "interest_rate": summary_item.get("interest_rate", 0.0), # Default if missing
-        # Add other fields from book_summary if needed for table
-    }
+    c = buf.cols
+    c["received_ts"].append(received_ts_ms)
+    c["instrument_name"].append(summary_item.get("instrument_name"))
+    c["underlying_price"].append(summary_item.get("underlying_price"))
+    c["underlying_index"].append(summary_item.get("underlying_index"))
+    c["quote_currency"].append(summary_item.get("quote_currency"))
+    c["open_interest"].append(summary_item.get("open_interest"))
+    c["volume"].append(summary_item.get("volume"))
+    c["volume_usd"].append(summary_item.get("volume_usd"))
+    c["bid_iv"].append(summary_item.get("bid_iv"))
+    c["ask_iv"].append(summary_item.get("ask_iv"))
+    c["mark_iv"].append(summary_item.get("mark_iv"))
+    c["interest_rate"].append(summary_item.get("interest_rate", 0.0)) # Default if missing
+
+def parse_book_summary_message(data_str: bytes, buf: ColumnBuffer) -> int:
+    # One collector message carries the whole book_summary array
+    outer_payload = orjson.loads(data_str)
+    received_ts_ms = _ms(outer_payload.get("ts", time.time()))
+    summary_list = outer_payload.get("summary_data", [])
+    for summary_item in summary_list:
+        parse_instrument_summary(summary_item, received_ts_ms, buf)
+    return len(summary_list)
+
+
+def parse_greek_batch(data: bytes, buf: RecordBuffer) -> int:
+    records = greek_history.decode(data)
+    buf.append(records)
+    return len(records)
+
+
+class TableStats:
+    """Per-table insert throughput and event-loop stall accounting, logged periodically."""
+
+    def __init__(self, table_name: str):
+        self.table_name = table_name
+        self.reset()
+
+    def reset(self):
+        self.rows = 0
+        self.inserts = 0
+        self.insert_seconds = 0.0
+        self.loop_busy_seconds = 0.0   # time this consumer held the event loop (parse/buffer work)
+        self.loop_stall_max_ms = 0.0   # longest single synchronous stretch
+        self.spilled = 0               # payloads written to the local spill instead of ClickHouse
+        self.dead_lettered = 0         # payloads ClickHouse rejected, set aside in the dead-letter queue
+        self.window_start = time.monotonic()
+
+    def record_busy(self, seconds: float):
+        self.loop_busy_seconds += seconds
+        self.loop_stall_max_ms = max(self.loop_stall_max_ms, seconds * 1000.0)
+
+    def record_insert(self, rows: int, seconds: float):
+        self.rows += rows
+        self.inserts += 1
+        self.insert_seconds += seconds
+
+    def maybe_log(self):
+        elapsed = time.monotonic() - self.window_start
+        if elapsed < STATS_LOG_INTERVAL_SECONDS:
+            return False
+        logger.info(
+            f"[{self.table_name}] {self.rows / elapsed:.1f} rows/s over {elapsed:.0f}s "
+            f"({self.inserts} inserts, {self.insert_seconds:.2f}s in ClickHouse), "
+            f"loop busy {self.loop_busy_seconds * 1000:.1f} ms, max stall {self.loop_stall_max_ms:.2f} ms, "
+            f"{self.spilled} payloads spilled, {self.dead_lettered} dead-lettered"
+        )
+        self.reset()
+        return True
+
+
+class ClickHousePool:
+    """
+    A fixed set of clients with one executor thread per client. Each client is used by one
+    thread at a time (clickhouse-driver clients are not thread-safe); a stream gets its own
+    pool so metrics inserts never queue behind a summaries backlog.
+    """
+
+    def __init__(self, size: int, name: str, use_numpy: bool = True, clients=None):
+        # Must run on the event loop thread: on Python 3.9 asyncio.Queue() binds to the current loop.
+        self.size = size
+        self.name = name
+        self._idle: asyncio.Queue = asyncio.Queue()
+        for client in clients if clients is not None else (get_ch_client(use_numpy) for _ in range(size)):
+            self._idle.put_nowait(client)
+        self.executor = ThreadPoolExecutor(max_workers=size, thread_name_prefix=f"ch_{name}")
+
+    @classmethod
+    async def connect(cls, size: int, name: str, use_numpy: bool = True) -> "ClickHousePool":
+        """Connects the clients on a worker thread (blocking I/O) and builds the pool on the loop."""
+        loop = asyncio.get_running_loop()
+        clients = await loop.run_in_executor(None, lambda: [get_ch_client(use_numpy) for _ in range(size)])
+        return cls(size, name, use_numpy, clients=clients)
+
+    async def run(self, fn, *args, **kwargs):
+        """Runs fn(client, *args, **kwargs) on a worker thread with an idle client."""
+        client = await self._idle.get()
+        try:
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(self.executor, functools.partial(fn, client, *args, **kwargs))
+        finally:
+            self._idle.put_nowait(client)
+
+    async def execute(self, query: str, params=None, **kwargs):
+        return await self.run(ClickHouseClient.execute, query, params, **kwargs)
+
+    def close(self):
+        self.executor.shutdown(wait=True)
+        while not self._idle.empty():
+            self._idle.get_nowait().disconnect()
+
+
+class AdaptiveBatcher:
+    """
+    Sizes batches from what ClickHouse is actually doing instead of a fixed row count.
+
+    target_rows follows observed insert throughput so one insert takes about
+    target_insert_seconds (clamped to [min_rows, max_rows]); read_count doubles while
+    XREADGROUP keeps returning full reads (backlog) and halves back once caught up.
+    Latency when idle is bounded by max_age_seconds as before.
+    """
+
+    def __init__(self, min_rows: int, max_rows: int, max_age_seconds: float,
+                 target_insert_seconds: float = 1.0, max_read_count: int = 5000):
+        self.min_rows = min_rows
+        self.max_rows = max_rows
+        self.max_age_seconds = max_age_seconds
+        self.target_insert_seconds = target_insert_seconds
+        self.max_read_count = max_read_count
+        self.target_rows = min_rows
+        self.read_count = min(BATCH_SIZE, max_read_count)
+        self.rows_per_sec = 0.0
+
+    def on_read(self, n_messages: int):
+        if n_messages >= self.read_count:
+            self.read_count = min(self.read_count * 2, self.max_read_count)
+            self.target_rows = min(self.target_rows * 2, self.max_rows)  # backlog: grow before the next insert reports
+        elif n_messages < self.read_count // 4:
+            self.read_count = max(self.read_count // 2, BATCH_SIZE)
+
+    def on_insert(self, rows: int, seconds: float):
+        if rows <= 0 or seconds <= 0:
+            return
+        rate = rows / seconds
+        self.rows_per_sec = rate if self.rows_per_sec == 0.0 else 0.7 * self.rows_per_sec + 0.3 * rate
+        self.target_rows = int(min(max(self.rows_per_sec * self.target_insert_seconds, self.min_rows), self.max_rows))
+
+    def should_flush(self, rows: int, age: float) -> bool:
+        return rows >= self.target_rows or age > self.max_age_seconds
+
+
+async def insert_columns(pool: ClickHousePool, table_name: str, buf: ColumnBuffer, stats: TableStats) -> float:
+    """Columnar INSERT on a pooled client; returns seconds spent in ClickHouse."""
+    t0 = time.perf_counter()
+    columns = buf.to_numpy()
+    stats.record_busy(time.perf_counter() - t0)
+    query = f"INSERT INTO {table_name} ({', '.join(buf.columns)}) VALUES"
+    t0 = time.perf_counter()
+    await pool.execute(query, columns, columnar=True)
+    elapsed = time.perf_counter() - t0
+    stats.record_insert(len(buf), elapsed)
+    return elapsed
+
+
+async def recover_pending(redis: aioredis.Redis, stream_key: str):
+    """
+    Claims entries other (dead or renamed) consumers of the group left un-acked for longer
+    than CH_CLAIM_MIN_IDLE_MS. Our own pending entries are re-read by the consumer loop.
+    """
+    summary = await redis.xpending(stream_key, GROUP_NAME_CH_WRITER)
+    if not summary or not summary.get("pending"):
+        return 0
+    per_consumer = ", ".join(f"{c['name']}={c['pending']}" for c in summary.get("consumers") or [])
+    logger.info(f"Stream '{stream_key}': {summary['pending']} pending entries in group ({per_consumer})")
+    claimed, cursor = 0, "0-0"
+    try:
+        while True:
+            reply = await redis.execute_command(
+                "XAUTOCLAIM", stream_key, GROUP_NAME_CH_WRITER, CONSUMER_NAME_CH_WRITER,
+                settings.ch_claim_min_idle_ms, cursor, "COUNT", 1000, "JUSTID")
+            cursor, ids = reply[0], reply[1]
+            claimed += len(ids)
+            if cursor in (b"0-0", "0-0"):
+                break
+    except aioredis.exceptions.ResponseError: # Redis < 6.2: no XAUTOCLAIM
+        entries = await redis.xpending_range(stream_key, GROUP_NAME_CH_WRITER, "-", "+", summary["pending"])
+        ids = [e["message_id"] for e in entries
+               if e["time_since_delivered"] >= settings.ch_claim_min_idle_ms
+               and e["consumer"] not in (CONSUMER_NAME_CH_WRITER, CONSUMER_NAME_CH_WRITER.encode())]
+        if ids:
+            await redis.xclaim(stream_key, GROUP_NAME_CH_WRITER, CONSUMER_NAME_CH_WRITER,
+                               settings.ch_claim_min_idle_ms, ids, justid=True)
+        claimed = len(ids)
+    if claimed:
+        logger.info(f"Stream '{stream_key}': claimed {claimed} idle pending entries for {CONSUMER_NAME_CH_WRITER}.")
+    return claimed
 
 
 async def stream_consumer_task(
     redis: aioredis.Redis,
-    ch_client: ClickHouseClient,
+    pool: ClickHousePool,
     stream_key: str,
     table_name: str,
+    columns,  # {column: dtype} → ColumnBuffer, structured np.dtype → RecordBuffer
     parser_func,
     shutdown_event: asyncio.Event
 ):
-    logger.info(f"Starting consumer task for Redis stream '{stream_key}' -> ClickHouse table '{table_name}'")
+    logger.info(f"Starting consumer task for Redis stream '{stream_key}' -> ClickHouse table '{table_name}' ({pool.size} insert workers)")
     await ensure_redis_stream_group(redis, stream_key, GROUP_NAME_CH_WRITER)
-    
-    batch: List[Dict[str, Any]] = []
+    try:
+        await recover_pending(redis, stream_key)
+    except Exception as e:
+        logger.error(f"Pending-entry recovery failed for {stream_key}: {e}", exc_info=True)
+
+    buf = new_buffer(columns)
+    stats = TableStats(table_name)
+    batcher = AdaptiveBatcher(settings.ch_batch_min_rows, settings.ch_batch_max_rows, settings.ch_batch_max_age_seconds)
+    spill = SpillQueue(os.path.join(settings.ch_spill_dir, table_name), settings.ch_spill_rotate_mb * 1024 * 1024)
+    dead_letter = SpillQueue(os.path.join(settings.ch_spill_dir, DEAD_LETTER_DIR, table_name))
+    quarantine_dir = os.path.join(settings.ch_spill_dir, QUARANTINE_DIR, table_name)
+    if spill:
+        logger.warning(f"{table_name}: {spill.backlog_bytes()} bytes spilled by a previous run, draining.")
+    pending_ack_ids: List[bytes] = [] # Stream ids whose rows are in `buf`
+    pending_payloads: List[bytes] = [] # Their raw payloads, spilled if ClickHouse is unavailable
+    in_flight = set()
     last_batch_write_time = time.monotonic()
+    read_id = "0" # Own pending entries first (delivered before a crash, never acked), then ">"
+    loop = asyncio.get_running_loop()
+
+    def build(payloads: List[bytes]):
+        batch = new_buffer(columns)
+        for raw_payload in payloads:
+            try:
+                parser_func(raw_payload, batch)
+            except Exception as e:
+                logger.error(f"Dropping unparsable payload for {table_name}: {e}")
+        return batch
+
+    async def reject(payloads: List[bytes], exc: BaseException):
+        logger.error(f"ClickHouse rejected a payload for {table_name} ({type(exc).__name__}: {exc}); "
+                     f"moving it to the dead-letter queue.")
+        await loop.run_in_executor(None, dead_letter.append, payloads)
+        stats.dead_lettered += len(payloads)
+
+    async def insert_all(batch, payloads: List[bytes]) -> List[bytes]:
+        """Inserts `batch` (built from `payloads`); returns the payloads left to spill."""
+        async def insert(part: List[bytes]):
+            part_batch = batch if part is payloads else build(part)
+            if len(part_batch):
+                batcher.on_insert(len(part_batch), await insert_columns(pool, table_name, part_batch, stats))
+        return await insert_or_bisect(insert, payloads, reject)
+
+    async def write_batch(batch: ColumnBuffer, ack_ids: List[bytes], payloads: List[bytes], reason: str):
+        logger.debug(f"Writing batch to {table_name} ({reason}, {len(batch)} rows).")
+        # While a spill backlog exists new batches queue behind it, keeping insert order.
+        if not len(batch):
+            payloads = []  # parsed to no rows: nothing to insert or spill, just ack
+        elif not spill:
+            try:
+                payloads = await insert_all(batch, payloads)
+            except Exception as e: # dead-letter write failed; keep the whole batch in the spill
+                logger.error(f"Error during batch insert to {table_name}: {e}", exc_info=True)
+        while payloads:
+            try:
+                await loop.run_in_executor(None, spill.append, payloads)
+                stats.spilled += len(payloads)
+                break
+            except Exception as e:
+                logger.error(f"Spill write failed for {table_name}: {e}", exc_info=True)
+                if shutdown_event.is_set():
+                    logger.error(f"Leaving {len(ack_ids)} entries of {stream_key} pending for recovery on next start.")
+                    return
+                await asyncio.sleep(5)
+        if ack_ids: # Ack only once rows are in ClickHouse or fsynced to the spill
+            await redis.xack(stream_key, GROUP_NAME_CH_WRITER, *ack_ids)
+
+    async def drain_spill():
+        # Replays spilled payloads oldest-first in max-size batches once ClickHouse is back.
+        failures = {}  # (segment, drained offset) → failed attempts that were not an outage
+        while not shutdown_event.is_set():
+            if not spill:
+                await asyncio.sleep(1)
+                continue
+            name = spill.segments()[0]
+            try:
+                chunks = spill.iter_chunks(name, max_payloads=50)
+                drained = 0
+                while True:
+                    batch = new_buffer(columns)
+                    batch_payloads = []
+                    end_offset = None
+                    while len(batch) < batcher.max_rows:
+                        item = await loop.run_in_executor(None, next, chunks, None)
+                        if item is None:
+                            break
+                        end_offset, payloads = item
+                        for raw_payload in payloads:
+                            try:
+                                parser_func(raw_payload, batch)
+                                batch_payloads.append(raw_payload)
+                            except Exception as e:
+                                logger.error(f"Dropping unparsable spilled payload for {table_name}: {e}")
+                    if end_offset is None:
+                        break
+                    if len(batch) and await insert_all(batch, batch_payloads):
+                        raise ConnectionError("ClickHouse unavailable")
+                    drained += len(batch)
+                    spill.mark(name, end_offset)
+                spill.remove(name)
+                logger.info(f"Drained spill segment {name} into {table_name} ({drained} rows).")
+            except Exception as e:
+                if not is_unavailable(e):
+                    key = (name, spill.drained_offset(name))
+                    failures[key] = failures.get(key, 0) + 1
+                    if failures[key] >= settings.ch_spill_max_attempts:
+                        path = await loop.run_in_executor(None, spill.quarantine, name, quarantine_dir)
+                        logger.error(f"Spill segment {name} of {table_name} failed {failures.pop(key)} times at the "
+                                     f"same offset ({e}); quarantined to {path}.")
+                        continue
+                logger.error(f"Spill drain into {table_name} failed: {e}. Retrying in 5s.")
+                await asyncio.sleep(5)
+
+    async def dispatch(reason: str):
+        # Hand the current buffer to a worker; wait for a free one so at most pool.size batches are in memory.
+        nonlocal buf, pending_ack_ids, pending_payloads, last_batch_write_time
+        while len(in_flight) >= pool.size:
+            await asyncio.wait(in_flight, return_when=asyncio.FIRST_COMPLETED)
+        task = asyncio.create_task(write_batch(buf, pending_ack_ids, pending_payloads, reason))
+        in_flight.add(task)
+        task.add_done_callback(in_flight.discard)
+        buf = new_buffer(columns)
+        pending_ack_ids = []
+        pending_payloads = []
+        last_batch_write_time = time.monotonic()
+
+    drain_task = asyncio.create_task(drain_spill())
 
     while not shutdown_event.is_set():
         try:
             messages = await redis.xreadgroup(
                 groupname=GROUP_NAME_CH_WRITER,
                 consumername=CONSUMER_NAME_CH_WRITER,
-                streams={stream_key: ">"}, # Read new messages
-                count=BATCH_SIZE,
+                streams={stream_key: read_id},
+                count=batcher.read_count,
                 block=1000 # Block for 1 second
             )
 
-            if not messages:
-                # No messages, check if batch should be written due to age
-                if batch and (time.monotonic() - last_batch_write_time > BATCH_MAX_AGE_SECONDS):
-                    logger.info(f"Writing batch to {table_name} due to age ({len(batch)} items).")
-                    ch_client.execute(f"INSERT INTO {table_name} VALUES", batch)
-                    # TODO: Implement XACK for processed messages
-                    batch = []
-                    last_batch_write_time = time.monotonic()
-                continue
-
-            message_ids_to_ack = []
-            for stream_name, stream_messages in messages:
+            busy_start = time.perf_counter()
+            n_read = 0
+            for stream_name, stream_messages in messages or []:
+                n_read += len(stream_messages)
                 for msg_id, msg_data_dict in stream_messages:
                     try:
-                        # msg_data_dict is {'d': b'json_payload'}
-                        raw_payload = msg_data_dict.get(b"d")
+                        # msg_data_dict is {'d': b'json_payload'} (None for a pending entry trimmed from the stream)
+                        raw_payload = (msg_data_dict or {}).get(b"d")
                         if not raw_payload:
                             logger.warning(f"Empty payload for message ID {msg_id.decode()} in stream {stream_key}")
-                            message_ids_to_ack.append(msg_id) # Ack even if payload is bad to remove it
-                            continue
-                        
-                        # Specific handling for book_summaries_feed which contains a list
-                        if stream_key == STREAM_KEY_BOOK_SUMMARIES_FEED:
-                            outer_payload = orjson.loads(raw_payload)
-                            received_ts = outer_payload.get("ts", time.time())
-                            summary_list = outer_payload.get("summary_data", [])
-                            for summary_item in summary_list:
-                                parsed_item = parser_func(summary_item, received_ts)
-                                batch.append(parsed_item)
-                        else: # For dealer_metrics (single item per message)
-                            parsed_data = parser_func(raw_payload)
-                            batch.append(parsed_data)
-                        
-                        message_ids_to_ack.append(msg_id)
+                        else:
+                            parser_func(raw_payload, buf)
+                            pending_payloads.append(raw_payload)
                     except Exception as e:
                         logger.error(f"Failed to parse message ID {msg_id.decode()} from {stream_key}: {e}", exc_info=True)
                         # Optionally, could move bad messages to a dead-letter queue instead of just acking
-                        message_ids_to_ack.append(msg_id) # Ack to prevent reprocessing bad message
-
-            if batch and (len(batch) >= BATCH_SIZE or (time.monotonic() - last_batch_write_time > BATCH_MAX_AGE_SECONDS)):
-                logger.info(f"Writing batch to {table_name} (size: {len(batch)}).")
-                try:
-                    ch_client.execute(f"INSERT INTO {table_name} VALUES", batch)
-                    if message_ids_to_ack: # Ack messages after successful insert
-                        await redis.xack(stream_key, GROUP_NAME_CH_WRITER, *message_ids_to_ack)
-                    batch = []
-                    last_batch_write_time = time.monotonic()
-                except ClickHouseServerException as e:
-                    logger.error(f"ClickHouseServerException during batch insert to {table_name}: {e}", exc_info=True)
-                    # Batch will be retried in the next loop iteration if not cleared
-                    # Consider more sophisticated retry/dead-letter queue for persistent CH errors
-                    await asyncio.sleep(5) # Wait before retrying CH
-                except Exception as e:
-                    logger.error(f"Generic error during batch insert to {table_name}: {e}", exc_info=True)
-                    await asyncio.sleep(5)
+                    pending_ack_ids.append(msg_id) # Bad/empty messages are acked with the batch to remove them
+                    if read_id != ">":
+                        read_id = msg_id
+            stats.record_busy(time.perf_counter() - busy_start)
+            if read_id != ">" and n_read == 0:
+                logger.info(f"Stream '{stream_key}': pending entries re-read, switching to new messages.")
+                read_id = ">"
+            batcher.on_read(n_read)
 
+            batch_age = time.monotonic() - last_batch_write_time
+            if pending_ack_ids and batcher.should_flush(len(buf), batch_age):
+                await dispatch("size" if len(buf) >= batcher.target_rows else "age")
+            if stats.maybe_log():
+                logger.info(f"[{table_name}] batch target {batcher.target_rows} rows, read count {batcher.read_count}, "
+                            f"{len(in_flight)}/{pool.size} inserts in flight, spill backlog {spill.backlog_bytes()} bytes")
 
         except aioredis.exceptions.BusyLoadingError:
             logger.warning("Redis busy loading, ClickHouse writer pausing...")
@@ -201,15 +573,16 @@ async def stream_consumer_task(
         except Exception as e:
             logger.error(f"Unhandled error in ClickHouse writer for stream {stream_key}: {e}", exc_info=True)
             await asyncio.sleep(10) # Sleep on unhandled error to prevent rapid crash loops
-    
-    # Final batch write on shutdown
-    if batch:
-        logger.info(f"Shutdown: Writing final batch to {table_name} (size: {len(batch)}).")
-        try:
-            ch_client.execute(f"INSERT INTO {table_name} VALUES", batch)
-            # Ack for final batch if needed, though consumer might be gone
-        except Exception as e:
-            logger.error(f"Error writing final batch to {table_name} on shutdown: {e}", exc_info=True)
+
+    # Final batch write on shutdown (spilled if ClickHouse is unreachable)
+    if pending_ack_ids:
+        logger.info(f"Shutdown: Writing final batch to {table_name} (size: {len(buf)}).")
+        await dispatch("shutdown")
+    if in_flight:
+        await asyncio.gather(*in_flight, return_exceptions=True)
+    drain_task.cancel()
+    await asyncio.gather(drain_task, return_exceptions=True)
+    spill.seal()
     logger.info(f"Consumer task for stream '{stream_key}' stopped.")
 
 
@@ -222,23 +595,52 @@ async def main():
         return
 
     try:
-        ch_client = get_ch_client()
+        # One pool per stream: clients are never shared between tables or threads.
+        metrics_pool = ClickHousePool(settings.ch_metrics_insert_workers, "metrics")
+        summaries_pool = ClickHousePool(settings.ch_summaries_insert_workers, "summaries")
     except Exception:
         logger.critical("Failed to connect to ClickHouse on startup. Exiting.")
         return
 
+    greeks_pool = None
+    if settings.greek_history:
+        try: # its own pool: a 1k-row-per-second stream must not delay metrics inserts
+            greeks_pool = ClickHousePool(settings.ch_greeks_insert_workers, "greeks")
+            await greeks_pool.run(greek_history.ensure_greek_table, settings.clickhouse_db_name,
+                                  settings.greek_history_ttl_days)
+        except Exception as e:
+            logger.error(f"Failed to provision {greek_history.TABLE_INSTRUMENT_GREEKS}; greek history disabled: {e}", exc_info=True)
+            greeks_pool = None
+
+    if settings.ch_provision_rollups:
+        try: # Before any insert, so a backfilled tier counts every row exactly once
+            backfilled = await metrics_pool.run(ensure_rollups, settings.clickhouse_db_name)
+            logger.info(f"Metric rollup tiers ready ({', '.join(backfilled) or 'none'} backfilled).")
+        except Exception as e:
+            logger.error(f"Failed to provision metric rollups: {e}", exc_info=True)
+
     shutdown_event = asyncio.Event()
-    
+
     # Create tasks for each stream
     metrics_task = asyncio.create_task(
-        stream_consumer_task(redis_client, ch_client, STREAM_KEY_METRICS, TABLE_DEALER_METRICS, parse_dealer_metrics, shutdown_event)
+        stream_consumer_task(redis_client, metrics_pool, STREAM_KEY_METRICS, TABLE_DEALER_METRICS,
+                             METRICS_COLUMNS, parse_dealer_metrics, shutdown_event)
     )
     summaries_task = asyncio.create_task(
-        stream_consumer_task(redis_client, ch_client, STREAM_KEY_BOOK_SUMMARIES_FEED, TABLE_INSTRUMENT_SUMMARIES, parse_instrument_summary, shutdown_event)
+        stream_consumer_task(redis_client, summaries_pool, STREAM_KEY_BOOK_SUMMARIES_FEED, TABLE_INSTRUMENT_SUMMARIES,
+                             SUMMARY_COLUMNS, parse_book_summary_message, shutdown_event)
     )
 
+    tasks = [metrics_task, summaries_task]
+    if greeks_pool is not None:
+        tasks.append(asyncio.create_task(
+            stream_consumer_task(redis_client, greeks_pool, greek_history.STREAM_KEY_GREEKS,
+                                 greek_history.TABLE_INSTRUMENT_GREEKS, greek_history.GREEK_DTYPE,
+                                 parse_greek_batch, shutdown_event)
+        ))
+
     try:
-        await asyncio.gather(metrics_task, summaries_task)
+        await asyncio.gather(*tasks)
     except KeyboardInterrupt:
         logger.info("ClickHouse Writer received KeyboardInterrupt.")
     finally:
@@ -246,11 +648,13 @@ async def main():
         shutdown_event.set()
         # Wait for tasks to complete with a timeout
         try:
-            await asyncio.wait_for(asyncio.gather(metrics_task, summaries_task, return_exceptions=True), timeout=10.0)
+            await asyncio.wait_for(asyncio.gather(*tasks, return_exceptions=True), timeout=10.0)
         except asyncio.TimeoutError:
             logger.warning("Timeout waiting for consumer tasks to finish.")
-        if ch_client:
-            ch_client.disconnect()
+        metrics_pool.close()
+        summaries_pool.close()
+        if greeks_pool is not None:
+            greeks_pool.close()
         logger.info("ClickHouse Writer service stopped.")
 
 if __name__ == "__main__":
@@ -16,14 +16,88 @@ class Settings(BaseSettings):
     redis_url: str = "redis://:changeme@redis:6379/0"
 
     deribit_max_auth_instruments: int = 100
+    dynamic_subscription_refresh_interval_seconds: int = 60
+    # REST snapshot of the whole chain (rest_bootstrap): once before the WebSocket connects, then every
+    # BOOTSTRAP_REFRESH_SECONDS for contracts outside the live ticker subscriptions (0 → no refresh)
+    bootstrap_enabled: bool = True
+    bootstrap_requests_per_second: float = 20.0
+    bootstrap_concurrency: int = 8
+    bootstrap_refresh_seconds: float = 300.0  # keep below instrument_idle_timeout_seconds
+    bootstrap_refresh_requests_per_second: float = 5.0
+
+    # dealer_raw record format: "binary" (tick_schema records), "json" (raw frames) or "both" for rollout
+    tick_format: str = "binary"
+
+    # collector → processor transport for dealer_raw: "redis" stream or "shm" ring (same host only)
+    raw_transport: str = "redis"
+    shm_ring_name: str = "dealer_raw"
+    shm_ring_slots: int = 1 << 20
+    shm_slot_size: int = 128  # 128 fits one binary tick record; JSON frames need ~2048
+    shm_overrun_policy: str = "latest"  # latest | oldest | fail
+    shm_poll_interval_ms: float = 1.0
+
+    # Single-process mode (python -m dealer_flow single)
+    inproc_queue_size: int = 10000
+    inproc_redis_sink: bool = True
+    inproc_sink_queue_size: int = 10000
+
+    # Raw WS frame capture (empty dir → disabled)
+    capture_dir: str = ""
+    capture_rotate_mb: int = 256
+    capture_rotate_seconds: int = 3600
 
     # General
     currency: str = "BTC"
 
+    clickhouse_host: str = "clickhouse_server"
+    clickhouse_port: int = 9000
     clickhouse_user: str = "default"
     clickhouse_password: str = ""
     clickhouse_db_name: str = "dealer_flow"
 
+    # ClickHouse writer: clients (= parallel inserts) per stream and adaptive batch bounds
+    ch_metrics_insert_workers: int = 1
+    ch_summaries_insert_workers: int = 4
+    ch_batch_min_rows: int = 100
+    ch_batch_max_rows: int = 200000
+    ch_batch_max_age_seconds: float = 10.0
+    ch_spill_dir: str = "/var/lib/dealer_flow/ch_spill"  # local spill while ClickHouse is down (one sub-directory per table)
+    ch_spill_max_attempts: int = 5  # non-outage drain failures at one segment offset before it is quarantined
+    ch_spill_rotate_mb: int = 64
+    ch_claim_min_idle_ms: int = 60000  # XAUTOCLAIM other consumers' pending entries idle this long
+    ch_provision_rollups: bool = True  # create/backfill 1s/1m/1h metric rollup tiers at writer startup
+    ch_greeks_insert_workers: int = 2
+
+    # Per-instrument greek history (greek_history): processor publishes one columnar batch per roll,
+    # the writer inserts it into dealer_instrument_greeks_v1 (TTL in days, 0 → keep forever)
+    greek_history: bool = True
+    greek_history_ttl_days: int = 30
+
+    # Adaptive scenario thresholds / HPP weights (quantile_sketch.AdaptiveThresholds)
+    threshold_half_life_hours: float = 24.0
+    threshold_refresh_seconds: float = 60.0
+    threshold_material_quantile: float = 0.8
+    threshold_seed_hours: float = 24.0  # 0 → don't seed from ClickHouse at processor startup
+
+    # Per-instrument state lifecycle (expiry_wheel.ExpiryWheel): contracts leave the greek store at
+    # their 08:00 UTC settlement, or after this long without a ticker (0 → expiry only)
+    instrument_idle_timeout_seconds: float = 900.0
+
+    # Perp / spot liquidity (spot_ws): rolling ADV and ±depth_pct book depth → dealer_liquidity
+    liquidity_feeds: str = "deribit"  # comma-separated: deribit, binance
+    liquidity_publish_seconds: float = 1.0
+    liquidity_depth_pct: float = 1.0
+    liquidity_stale_seconds: float = 30.0  # older → the processor falls back to its notional-based ADV proxy
+    binance_ws: str = "wss://stream.binance.com:9443"
+    binance_rest: str = "https://api.binance.com"
+
+    # Process supervisor (python -m dealer_flow run)
+    run_services: str = "collector,liquidity,processor,writer,api"
+    run_cpus: str = ""  # core pinning per service, e.g. "processor=2;collector=3;writer=4-5"
+    run_uvloop: bool = True  # uvloop event loop in every child when installed
+    run_restart_backoff_max_seconds: float = 30.0
+    run_report_seconds: float = 60.0
+
     class Config:
         env_file = Path(__file__).parent.parent / ".env"
 
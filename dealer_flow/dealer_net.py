@@ -15,8 +15,13 @@ def infer_dealer_net(oi_df: pd.DataFrame) -> pd.DataFrame:
     (e.g., customer is long the option).
 
     A more sophisticated model would require trade data analysis.
+    When the processor has trade-tape data it passes a 'customer_net' column
+    (trade_flow.TradeFlowBook) and the sign follows the customer's net position.
     """
-    if "side" in oi_df.columns and not oi_df["side"].empty: # Check if 'side' actually has data
+    if "customer_net" in oi_df.columns:
+        # trade_flow.TradeFlowBook: customer net long (or no trades yet) → dealer short → 1; customer net short → -1
+        oi_df["dealer_side_mult"] = np.where(oi_df["customer_net"].fillna(0.0) < 0, -1, 1)
+    elif "side" in oi_df.columns and not oi_df["side"].empty: # Check if 'side' actually has data
         logger.info("Attempting dealer netting using 'side' column.")
         oi_df["dealer_side_mult"] = np.where(
             oi_df["side"].str.contains("short", case=False, na=False), 1, -1
@@ -3,6 +3,10 @@ import asyncio, json, time, uuid, aiohttp, websockets, orjson, sys
 import logging
 from dealer_flow.config import settings
 from dealer_flow.redis_stream import get_redis, STREAM_KEY_RAW # Keep for raw ticker data
+from dealer_flow.feed_capture import FrameCaptureWriter
+from dealer_flow.tick_schema import TickEncoder, INSTRUMENT_REGISTRY_KEY, instrument_fields, register_names
+from dealer_flow.shm_ring import ShmRingWriter, RingRawTransport
+from dealer_flow import rest_bootstrap
 # New stream key for book summaries
 STREAM_KEY_BOOK_SUMMARIES_FEED = "deribit_book_summaries_feed"
 
@@ -100,6 +104,38 @@ async def unsubscribe_channels_chunked(ws, channels: list):
         await asyncio.sleep(0.1) # Small delay
 
 
+async def publish_tick(redis, encoder: TickEncoder, channel: str, data, msg_raw):
+    """XADDs one ticker / price-index notification to dealer_raw in the configured tick_format."""
+    fields = {}
+    if settings.tick_format in ("json", "both"):
+        fields["d"] = msg_raw
+    if settings.tick_format in ("binary", "both"):
+        if channel.startswith("ticker.") and isinstance(data, dict):
+            # Registration must be visible before the first record that uses the id.
+            await register_names(redis, encoder.registry, [data.get("instrument_name")])
+        record, _ = encoder.encode(channel, data)
+        if record:
+            fields["b"] = record
+    if fields:
+        await redis.xadd(STREAM_KEY_RAW, fields)
+
+
+async def publish_trades(redis, encoder: TickEncoder, data, msg_raw):
+    """XADDs one trades.option.* notification (a list of trades) to dealer_raw as one entry."""
+    fields = {}
+    if settings.tick_format in ("json", "both"):
+        fields["d"] = msg_raw
+    if settings.tick_format in ("binary", "both"):
+        if isinstance(data, list):
+            await register_names(redis, encoder.registry,
+                                 [tr.get("instrument_name") for tr in data if isinstance(tr, dict)])
+        records, _ = encoder.encode_trades(data)
+        if records:
+            fields["b"] = records
+    if fields:
+        await redis.xadd(STREAM_KEY_RAW, fields)
+
+
 class DeribitCollector:
     def __init__(self, redis_client):
         # ... (same as before)
@@ -112,6 +148,16 @@ class DeribitCollector:
         self.active_ticker_subscriptions = set()
         self._new_summary_event = asyncio.Event()
         self._shutdown_event = asyncio.Event()
+        self.tick_encoder = TickEncoder()
+        self.http = None  # pooled REST session for chain snapshots (rest_bootstrap)
+        self.capture = None
+        if settings.capture_dir:
+            self.capture = FrameCaptureWriter(
+                settings.capture_dir,
+                rotate_bytes=settings.capture_rotate_mb * 1024 * 1024,
+                rotate_seconds=settings.capture_rotate_seconds,
+            )
+            logger.info(f"Raw frame capture enabled → {settings.capture_dir}")
 
     async def _ensure_auth(self): # same
         # ...
@@ -120,13 +166,12 @@ class DeribitCollector:
             self.is_authenticated_session = self.token is not None
         return self.is_authenticated_session
 
-    async def _handle_book_summary(self, data): # same
-        # ...
+    async def _handle_book_summary(self, data, recv_ts=None):
         if isinstance(data, list):
             self.latest_instrument_summaries = data
             self._new_summary_event.set() 
             logger.info(f"Received book_summary with {len(data)} instruments.")
-            payload_to_store = { "ts": time.time(), "summary_data": data }
+            payload_to_store = { "ts": recv_ts or time.time(), "summary_data": data }
             try:
                 await self.redis.xadd( STREAM_KEY_BOOK_SUMMARIES_FEED, {"d": orjson.dumps(payload_to_store)} )
                 logger.debug(f"Pushed book_summary (len {len(data)}) to {STREAM_KEY_BOOK_SUMMARIES_FEED}")
@@ -137,6 +182,81 @@ class DeribitCollector:
             logger.warning(f"Received book_summary with unexpected data type: {type(data)}")
 
 
+    async def _handle_subscription(self, channel: str, data, msg_raw, recv_ts: float):
+        if channel.startswith("book_summary.option."):
+            await self._handle_book_summary(data, recv_ts)
+        elif channel.startswith("deribit_price_index.") or channel.startswith("ticker."):
+            await publish_tick(self.redis, self.tick_encoder, channel, data, msg_raw)
+        elif channel.startswith("trades."):
+            await publish_trades(self.redis, self.tick_encoder, data, msg_raw)
+
+    async def _publish_snapshot(self, channel: str, data):
+        """A REST result published (and captured) as the WebSocket notification it stands for."""
+        recv_ts = time.time()
+        msg_raw = orjson.dumps({"jsonrpc": "2.0", "method": "subscription", "params": {"channel": channel, "data": data}})
+        if self.capture:
+            try:
+                self.capture.append(recv_ts, msg_raw)
+            except OSError as e:
+                logger.error(f"Frame capture write failed, disabling capture: {e}")
+                self.capture = None
+        await self._handle_subscription(channel, data, msg_raw, recv_ts)
+
+    async def snapshot_chain(self, limiter: rest_bootstrap.RateLimiter, exclude=(), refresh: bool = False) -> int:
+        """
+        Index price, book summary and a ticker per live contract not in `exclude`, over REST.
+        The cold start publishes the fetched book summary, which ranks the chain for the
+        subscription manager; a refresh reuses the streamed summary when there is one.
+        """
+        ccy = settings.currency
+        t0 = time.monotonic()
+        price = await rest_bootstrap.fetch_index(self.http, limiter, ccy)
+        await self._publish_snapshot(f"deribit_price_index.{ccy.lower()}_usd", {
+            "index_name": f"{ccy.lower()}_usd", "price": price, "timestamp": int(time.time() * 1000)})
+        summaries = self.latest_instrument_summaries if refresh else None
+        if not summaries:
+            summaries = await rest_bootstrap.fetch_book_summaries(self.http, limiter, ccy)
+            await self._publish_snapshot(f"book_summary.option.{ccy.lower()}.all", summaries)
+        now = time.time()
+        names = rest_bootstrap.rank_by_oi(summaries, exclude, keep=lambda name: self._is_live(name, now))
+        n = await rest_bootstrap.fetch_tickers(
+            self.http, limiter, names, settings.bootstrap_concurrency,
+            lambda name, data: self._publish_snapshot(f"ticker.{name}.100ms", data),
+        )
+        logger.info(f"REST {'refresh' if refresh else 'bootstrap'}: {n}/{len(names)} tickers "
+                    f"({len(summaries)} in the book summary) in {time.monotonic() - t0:.1f}s.")
+        return n
+
+    async def _rest_refresh_task(self):
+        """Low-rate snapshots of the contracts outside the live ticker subscriptions."""
+        limiter = rest_bootstrap.RateLimiter(settings.bootstrap_refresh_requests_per_second)
+        while not self._shutdown_event.is_set():
+            try:
+                await asyncio.wait_for(self._shutdown_event.wait(), timeout=settings.bootstrap_refresh_seconds)
+                break
+            except asyncio.TimeoutError:
+                pass
+            try:
+                await self.snapshot_chain(limiter, exclude=set(self.active_ticker_subscriptions), refresh=True)
+            except Exception as e:
+                logger.error(f"REST refresh failed: {e}")
+
+    async def _load_instrument_registry(self):
+        try:
+            self.tick_encoder.registry.load(await self.redis.hgetall(INSTRUMENT_REGISTRY_KEY))
+            logger.info(f"Loaded {len(self.tick_encoder.registry)} instrument ids from {INSTRUMENT_REGISTRY_KEY}.")
+        except Exception as e:
+            logger.error(f"Failed to load instrument registry: {e}", exc_info=True)
+
+    def _is_live(self, name: str, now: float) -> bool:
+        """False once an option is past its 08:00 UTC settlement (the summary can still list it)."""
+        fields = instrument_fields(name)
+        return fields is None or fields[1] > now
+
+    def _start_subscription_manager(self) -> asyncio.Task:
+        # The event is left set: a summary already in (the REST bootstrap's) ranks the chain at once.
+        return asyncio.create_task(self._manage_ticker_subscriptions_task())
+
     async def _manage_ticker_subscriptions_task(self):
         logger.info("Dynamic ticker subscription manager task started.")
         while not self._shutdown_event.is_set():
@@ -169,9 +289,11 @@ class DeribitCollector:
 
             logger.debug(f"Managing ticker subscriptions. Have {len(self.latest_instrument_summaries)} summaries.")
             
+            now = time.time()
             valid_summaries = [
                 s for s in self.latest_instrument_summaries 
                 if isinstance(s, dict) and "instrument_name" in s and isinstance(s.get("open_interest"), (int, float))
+                and self._is_live(s["instrument_name"], now)
             ]
             sorted_by_oi = sorted(valid_summaries, key=lambda x: x.get("open_interest", 0.0), reverse=True)
             
@@ -213,7 +335,8 @@ class DeribitCollector:
             if not initial_subscriptions_done:
                 base_channels = [
                     f"deribit_price_index.{settings.currency.lower()}_usd",
-                    f"book_summary.option.{settings.currency.lower()}.all"
+                    f"book_summary.option.{settings.currency.lower()}.all",
+                    f"trades.option.{settings.currency}.100ms",  # whole option chain's tape, for dealer sign
                 ]
                 logger.info(f"Sending initial base subscriptions: {base_channels}")
                 # Use chunked version, though for 2 channels it's not strictly needed
@@ -222,7 +345,13 @@ class DeribitCollector:
 
             try:
                 msg_raw = await asyncio.wait_for(self.ws.recv(), timeout=5.0)
-                # ... (rest of message parsing logic as before)
+                recv_ts = time.time()
+                if self.capture:
+                    try:
+                        self.capture.append(recv_ts, msg_raw)
+                    except OSError as e:
+                        logger.error(f"Frame capture write failed, disabling capture: {e}")
+                        self.capture = None
                 msg_json = orjson.loads(msg_raw)
                 logger.debug(f"< WS RECV: {str(msg_raw)[:250]}") 
 
@@ -230,13 +359,7 @@ class DeribitCollector:
                 params = msg_json.get("params")
 
                 if method == "subscription":
-                    channel = params.get("channel")
-                    data = params.get("data")
-                    
-                    if channel.startswith("book_summary.option."):
-                        await self._handle_book_summary(data)
-                    elif channel.startswith("deribit_price_index.") or channel.startswith("ticker."):
-                        await self.redis.xadd(STREAM_KEY_RAW, {"d": msg_raw}) 
+                    await self._handle_subscription(params.get("channel"), params.get("data"), msg_raw, recv_ts)
                 elif msg_json.get("id") and "result" in msg_json: # Check 'id' first
                      # Check if it's a response to our public/test
                     if isinstance(msg_json["result"], dict) and msg_json["result"].get("version"):
@@ -276,7 +399,17 @@ class DeribitCollector:
         # ...
         logger.info("Collector run_forever starting.")
         subscription_manager_task_handle = None # Use a more descriptive name
-        
+        await self._load_instrument_registry()
+        refresh_task = None
+        if settings.bootstrap_enabled:
+            self.http = rest_bootstrap.new_session(settings.bootstrap_concurrency)
+            try: # Whole chain before streaming: greek store, strikes and subscription ranking in one pass
+                await self.snapshot_chain(rest_bootstrap.RateLimiter(settings.bootstrap_requests_per_second))
+            except Exception as e:
+                logger.error(f"REST bootstrap failed, starting from the WebSocket alone: {e}")
+            if settings.bootstrap_refresh_seconds > 0:
+                refresh_task = asyncio.create_task(self._rest_refresh_task())
+
         while not self._shutdown_event.is_set():
             await self._ensure_auth() 
             
@@ -307,8 +440,7 @@ class DeribitCollector:
                                 except Exception as e_task:
                                     logger.error(f"Subscription manager task exited with error: {e_task}", exc_info=True)
                             logger.info("Starting/Restarting dynamic ticker subscription manager task.")
-                            self._new_summary_event.clear() # Clear before starting task
-                            subscription_manager_task_handle = asyncio.create_task(self._manage_ticker_subscriptions_task())
+                            subscription_manager_task_handle = self._start_subscription_manager()
                     elif subscription_manager_task_handle and not subscription_manager_task_handle.done():
                         # If we lose auth, we might want to stop it or let it pause itself
                         logger.info("Lost authentication. Subscription manager will pause if running.")
@@ -328,6 +460,11 @@ class DeribitCollector:
             await asyncio.sleep(5)
         
         logger.info("Collector run_forever loop ended.")
+        if refresh_task is not None:
+            refresh_task.cancel()
+        if self.http is not None:
+            await self.http.close()
+            self.http = None
         if subscription_manager_task_handle and not subscription_manager_task_handle.done():
             logger.info("Attempting to cancel and wait for subscription manager task...")
             subscription_manager_task_handle.cancel()
@@ -343,12 +480,19 @@ class DeribitCollector:
         # ...
         logger.info("Collector stop requested.")
         self._shutdown_event.set()
+        if self.capture:
+            self.capture.close()
+            self.capture = None
         if self.ws: 
             asyncio.create_task(self.ws.close(code=1000, reason="Collector shutdown"))
 
 async def main_run_collector(): # Renamed for clarity
     # ... (same as your main_run, just using the new name)
     redis_client = await get_redis()
+    if settings.raw_transport == "shm":
+        ring = ShmRingWriter.create(settings.shm_ring_name, settings.shm_ring_slots, settings.shm_slot_size)
+        redis_client = RingRawTransport(redis_client, ring, STREAM_KEY_RAW)
+        logger.info(f"dealer_raw entries go to shm ring '{settings.shm_ring_name}' instead of Redis.")
     collector = DeribitCollector(redis_client)
     try:
         await collector.run_forever()
@@ -0,0 +1,103 @@
+# dealer_flow/expiry_wheel.py
+"""
+Expiry- and idle-driven lifecycle of per-instrument state.
+
+Deribit options settle at 08:00 UTC on their expiry date (tick_schema.expiry_ts). Without
+eviction, every contract ever seen stays in the greek store. T is then clamped to 0, but its
+notional still counts towards the roll-up. ExpiryWheel is a hashed timing wheel: `slots`
+buckets of `resolution` seconds. An instrument sits in the bucket of its deadline:
+    deadline = min(expiry, last_seen + idle_seconds)    (idle_seconds 0 → expiry only)
+advance(now) visits only the buckets the clock crossed since the previous call. A publish
+tick therefore costs O(instruments due) and not O(instruments):
+    - deadline more than one rotation away → stays in its bucket and is re-checked next time round
+    - idle deadline reached but touched since → moved to the bucket of its new deadline
+touch() is a dict store on the hot path and never moves buckets. An instrument that is
+already past expiry is refused, so a late ticker cannot bring it back. Eviction lags the
+deadline by at most one `resolution`.
+"""
+import logging
+from typing import Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+EXPIRED, IDLE = "expired", "idle"
+
+
+class ExpiryWheel:
+    def __init__(self, idle_seconds: float = 0.0, resolution: float = 60.0, slots: int = 4096):
+        self.idle_seconds = idle_seconds
+        self.resolution = resolution
+        self._slots = [set() for _ in range(slots)]
+        self.expiry: Dict[str, float] = {}
+        self.last_seen: Dict[str, float] = {}
+        self._due: Dict[str, int] = {}  # name → wheel tick of the bucket holding it
+        self._cursor: Optional[int] = None  # first tick not yet visited
+        self.evicted = {EXPIRED: 0, IDLE: 0}
+
+    def __len__(self):
+        return len(self.expiry)
+
+    def __contains__(self, name):
+        return name in self.expiry
+
+    def _tick(self, ts: float) -> int:
+        return int(ts // self.resolution)
+
+    def _deadline(self, name: str) -> float:
+        if self.idle_seconds > 0:
+            return min(self.expiry[name], self.last_seen[name] + self.idle_seconds)
+        return self.expiry[name]
+
+    def _schedule(self, name: str, deadline: float):
+        tick = self._tick(deadline)
+        self._due[name] = tick
+        self._slots[tick % len(self._slots)].add(name)
+
+    def touch(self, name: str, expiry_ts: float, now: float) -> bool:
+        """Marks `name` as live at `now`; False (and nothing stored) once it has expired."""
+        if now >= expiry_ts:
+            return False
+        self.last_seen[name] = now
+        if name not in self.expiry:
+            self.expiry[name] = expiry_ts
+            if self._cursor is None:
+                self._cursor = self._tick(now)
+            self._schedule(name, self._deadline(name))
+        return True
+
+    def discard(self, name: str):
+        """Forgets `name` without counting an eviction; its bucket entry is dropped lazily."""
+        self.expiry.pop(name, None)
+        self.last_seen.pop(name, None)
+        self._due.pop(name, None)
+
+    def advance(self, now: float) -> List[str]:
+        """Names whose deadline passed before the current `resolution` bucket, removed from the wheel."""
+        if self._cursor is None:
+            return []
+        end = self._tick(now)
+        n = len(self._slots)
+        gone = []
+        for tick in range(max(self._cursor, end - n), end):  # a gap longer than a rotation visits each bucket once
+            bucket = self._slots[tick % n]
+            if not bucket:
+                continue
+            for name in list(bucket):
+                due = self._due.get(name)
+                if due is not None and due > tick and due % n == tick % n:
+                    continue  # a later rotation
+                bucket.discard(name)
+                if due is None or due % n != tick % n:
+                    continue  # stale: discarded or moved
+                deadline = self._deadline(name)
+                if deadline > now:
+                    self._schedule(name, deadline)  # touched since it was scheduled
+                    continue
+                self.evicted[EXPIRED if self.expiry[name] <= now else IDLE] += 1
+                self.discard(name)
+                gone.append(name)
+        self._cursor = max(self._cursor, end)
+        return gone
+
+    def stats(self) -> dict:
+        return {"live": len(self.expiry), "evicted_expired": self.evicted[EXPIRED], "evicted_idle": self.evicted[IDLE]}
@@ -0,0 +1,92 @@
+# dealer_flow/exposures.py
+"""
+Per-strike and per-expiry dealer exposure vectors.
+
+maybe_publish() already groups signed greeks by strike for the gamma flip; these profiles
+are published alongside the scalar metrics to the dealer_exposures stream (MAXLEN ~60):
+
+    h   JSON header {"ts", "spot", "strike": {"rows", "columns"}, "expiry": {"rows", "columns"}}
+    s   per-strike matrix, float64 little-endian, row-major (rows × len(STRIKE_COLUMNS))
+    e   per-expiry matrix, same layout (rows × len(EXPIRY_COLUMNS))
+
+Dollar scalings match vanna_charm_volga.roll_up, so each profile sums to NGI / VSS /
+CHL_24h / VOLG. rest_service serves them as JSON, raw float64 or Arrow IPC.
+"""
+from typing import Dict, Optional
+
+import numpy as np
+import orjson
+import pandas as pd
+
+STREAM_KEY_EXPOSURES = "dealer_exposures"
+EXPOSURES_MAXLEN = 60
+
+VALUE_COLUMNS = ["gamma_usd_1pct", "vanna_usd", "charm_usd_24h", "volga_usd"]
+STRIKE_COLUMNS = ["strike"] + VALUE_COLUMNS
+EXPIRY_COLUMNS = ["expiry_ts"] + VALUE_COLUMNS
+KINDS = {"strike": (b"s", STRIKE_COLUMNS), "expiry": (b"e", EXPIRY_COLUMNS)}
+
+
+def _dollar_frame(signed: pd.DataFrame) -> pd.DataFrame:
+    n = signed["notional_usd"]
+    return pd.DataFrame({
+        "gamma_usd_1pct": signed["gamma"] * n * 0.01,
+        "vanna_usd": signed["vanna"] * n * 0.01,
+        "charm_usd_24h": signed["charm"] * n / 365.0,
+        "volga_usd": signed["volga"] * n * 0.01,
+    }, index=signed.index)
+
+
+def profile(signed: pd.DataFrame, key: pd.Series) -> np.ndarray:
+    """(rows × 5) float64: sorted key values, then summed dollar exposures per key."""
+    dollars = _dollar_frame(signed)
+    dollars["key"] = key.to_numpy()
+    grouped = dollars.dropna(subset=["key"]).groupby("key", sort=True)[VALUE_COLUMNS].sum()
+    out = np.empty((len(grouped), 1 + len(VALUE_COLUMNS)), dtype="<f8")
+    out[:, 0] = grouped.index.to_numpy(dtype="f8")
+    out[:, 1:] = grouped.to_numpy(dtype="f8")
+    return out
+
+
+def encode(ts: float, spot: float, by_strike: np.ndarray, by_expiry: np.ndarray) -> Dict[str, bytes]:
+    header = {
+        "ts": ts, "spot": spot,
+        "strike": {"rows": len(by_strike), "columns": STRIKE_COLUMNS},
+        "expiry": {"rows": len(by_expiry), "columns": EXPIRY_COLUMNS},
+    }
+    return {
+        "h": orjson.dumps(header),
+        "s": np.ascontiguousarray(by_strike, dtype="<f8").tobytes(),
+        "e": np.ascontiguousarray(by_expiry, dtype="<f8").tobytes(),
+    }
+
+
+def decode(fields: Dict[bytes, bytes], kind: str):
+    """(header, matrix view) for kind 'strike' or 'expiry'; the view aliases the entry bytes."""
+    field, columns = KINDS[kind]
+    header = orjson.loads(fields[b"h"])
+    matrix = np.frombuffer(fields[field], dtype="<f8").reshape(-1, len(columns))
+    return header, matrix
+
+
+def to_json(header: dict, matrix: np.ndarray, kind: str) -> bytes:
+    columns = KINDS[kind][1]
+    return orjson.dumps({
+        "ts": header["ts"], "spot": header["spot"], "columns": columns,
+        "data": {c: np.ascontiguousarray(matrix[:, i]) for i, c in enumerate(columns)},
+    }, option=orjson.OPT_SERIALIZE_NUMPY)
+
+
+def to_arrow_ipc(header: dict, matrix: np.ndarray, kind: str) -> Optional[bytes]:
+    """Arrow IPC stream bytes, or None when pyarrow is not installed."""
+    try:
+        import pyarrow as pa
+    except ImportError:
+        return None
+    columns = KINDS[kind][1]
+    table = pa.table({c: np.ascontiguousarray(matrix[:, i]) for i, c in enumerate(columns)})
+    table = table.replace_schema_metadata({"ts": str(header["ts"]), "spot": str(header["spot"])})
+    sink = pa.BufferOutputStream()
+    with pa.ipc.new_stream(sink, table.schema) as writer:
+        writer.write_table(table)
+    return sink.getvalue().to_pybytes()
@@ -0,0 +1,152 @@
+# dealer_flow/feed_capture.py
+"""
+Raw WebSocket frame capture and read-back.
+
+A capture directory holds rotating gzip segments plus an index:
+
+    frames-<first_ts_ms>.seg.gz   sequence of records  <d recv_ts><I len><frame bytes>
+    index.jsonl                   one line per closed segment
+                                  {"file", "first_ts", "last_ts", "frames", "bytes"}
+
+Segment names sort chronologically. A segment that was still open when the
+process died is not in the index but is still readable up to its last
+complete record.
+"""
+import gzip
+import os
+import struct
+import time
+import zlib
+import logging
+from typing import Iterator, List, Optional, Tuple, Union
+
+import orjson
+
+logger = logging.getLogger(__name__)
+
+RECORD_HEADER = struct.Struct("<dI")  # recv_ts (epoch seconds), frame length
+INDEX_FILE = "index.jsonl"
+SEGMENT_PREFIX = "frames-"
+SEGMENT_SUFFIX = ".seg.gz"
+
+
+class FrameCaptureWriter:
+    """
+    Appends receive-timestamped frames to the current segment; rotates by size or age.
+    Writes are buffered, so append() is cheap enough to call from the recv loop.
+    """
+
+    def __init__(self, directory: str, rotate_bytes: int = 256 * 1024 * 1024,
+                 rotate_seconds: float = 3600.0, compresslevel: int = 1):
+        self.directory = directory
+        self.rotate_bytes = rotate_bytes
+        self.rotate_seconds = rotate_seconds
+        self.compresslevel = compresslevel
+        os.makedirs(directory, exist_ok=True)
+        self._raw = None
+        self._gz = None
+        self._file_name = None
+        self._opened_mono = 0.0
+        self._first_ts = 0.0
+        self._last_ts = 0.0
+        self._frames = 0
+        self._bytes = 0
+
+    def _open_segment(self, recv_ts: float):
+        self._file_name = f"{SEGMENT_PREFIX}{int(recv_ts * 1000):015d}{SEGMENT_SUFFIX}"
+        path = os.path.join(self.directory, self._file_name)
+        self._raw = open(path, "ab", buffering=1 << 20)
+        self._gz = gzip.GzipFile(fileobj=self._raw, mode="ab", compresslevel=self.compresslevel)
+        self._opened_mono = time.monotonic()
+        self._first_ts = recv_ts
+        self._frames = 0
+        self._bytes = 0
+        logger.info(f"Capture: opened segment {path}")
+
+    def _close_segment(self):
+        if self._gz is None:
+            return
+        self._gz.close()
+        self._raw.close()
+        entry = {
+            "file": self._file_name, "first_ts": self._first_ts, "last_ts": self._last_ts,
+            "frames": self._frames, "bytes": self._bytes,
+        }
+        with open(os.path.join(self.directory, INDEX_FILE), "ab") as idx:
+            idx.write(orjson.dumps(entry) + b"\n")
+        logger.info(f"Capture: closed segment {self._file_name} ({self._frames} frames, {self._bytes} bytes)")
+        self._gz = self._raw = self._file_name = None
+
+    def append(self, recv_ts: float, frame: Union[bytes, str]):
+        if isinstance(frame, str):
+            frame = frame.encode()
+        if self._gz is not None and (
+            self._bytes >= self.rotate_bytes
+            or time.monotonic() - self._opened_mono >= self.rotate_seconds
+        ):
+            self._close_segment()
+        if self._gz is None:
+            self._open_segment(recv_ts)
+        self._gz.write(RECORD_HEADER.pack(recv_ts, len(frame)))
+        self._gz.write(frame)
+        self._last_ts = recv_ts
+        self._frames += 1
+        self._bytes += RECORD_HEADER.size + len(frame)
+
+    def close(self):
+        self._close_segment()
+
+
+def read_index(directory: str) -> List[dict]:
+    path = os.path.join(directory, INDEX_FILE)
+    if not os.path.exists(path):
+        return []
+    with open(path, "rb") as f:
+        return [orjson.loads(line) for line in f if line.strip()]
+
+
+def list_segments(directory: str) -> List[str]:
+    return sorted(
+        name for name in os.listdir(directory)
+        if name.startswith(SEGMENT_PREFIX) and name.endswith(SEGMENT_SUFFIX)
+    )
+
+
+def _iter_segment(path: str) -> Iterator[Tuple[float, bytes]]:
+    header_size = RECORD_HEADER.size
+    with gzip.open(path, "rb") as gz:
+        try:
+            while True:
+                header = gz.read(header_size)
+                if len(header) < header_size:
+                    return
+                recv_ts, length = RECORD_HEADER.unpack(header)
+                frame = gz.read(length)
+                if len(frame) < length:
+                    return
+                yield recv_ts, frame
+        except (EOFError, zlib.error):
+            # Segment left open by a crashed writer: keep what is complete.
+            logger.warning(f"Capture: truncated segment {path}, stopping at last complete record.")
+
+
+def iter_frames(directory: str, start_ts: Optional[float] = None,
+                end_ts: Optional[float] = None) -> Iterator[Tuple[float, bytes]]:
+    """
+    Yields (recv_ts, frame) in capture order, optionally restricted to [start_ts, end_ts].
+    Indexed segments entirely outside the range are skipped without decompressing.
+    """
+    indexed = {e["file"]: e for e in read_index(directory)}
+    for name in list_segments(directory):
+        entry = indexed.get(name)
+        if entry is not None:
+            if start_ts is not None and entry["last_ts"] < start_ts:
+                continue
+            if end_ts is not None and entry["first_ts"] > end_ts:
+                continue
+        for recv_ts, frame in _iter_segment(os.path.join(directory, name)):
+            if start_ts is not None and recv_ts < start_ts:
+                continue
+            if end_ts is not None and recv_ts > end_ts:
+                return
+            yield recv_ts, frame
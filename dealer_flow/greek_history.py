@@ -0,0 +1,105 @@
+# dealer_flow/greek_history.py
+"""
+Per-instrument greek snapshots: processor → dealer_greeks stream → ClickHouse.
+
+At every roll (ROLL_FREQ, 1s) maybe_publish() packs the greek store into one GREEK_DTYPE
+record per instrument. It XADDs them as a single binary blob under field b"d", the same
+fixed-layout / np.frombuffer approach as tick_schema. The ClickHouse writer appends the
+decoded arrays to a RecordBuffer and inserts one contiguous column per field. No Python
+object is created per row on either side.
+
+Each row carries what the roll-up used for that instrument, so an NGI move can be traced
+back to strikes afterwards:
+    gamma / vanna / charm / volga   as summed by roll_up (gamma is our BS gamma)
+    gamma_deribit                   Deribit's gamma from the same ticker (NaN when absent)
+    notional_usd, mark_iv, customer_net (trade tape), dealer_sign (dealer_net)
+    instrument, strike, expiry, option_type
+
+Rows carry the contract name itself and not a tick_schema registry id: on the JSON tick path
+the processor numbers instruments locally, so its ids change with every restart.
+
+The table (created by the writer at startup, see ensure_greek_table) is sorted by
+(instrument, ts). Neighbouring rows then belong to one contract, so the per-instrument columns
+compress to almost nothing under Delta / Gorilla + ZSTD. Partitions are daily and a TTL
+drops old days (GREEK_HISTORY_TTL_DAYS, 0 → keep).
+"""
+import logging
+
+import numpy as np
+import pandas as pd
+
+logger = logging.getLogger(__name__)
+
+STREAM_KEY_GREEKS = "dealer_greeks"
+GREEKS_MAXLEN = 300  # ~5 min of rolls (~100 B per instrument each) buffered in Redis if the writer falls behind
+TABLE_INSTRUMENT_GREEKS = "dealer_instrument_greeks_v1"
+
+GREEK_DTYPE = np.dtype([
+    ("ts", "<i8"),              # roll time, epoch ms
+    ("instrument", "S32"),      # contract name, ASCII (BTC-27JUN25-100000-C)
+    ("expiry", "<u4"),          # epoch seconds, 08:00 UTC
+    ("option_type", "u1"),      # 1 call, 0 put
+    ("dealer_sign", "i1"),      # dealer_side_mult
+    ("strike", "<f8"),
+    ("gamma", "<f8"),
+    ("gamma_deribit", "<f8"),
+    ("vanna", "<f8"),
+    ("charm", "<f8"),
+    ("volga", "<f8"),
+    ("notional_usd", "<f8"),
+    ("mark_iv", "<f8"),
+    ("customer_net", "<f8"),
+])
+FLOAT_FIELDS = ("strike", "gamma", "gamma_deribit", "vanna", "charm", "volga", "notional_usd", "mark_iv", "customer_net")
+
+GREEKS_DDL = """
+CREATE TABLE IF NOT EXISTS {db}.{table}
+(
+    instrument LowCardinality(String) CODEC(ZSTD(1)),
+    ts DateTime64(3, 'UTC') CODEC(DoubleDelta, ZSTD(1)),
+    expiry DateTime('UTC') CODEC(Delta, ZSTD(1)),
+    option_type UInt8 CODEC(ZSTD(1)),
+    dealer_sign Int8 CODEC(ZSTD(1)),
+    strike Float64 CODEC(Gorilla, ZSTD(1)),
+    gamma Float64 CODEC(Gorilla, ZSTD(1)),
+    gamma_deribit Float64 CODEC(Gorilla, ZSTD(1)),
+    vanna Float64 CODEC(Gorilla, ZSTD(1)),
+    charm Float64 CODEC(Gorilla, ZSTD(1)),
+    volga Float64 CODEC(Gorilla, ZSTD(1)),
+    notional_usd Float64 CODEC(Gorilla, ZSTD(1)),
+    mark_iv Float64 CODEC(Gorilla, ZSTD(1)),
+    customer_net Float64 CODEC(Gorilla, ZSTD(1))
+)
+ENGINE = MergeTree()
+PARTITION BY toYYYYMMDD(ts)
+ORDER BY (instrument, ts)
+{ttl}SETTINGS index_granularity = 8192
+"""
+
+
+def encode(ts: float, frame: pd.DataFrame) -> bytes:
+    """
+    One record per row of `frame`: the greek store after infer_dealer_net, with an `instrument`
+    column, unsigned greeks and dealer_side_mult.
+    """
+    rec = np.empty(len(frame), dtype=GREEK_DTYPE)
+    rec["ts"] = int(round(ts * 1000))
+    rec["instrument"] = frame["instrument"].to_numpy(dtype="S32") if "instrument" in frame else b""
+    for name in FLOAT_FIELDS:
+        rec[name] = frame[name].to_numpy(dtype="f8", na_value=np.nan) if name in frame else np.nan
+    rec["expiry"] = frame["expiry_ts"].to_numpy(dtype="f8") if "expiry_ts" in frame else 0
+    rec["option_type"] = frame["option_type"].to_numpy() if "option_type" in frame else 1
+    rec["dealer_sign"] = frame["dealer_side_mult"].to_numpy() if "dealer_side_mult" in frame else 1
+    return rec.tobytes()
+
+
+def decode(data: bytes) -> np.ndarray:
+    """Read-only view over one dealer_greeks payload."""
+    return np.frombuffer(data, dtype=GREEK_DTYPE)
+
+
+def ensure_greek_table(client, database: str, ttl_days: int = 0) -> str:
+    """Blocking; creates the table if missing and returns its name."""
+    ttl = f"TTL toDateTime(ts) + INTERVAL {int(ttl_days)} DAY\n" if ttl_days > 0 else ""
+    client.execute(GREEKS_DDL.format(db=database, table=TABLE_INSTRUMENT_GREEKS, ttl=ttl))
+    return TABLE_INSTRUMENT_GREEKS
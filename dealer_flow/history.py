@@ -0,0 +1,152 @@
+# dealer_flow/history.py
+"""
+Metric time series for /history: tier-aware fetch, server-side downsampling and a result cache.
+
+Methods (all return at most `points` points per metric):
+    lttb    Largest-Triangle-Three-Buckets over per-bucket averages fetched at
+            HISTORY_OVERSAMPLE × the target resolution; keeps peaks and troughs a plain
+            average would flatten.
+    minmax  min and max per bucket, computed by ClickHouse from the rollup states
+            (points / 2 buckets), i.e. an exact envelope.
+    avg     plain per-bucket average.
+
+Results for closed ranges (end older than HISTORY_CLOSED_LAG_SECONDS) are cached by
+HistoryCache (LRU + TTL); ranges touching "now" are always fetched.
+"""
+import datetime as dt
+import time
+from collections import OrderedDict
+from typing import Dict, Hashable, Optional, Sequence, Tuple
+
+import numpy as np
+from numba import njit
+
+from dealer_flow.metric_rollups import query_metrics
+
+METHODS = ("lttb", "minmax", "avg")
+HISTORY_OVERSAMPLE = 8
+HISTORY_CLOSED_LAG_SECONDS = 120.0
+
+
+@njit
+def _lttb_indices(x, y, n):
+    size = x.shape[0]
+    out = np.empty(n, np.int64)
+    out[0] = 0
+    out[n - 1] = size - 1
+    every = (size - 2) / (n - 2)
+    a = 0
+    for i in range(n - 2):
+        # average of the next bucket is the third triangle vertex
+        avg_start = int(np.floor((i + 1) * every)) + 1
+        avg_end = min(int(np.floor((i + 2) * every)) + 1, size)
+        if avg_end <= avg_start:
+            avg_start, avg_end = size - 1, size
+        avg_x = 0.0
+        avg_y = 0.0
+        for j in range(avg_start, avg_end):
+            avg_x += x[j]
+            avg_y += y[j]
+        avg_x /= avg_end - avg_start
+        avg_y /= avg_end - avg_start
+
+        best = int(np.floor(i * every)) + 1
+        max_area = -1.0
+        for j in range(int(np.floor(i * every)) + 1, int(np.floor((i + 1) * every)) + 1):
+            area = abs((x[a] - avg_x) * (y[j] - y[a]) - (x[a] - x[j]) * (avg_y - y[a]))
+            if area > max_area:
+                max_area = area
+                best = j
+        out[i + 1] = best
+        a = best
+    return out
+
+
+def lttb(x: np.ndarray, y: np.ndarray, n: int) -> Tuple[np.ndarray, np.ndarray]:
+    """Downsamples (x, y) to n points; NaN points are dropped first."""
+    keep = ~np.isnan(y)
+    x, y = x[keep], y[keep]
+    if n >= len(x) or len(x) < 3:
+        return x, y
+    if n < 3:
+        return x[[0, -1]][:n], y[[0, -1]][:n]
+    idx = _lttb_indices(x.astype(np.float64), y.astype(np.float64), n)
+    return x[idx], y[idx]
+
+
+class HistoryCache:
+    """LRU with a per-entry TTL; values are pre-serialized response bodies."""
+
+    def __init__(self, maxsize: int = 256, ttl_seconds: float = 3600.0):
+        self.maxsize = maxsize
+        self.ttl_seconds = ttl_seconds
+        self._data: "OrderedDict[Hashable, Tuple[float, bytes]]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key: Hashable, now: Optional[float] = None) -> Optional[bytes]:
+        now = now if now is not None else time.monotonic()
+        item = self._data.get(key)
+        if item is None or item[0] < now:
+            if item is not None:
+                del self._data[key]
+            self.misses += 1
+            return None
+        self._data.move_to_end(key)
+        self.hits += 1
+        return item[1]
+
+    def put(self, key: Hashable, value: bytes, now: Optional[float] = None):
+        now = now if now is not None else time.monotonic()
+        self._data[key] = (now + self.ttl_seconds, value)
+        self._data.move_to_end(key)
+        while len(self._data) > self.maxsize:
+            self._data.popitem(last=False)
+
+    def __len__(self):
+        return len(self._data)
+
+
+def is_closed(end_ts: float, now: Optional[float] = None) -> bool:
+    now = now if now is not None else time.time()
+    return end_ts <= now - HISTORY_CLOSED_LAG_SECONDS
+
+
+def _epoch_ms(t: dt.datetime) -> int:
+    if t.tzinfo is None:
+        t = t.replace(tzinfo=dt.timezone.utc)  # bucket columns are DateTime('UTC')
+    return int(t.timestamp() * 1000)
+
+
+def _column(rows, name: str) -> np.ndarray:
+    return np.array([np.nan if r[name] is None else r[name] for r in rows], dtype=np.float64)
+
+
+def fetch_history(client, database: str, metrics: Sequence[str], start_ts: float, end_ts: float,
+                  points: int, method: str) -> Dict:
+    """Blocking (runs on a ClickHouse pool thread). Returns the /history response body as a dict."""
+    if method not in METHODS:
+        raise ValueError(f"method must be one of {METHODS}")
+    span = max(end_ts - start_ts, 1.0)
+    if method == "lttb":
+        resolution, stats = span / (points * HISTORY_OVERSAMPLE), ("avg",)
+    elif method == "minmax":
+        resolution, stats = span / max(points // 2, 1), ("min", "max")
+    else:
+        resolution, stats = span / points, ("avg",)
+    res = query_metrics(client, database, start_ts, end_ts, max(resolution, 1.0), metrics, stats)
+    rows = res["rows"]
+    t_ms = np.array([_epoch_ms(r["t"]) for r in rows], dtype=np.int64)
+
+    series = {}
+    for m in metrics:
+        if method == "minmax":
+            series[m] = {"t": t_ms.tolist(), "min": _column(rows, f"{m}_min").tolist(),
+                         "max": _column(rows, f"{m}_max").tolist()}
+        elif method == "lttb":
+            t, v = lttb(t_ms, _column(rows, f"{m}_avg"), points)
+            series[m] = {"t": t.tolist(), "v": v.tolist()}
+        else:
+            series[m] = {"t": t_ms.tolist(), "v": _column(rows, f"{m}_avg").tolist()}
+    return {"start": start_ts, "end": end_ts, "method": method, "tier": res["tier"],
+            "resolution_s": res["resolution_s"], "series": series}
@@ -0,0 +1,193 @@
+# dealer_flow/loadtest.py
+"""
+Throughput benchmark: synthetic Deribit → collector → Redis → processor.
+
+Starts the synthetic feed in-process, launches collector and processor as child processes
+pointed at it, then ramps the ticker rate step by step. Per step it reports:
+    sent/s        ticker msgs/sec emitted by the synthetic feed
+    raw_in/s      entries/sec landing in dealer_raw
+    processed/s   entries/sec consumed by the processor group
+    delay_ms      processor staleness: now - timestamp of the last delivered dealer_raw id (p50/p99)
+    latency_ms    tick → metric: dealer_metrics publish time (entry id) - tick_ts, the synthetic
+                  send time of the newest ticker the processor had applied (p50/p99)
+    publish_gap_ms  dealer_metrics cadence: gap between consecutive publishes (p50/max)
+    rss_mb        collector / processor resident memory
+A step is sustainable if the processor keeps up (processed/s ≥ 95 % of sent/s, delay p99 under
+--max-delay-ms). The ramp stops at the first unsustainable step.
+
+    python -m dealer_flow.loadtest --rates 500,1000,2000,4000,8000 --step-seconds 20
+"""
+import argparse
+import asyncio
+import logging
+import os
+import sys
+import time
+from typing import List, Optional
+
+import numpy as np
+import orjson
+
+from dealer_flow.redis_stream import get_redis, STREAM_KEY_RAW, STREAM_KEY_METRICS
+from dealer_flow.processor import GROUP as PROCESSOR_GROUP
+from dealer_flow.synthetic_feed import SyntheticChain, SyntheticDeribitServer
+
+if __name__ == "__main__" and not logging.getLogger().hasHandlers():
+    logging.basicConfig(
+        level=logging.INFO,
+        format="%(asctime)s %(levelname)s %(name)s:%(lineno)d - LOADTEST: %(message)s"
+    )
+logger = logging.getLogger(__name__)
+
+SAMPLE_INTERVAL = 0.2
+SUSTAINABLE_RATIO = 0.95
+
+
+def rss_mb(pid: int) -> Optional[float]:
+    try:
+        with open(f"/proc/{pid}/status") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1]) / 1024.0
+    except OSError:
+        return None
+    return None
+
+
+def _id_ms(stream_id) -> int:
+    if isinstance(stream_id, bytes):
+        stream_id = stream_id.decode()
+    return int(str(stream_id).split("-")[0])
+
+
+async def _group_info(redis, stream: str, group: str) -> Optional[dict]:
+    for g in await redis.xinfo_groups(stream):
+        name = g.get("name")
+        if (name.decode() if isinstance(name, bytes) else name) == group:
+            return g
+    return None
+
+
+async def _spawn(module: str, env: dict):
+    return await asyncio.create_subprocess_exec(
+        sys.executable, "-m", module, env=env,
+        stdout=asyncio.subprocess.DEVNULL, stderr=asyncio.subprocess.DEVNULL,
+    )
+
+
+async def run_step(redis, server: SyntheticDeribitServer, rate: float, seconds: float,
+                   pids: dict, max_delay_ms: float) -> dict:
+    server.msgs_per_sec = rate
+    await asyncio.sleep(1.0)  # let the new rate settle
+
+    sent0 = server.sent_tickers
+    len0 = await redis.xlen(STREAM_KEY_RAW)
+    g0 = await _group_info(redis, STREAM_KEY_RAW, PROCESSOR_GROUP) or {}
+    read0 = g0.get("entries-read") or 0
+    t0 = time.monotonic()
+
+    delays: List[float] = []
+    latencies: List[float] = []
+    publish_gaps: List[float] = []
+    last = await redis.xrevrange(STREAM_KEY_METRICS, count=1)
+    last_metric_id = last[0][0] if last else None
+    while time.monotonic() - t0 < seconds:
+        await asyncio.sleep(SAMPLE_INTERVAL)
+        g = await _group_info(redis, STREAM_KEY_RAW, PROCESSOR_GROUP)
+        if g and g.get("last-delivered-id"):
+            delays.append(time.time() * 1000 - _id_ms(g["last-delivered-id"]))
+        start = "-" if last_metric_id is None else "(" + last_metric_id.decode()  # exclusive (Redis >= 6.2)
+        for mid, fields in await redis.xrange(STREAM_KEY_METRICS, min=start, max="+"):
+            tick_ts = orjson.loads(fields[b"d"]).get("tick_ts")
+            if tick_ts:
+                latencies.append(_id_ms(mid) - tick_ts * 1000)
+            if last_metric_id is not None:
+                publish_gaps.append(_id_ms(mid) - _id_ms(last_metric_id))
+            last_metric_id = mid
+
+    elapsed = time.monotonic() - t0
+    g1 = await _group_info(redis, STREAM_KEY_RAW, PROCESSOR_GROUP) or {}
+    sent_rate = (server.sent_tickers - sent0) / elapsed
+    raw_rate = (await redis.xlen(STREAM_KEY_RAW) - len0) / elapsed
+    processed_rate = ((g1.get("entries-read") or 0) - read0) / elapsed
+    delay_p99 = float(np.percentile(delays, 99)) if delays else float("inf")
+    result = {
+        "target_rate": rate,
+        "sent_per_s": round(sent_rate, 1),
+        "raw_in_per_s": round(raw_rate, 1),
+        "processed_per_s": round(processed_rate, 1),
+        "delay_ms_p50": round(float(np.percentile(delays, 50)), 1) if delays else None,
+        "delay_ms_p99": round(delay_p99, 1) if delays else None,
+        "latency_ms_p50": round(float(np.percentile(latencies, 50)), 1) if latencies else None,
+        "latency_ms_p99": round(float(np.percentile(latencies, 99)), 1) if latencies else None,
+        "publish_gap_ms_p50": round(float(np.percentile(publish_gaps, 50)), 1) if publish_gaps else None,
+        "publish_gap_ms_max": round(float(max(publish_gaps)), 1) if publish_gaps else None,
+        "rss_mb": {name: rss_mb(pid) for name, pid in pids.items()},
+    }
+    result["sustainable"] = (
+        sent_rate > 0
+        and processed_rate >= SUSTAINABLE_RATIO * sent_rate
+        and delay_p99 <= max_delay_ms
+    )
+    return result
+
+
+async def main():
+    ap = argparse.ArgumentParser(description="Ramp synthetic load through collector → Redis → processor.")
+    ap.add_argument("--rates", default="500,1000,2000,4000,8000,16000")
+    ap.add_argument("--step-seconds", type=float, default=20.0)
+    ap.add_argument("--warmup-seconds", type=float, default=10.0)
+    ap.add_argument("--port", type=int, default=8765)
+    ap.add_argument("--expiries", default="1,7,30,90")
+    ap.add_argument("--strikes", type=int, default=40)
+    ap.add_argument("--max-delay-ms", type=float, default=2000.0)
+    ap.add_argument("--out", default=None, help="write results as JSON")
+    args = ap.parse_args()
+
+    chain = SyntheticChain(expiry_days=[int(d) for d in args.expiries.split(",")], strikes_per_expiry=args.strikes)
+    server = SyntheticDeribitServer(chain, msgs_per_sec=float(args.rates.split(",")[0]))
+    await server.start("127.0.0.1", args.port)
+
+    env = dict(os.environ)
+    env.update({
+        "DERIBIT_WS": f"ws://127.0.0.1:{args.port}/ws/api/v2",
+        "DERIBIT_REST": f"http://127.0.0.1:{args.port}/api/v2",
+        "DERIBIT_ID": "synthetic",
+        "DERIBIT_SECRET": "synthetic",
+        "DERIBIT_MAX_AUTH_INSTRUMENTS": str(len(chain)),
+        "DYNAMIC_SUBSCRIPTION_REFRESH_INTERVAL_SECONDS": "5",
+        "CAPTURE_DIR": "",
+    })
+    redis = await get_redis()
+    procs = {
+        "processor": await _spawn("dealer_flow.processor", env),
+        "collector": await _spawn("dealer_flow.deribit_ws", env),
+    }
+    pids = {name: p.pid for name, p in procs.items()}
+    results = []
+    try:
+        logger.info(f"Warming up {args.warmup_seconds:.0f}s ({len(chain)} instruments)...")
+        await asyncio.sleep(args.warmup_seconds)
+        for rate in (float(r) for r in args.rates.split(",")):
+            res = await run_step(redis, server, rate, args.step_seconds, pids, args.max_delay_ms)
+            results.append(res)
+            logger.info(f"step: {res}")
+            if not res["sustainable"]:
+                break
+    finally:
+        for p in procs.values():
+            if p.returncode is None:
+                p.terminate()
+        await asyncio.gather(*(p.wait() for p in procs.values()), return_exceptions=True)
+        await server.stop()
+
+    ok = [r["sent_per_s"] for r in results if r["sustainable"]]
+    summary = {"max_sustainable_msgs_per_s": max(ok) if ok else 0.0, "steps": results}
+    print(orjson.dumps(summary, option=orjson.OPT_INDENT_2).decode())
+    if args.out:
+        with open(args.out, "wb") as f:
+            f.write(orjson.dumps(summary, option=orjson.OPT_INDENT_2))
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
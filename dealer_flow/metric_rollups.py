@@ -0,0 +1,223 @@
+# dealer_flow/metric_rollups.py
+"""
+Multi-resolution rollups of dealer_flow_metrics_v1 (1s / 1m / 1h).
+
+Each tier is an AggregatingMergeTree table fed by its own materialized view on the raw
+table, holding per-bucket min / max / avg / last states for every metric plus a
+scenario → count map. ensure_rollups() provisions missing tiers and views, backfilling
+whatever the tier has not counted yet from the raw table, and is run by the ClickHouse
+writer at startup.
+
+query_metrics() picks the coarsest tier that still satisfies the requested range and
+resolution, so a 30-day NGI chart reads ~720 hourly rows instead of 2.6M raw ones.
+"""
+import logging
+import time
+from typing import Dict, List, Optional, Sequence
+
+logger = logging.getLogger(__name__)
+
+RAW_TABLE = "dealer_flow_metrics_v1"
+
+# metric → ClickHouse value type in the raw table
+METRICS = {
+    "price": "Float64",
+    "NGI": "Float64",
+    "VSS": "Float64",
+    "CHL_24h": "Float64",
+    "VOLG": "Float64",
+    "HPP": "Float64",
+    "flip_pct": "Nullable(Float64)",
+    "msg_rate": "Int32",
+}
+STATS = ("min", "max", "avg", "last")
+
+# name, bucket seconds, TTL days (None = keep forever). Ordered fine → coarse.
+TIERS = (
+    ("1s", 1, 14),
+    ("1m", 60, 400),
+    ("1h", 3600, None),
+)
+TIER_SECONDS = {name: step for name, step, _ in TIERS}
+TIER_TTL_DAYS = {name: ttl for name, _, ttl in TIERS}
+
+
+def tier_table(tier: str) -> str:
+    return f"{RAW_TABLE}_{tier}"
+
+
+def tier_view(tier: str) -> str:
+    return f"{tier_table(tier)}_mv"
+
+
+def _state_types(value_type: str) -> Dict[str, str]:
+    return {
+        "min": f"AggregateFunction(min, {value_type})",
+        "max": f"AggregateFunction(max, {value_type})",
+        "avg": f"AggregateFunction(avg, {value_type})",
+        "last": f"AggregateFunction(argMax, {value_type}, DateTime64(3, 'UTC'))",
+    }
+
+
+def _state_exprs(metric: str) -> Dict[str, str]:
+    return {
+        "min": f"minState({metric})",
+        "max": f"maxState({metric})",
+        "avg": f"avgState({metric})",
+        "last": f"argMaxState({metric}, ts)",
+    }
+
+
+def _merge_exprs(metric: str) -> Dict[str, str]:
+    return {
+        "min": f"minMerge({metric}_min)",
+        "max": f"maxMerge({metric}_max)",
+        "avg": f"avgMerge({metric}_avg)",
+        "last": f"argMaxMerge({metric}_last)",
+    }
+
+
+def _bucket_expr(seconds: int, column: str = "ts") -> str:
+    return f"toStartOfInterval(toDateTime({column}, 'UTC'), INTERVAL {seconds} SECOND)"
+
+
+def create_table_sql(tier: str, database: str) -> str:
+    cols = ["    bucket DateTime('UTC') CODEC(Delta, ZSTD(1))", "    n AggregateFunction(count)"]
+    for metric, value_type in METRICS.items():
+        for stat, state_type in _state_types(value_type).items():
+            cols.append(f"    {metric}_{stat} {state_type}")
+    cols.append("    scenarios AggregateFunction(sumMap, Array(String), Array(UInt64))")
+    ttl = TIER_TTL_DAYS[tier]
+    return (
+        f"CREATE TABLE IF NOT EXISTS {database}.{tier_table(tier)}\n(\n" + ",\n".join(cols) + "\n)\n"
+        "ENGINE = AggregatingMergeTree()\n"
+        "PARTITION BY toYYYYMM(bucket)\n"
+        "ORDER BY (bucket)"
+        + (f"\nTTL bucket + INTERVAL {ttl} DAY" if ttl else "")
+    )
+
+
+def select_states_sql(tier: str, database: str, source: Optional[str] = None) -> str:
+    """
+    SELECT turning raw rows into one state row per bucket (used by the view and the backfill).
+    `source` replaces the raw table, e.g. with a subquery selecting only rows a tier missed.
+    """
+    exprs = [f"{_bucket_expr(TIER_SECONDS[tier])} AS bucket", "countState() AS n"]
+    for metric in METRICS:
+        for stat, expr in _state_exprs(metric).items():
+            exprs.append(f"{expr} AS {metric}_{stat}")
+    exprs.append("sumMapState([toString(scenario)], [toUInt64(1)]) AS scenarios")
+    source = source or f"{database}.{RAW_TABLE}"
+    return f"SELECT\n    " + ",\n    ".join(exprs) + f"\nFROM {source}\nGROUP BY bucket"
+
+
+def create_view_sql(tier: str, database: str) -> str:
+    return (
+        f"CREATE MATERIALIZED VIEW IF NOT EXISTS {database}.{tier_view(tier)}\n"
+        f"TO {database}.{tier_table(tier)}\nAS " + select_states_sql(tier, database)
+    )
+
+
+def missed_rows_sql(database: str, since: int, skip: int) -> str:
+    """
+    Raw rows from bucket start `since` (epoch s) on, minus the first `skip`: the rows a tier
+    whose view stopped inside that bucket has not counted.
+    """
+    return (f"(SELECT * FROM {database}.{RAW_TABLE} WHERE ts >= toDateTime64({int(since)}, 3, 'UTC') "
+            f"ORDER BY ts OFFSET {int(skip)} ROWS)")
+
+
+def ensure_rollups(client, database: str) -> List[str]:
+    """
+    Creates missing tier tables and views. A new tier is backfilled from the whole raw table.
+    A tier whose view is (re)created on an existing table gets the raw rows inserted while it
+    had no view: everything after its newest bucket, plus that bucket's rows beyond the count
+    it already holds (older buckets may have aged out through the TTL and are left alone).
+    Call this before the writer starts inserting so no row is counted twice. Returns the
+    tiers that were created or backfilled.
+    """
+    done = []
+    for tier, _, _ in TIERS:
+        table, view = f"{database}.{tier_table(tier)}", f"{database}.{tier_view(tier)}"
+        table_exists = client.execute(f"EXISTS TABLE {table}")[0][0]
+        view_exists = client.execute(f"EXISTS TABLE {view}")[0][0]
+        client.execute(create_table_sql(tier, database))
+        client.execute(create_view_sql(tier, database))
+        if table_exists and view_exists:
+            continue
+        t0 = time.perf_counter()
+        newest = client.execute(
+            f"SELECT toUnixTimestamp(bucket), countMerge(n) FROM {table} GROUP BY bucket ORDER BY bucket DESC LIMIT 1"
+        ) if table_exists else []
+        source = missed_rows_sql(database, *newest[0]) if newest else None
+        client.execute(f"INSERT INTO {table} " + select_states_sql(tier, database, source))
+        what = f"view recreated, backfilled from {newest[0][0]}" if newest else "backfilled"
+        logger.info(f"Rollup tier {tier_table(tier)}: {what} in {time.perf_counter() - t0:.1f}s")
+        done.append(tier)
+    return done
+
+
+def pick_tier(start_ts: float, end_ts: float, resolution_s: Optional[float] = None,
+              max_points: int = 2000, now: Optional[float] = None) -> str:
+    """
+    Coarsest tier whose bucket is no wider than the wanted resolution and whose TTL still
+    covers start_ts. Without an explicit resolution, one is derived from max_points.
+    Returns "raw" when even the 1s tier is too coarse or has aged out.
+    """
+    now = now if now is not None else time.time()
+    if resolution_s is None:
+        resolution_s = max((end_ts - start_ts) / max(max_points, 1), 0.0)
+    best = "raw"
+    for tier, step, ttl in TIERS:
+        if step > resolution_s:
+            break
+        if ttl is not None and start_ts < now - ttl * 86400:
+            continue
+        best = tier
+    return best
+
+
+def build_query(tier: str, database: str, resolution_s: float, metrics: Sequence[str] = ("NGI", "HPP"),
+                stats: Sequence[str] = STATS) -> str:
+    """
+    SQL returning (t, n, <metric>_<stat>..., scenarios) rows at `resolution_s`, re-bucketed
+    from `tier` (or straight from the raw table). Parameters: %(start)s / %(end)s epoch seconds.
+    """
+    unknown = [m for m in metrics if m not in METRICS] + [s for s in stats if s not in STATS]
+    if unknown:
+        raise ValueError(f"unknown metrics/stats: {unknown}")
+    step = max(int(resolution_s), 1)
+    if tier == "raw":
+        exprs = [f"{_bucket_expr(step)} AS t", "count() AS n"]
+        raw_exprs = {"min": "min({m})", "max": "max({m})", "avg": "avg({m})", "last": "argMax({m}, ts)"}
+        for m in metrics:
+            exprs += [f"{raw_exprs[s].format(m=m)} AS {m}_{s}" for s in stats]
+        exprs.append("sumMap([toString(scenario)], [toUInt64(1)]) AS scenarios")
+        source, where = f"{database}.{RAW_TABLE}", "ts >= toDateTime64(%(start)s, 3, 'UTC') AND ts < toDateTime64(%(end)s, 3, 'UTC')"
+    else:
+        exprs = [f"{_bucket_expr(step, 'bucket')} AS t", "countMerge(n) AS n"]
+        for m in metrics:
+            merges = _merge_exprs(m)
+            exprs += [f"{merges[s]} AS {m}_{s}" for s in stats]
+        exprs.append("sumMapMerge(scenarios) AS scenarios")
+        source, where = f"{database}.{tier_table(tier)}", "bucket >= toDateTime(%(start)s, 'UTC') AND bucket < toDateTime(%(end)s, 'UTC')"
+    return f"SELECT {', '.join(exprs)} FROM {source} WHERE {where} GROUP BY t ORDER BY t"
+
+
+def query_metrics(client, database: str, start_ts: float, end_ts: float, resolution_s: Optional[float] = None,
+                  metrics: Sequence[str] = ("NGI", "HPP"), stats: Sequence[str] = STATS,
+                  max_points: int = 2000) -> Dict:
+    """Runs build_query on the tier chosen by pick_tier; returns {"tier", "resolution_s", "rows": [dict]}."""
+    if resolution_s is None:
+        resolution_s = max((end_ts - start_ts) / max(max_points, 1), 1.0)
+    tier = pick_tier(start_ts, end_ts, resolution_s)
+    sql = build_query(tier, database, resolution_s, metrics, stats)
+    rows, cols = client.execute(sql, {"start": int(start_ts), "end": int(end_ts)}, with_column_types=True)
+    names = [c[0] for c in cols]
+    out = []
+    for row in rows:
+        d = dict(zip(names, row))
+        keys, counts = d.pop("scenarios")
+        d["scenarios"] = dict(zip(keys, (int(c) for c in counts)))
+        out.append(d)
+    return {"tier": tier, "resolution_s": max(int(resolution_s), 1), "rows": out}
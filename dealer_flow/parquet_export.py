@@ -0,0 +1,368 @@
+# dealer_flow/parquet_export.py
+"""
+Cold-tier exporter: metrics, instrument summaries and per-instrument greeks →
+Hive-partitioned Parquet under a local directory.
+
+    python -m dealer_flow.parquet_export /data/parquet --source redis --dataset all
+    python -m dealer_flow.parquet_export /data/parquet --source clickhouse --dataset metrics \\
+        --start 2025-06-01 --end 2025-07-01
+
+Layout (readable with pyarrow.dataset / pandas / duckdb, partition columns pushed down):
+
+    <root>/<dataset>/currency=<CUR>/date=<YYYY-MM-DD>/part-<first_ms>-<run>.parquet
+
+Sources:
+    redis       XRANGE over dealer_metrics, deribit_book_summaries_feed and dealer_raw (greeks
+                from binary tick records or JSON ticker frames), paged so memory stays bounded.
+    clickhouse  dealer_flow_metrics_v1 / deribit_instrument_summaries_v1 / dealer_instrument_greeks_v1,
+                one time window per query. Greek history has no open_interest, mark_price or
+                index_price; those columns export as NaN.
+
+Rows are buffered per partition and written as row groups of --row-group-rows; at most
+--max-open-files partition files are open at once. Instrument names and other low-cardinality
+strings are dictionary-encoded. Needs pyarrow, the optional `parquet` extra (poetry install -E parquet).
+"""
+import argparse
+import asyncio
+import datetime as dt
+import logging
+import os
+import time
+import uuid
+from collections import OrderedDict
+from typing import Dict, Iterator, List, Optional, Tuple
+
+import numpy as np
+import orjson
+
+from dealer_flow import greek_history
+from dealer_flow.config import settings
+from dealer_flow.tick_schema import InstrumentRegistry, TickEncoder, INSTRUMENT_REGISTRY_KEY, KIND_TICKER, decode as decode_ticks
+
+if __name__ == "__main__" and not logging.getLogger().hasHandlers():
+    logging.basicConfig(
+        level=logging.INFO,
+        format="%(asctime)s %(levelname)s %(name)s:%(lineno)d - PARQUET: %(message)s"
+    )
+logger = logging.getLogger(__name__)
+
+DAY_MS = 86_400_000
+REDIS_PAGE = 5000
+
+# dataset → (timestamp column, {column: numpy dtype}, dictionary-encoded columns)
+DATASETS = {
+    "metrics": ("ts", {
+        "ts": "i8", "price": "f8", "msg_rate": "i4", "NGI": "f8", "VSS": "f8", "CHL_24h": "f8",
+        "VOLG": "f8", "flip_pct": "f8", "HPP": "f8", "scenario": "O",
+    }, ("scenario",)),
+    "summaries": ("received_ts", {
+        "received_ts": "i8", "instrument_name": "O", "underlying_price": "f8", "underlying_index": "O",
+        "quote_currency": "O", "open_interest": "f8", "volume": "f8", "volume_usd": "f8",
+        "bid_iv": "f8", "ask_iv": "f8", "mark_iv": "f8", "interest_rate": "f8",
+    }, ("instrument_name", "underlying_index", "quote_currency")),
+    "greeks": ("ts", {
+        "ts": "i8", "instrument_name": "O", "strike": "f8", "expiry_ts": "f8", "option_type": "u1",
+        "mark_iv": "f8", "open_interest": "f8", "mark_price": "f8", "index_price": "f8",
+        "gamma": "f8", "vanna": "f8", "charm": "f8", "volga": "f8",
+    }, ("instrument_name",)),
+}
+
+
+def _pyarrow():
+    try:
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+    except ImportError as e:
+        raise RuntimeError("Parquet export needs pyarrow: poetry install -E parquet (or pip install pyarrow)") from e
+    return pa, pq
+
+
+def currency_of(names: np.ndarray, default: str) -> np.ndarray:
+    """'BTC-27JUN25-60000-C' → 'BTC'; rows without an instrument get `default`."""
+    return np.array([n.split("-", 1)[0] if n else default for n in names], dtype=object)
+
+
+def split_partitions(ts_ms: np.ndarray, currency: np.ndarray) -> Iterator[Tuple[Tuple[str, str], np.ndarray]]:
+    """Yields ((currency, 'YYYY-MM-DD'), row indices) for each partition present in a chunk."""
+    days = ts_ms // DAY_MS
+    for cur in np.unique(currency):
+        cur_idx = np.flatnonzero(currency == cur)
+        cur_days = days[cur_idx]
+        for day in np.unique(cur_days):
+            date = dt.datetime.fromtimestamp(int(day) * 86400, tz=dt.timezone.utc).strftime("%Y-%m-%d")
+            yield (str(cur), date), cur_idx[cur_days == day]
+
+
+class PartitionedParquetWriter:
+    def __init__(self, root: str, dataset: str, row_group_rows: int = 100_000,
+                 max_open_files: int = 16, compression: str = "zstd"):
+        self.pa, self.pq = _pyarrow()
+        self.root = root
+        self.dataset = dataset
+        self.ts_col, self.columns, dict_cols = DATASETS[dataset]
+        self.dict_cols = set(dict_cols)
+        self.row_group_rows = row_group_rows
+        self.max_open_files = max_open_files
+        self.compression = compression
+        self.run_id = uuid.uuid4().hex[:8]
+        self.schema = self._schema()
+        self._buffers: Dict[Tuple[str, str], List[Dict[str, np.ndarray]]] = {}
+        self._buffered_rows: Dict[Tuple[str, str], int] = {}
+        self._writers: "OrderedDict[Tuple[str, str], object]" = OrderedDict()
+        self.stats = {"rows": 0, "row_groups": 0, "files": 0}
+
+    def _schema(self):
+        pa = self.pa
+        fields = []
+        for name, dtype in self.columns.items():
+            if name == self.ts_col:
+                t = pa.timestamp("ms", tz="UTC")
+            elif name in self.dict_cols:
+                t = pa.dictionary(pa.int32(), pa.string())
+            elif dtype == "O":
+                t = pa.string()
+            else:
+                t = pa.from_numpy_dtype(np.dtype(dtype))
+            fields.append(pa.field(name, t))
+        return pa.schema(fields)
+
+    def add(self, cols: Dict[str, np.ndarray], currency: np.ndarray):
+        for key, idx in split_partitions(cols[self.ts_col], currency):
+            self._buffers.setdefault(key, []).append({c: v[idx] for c, v in cols.items()})
+            self._buffered_rows[key] = self._buffered_rows.get(key, 0) + len(idx)
+            if self._buffered_rows[key] >= self.row_group_rows:
+                self._flush(key)
+
+    def _writer(self, key: Tuple[str, str], first_ms: int):
+        w = self._writers.get(key)
+        if w is not None:
+            self._writers.move_to_end(key)
+            return w
+        if len(self._writers) >= self.max_open_files:
+            _, oldest = self._writers.popitem(last=False)
+            oldest.close()
+        cur, date = key
+        directory = os.path.join(self.root, self.dataset, f"currency={cur}", f"date={date}")
+        os.makedirs(directory, exist_ok=True)
+        path = os.path.join(directory, f"part-{first_ms}-{self.run_id}.parquet")
+        w = self.pq.ParquetWriter(path, self.schema, compression=self.compression,
+                                  use_dictionary=sorted(self.dict_cols))
+        self._writers[key] = w
+        self.stats["files"] += 1
+        return w
+
+    def _flush(self, key: Tuple[str, str]):
+        chunks = self._buffers.pop(key, None)
+        rows = self._buffered_rows.pop(key, 0)
+        if not chunks or not rows:
+            return
+        pa = self.pa
+        arrays = []
+        for f in self.schema:
+            values = np.concatenate([c[f.name] for c in chunks])
+            if f.name == self.ts_col:
+                arrays.append(pa.array(values.astype("i8"), type=pa.int64()).cast(f.type))
+            elif pa.types.is_dictionary(f.type):
+                arrays.append(pa.array(values, type=pa.string()).dictionary_encode())
+            elif f.type == pa.string():
+                arrays.append(pa.array(values, type=pa.string()))
+            else:
+                arrays.append(pa.array(values, type=f.type, from_pandas=True))  # NaN → null
+        writer = self._writer(key, int(chunks[0][self.ts_col][0]))
+        writer.write_table(pa.Table.from_arrays(arrays, schema=self.schema))
+        self.stats["rows"] += rows
+        self.stats["row_groups"] += 1
+
+    def close(self) -> Dict[str, int]:
+        for key in list(self._buffers):
+            self._flush(key)
+        for w in self._writers.values():
+            w.close()
+        self._writers.clear()
+        return self.stats
+
+
+def _buffer_arrays(buf) -> Dict[str, np.ndarray]:
+    return dict(zip(buf.columns, buf.to_numpy()))
+
+
+# ---------------------------------------------------------------- Redis source
+
+def _stream_id(ts: Optional[float], default: str) -> str:
+    return default if ts is None else f"{int(ts * 1000)}-0"
+
+
+async def _xrange_pages(redis, stream: str, start_ts: Optional[float], end_ts: Optional[float]):
+    start, end = _stream_id(start_ts, "-"), _stream_id(end_ts, "+")
+    while True:
+        page = await redis.xrange(stream, min=start, max=end, count=REDIS_PAGE)
+        if not page:
+            return
+        yield page
+        if len(page) < REDIS_PAGE:
+            return
+        start = "(" + page[-1][0].decode()  # exclusive start (Redis >= 6.2)
+
+
+async def export_redis(writer: PartitionedParquetWriter, start_ts: Optional[float], end_ts: Optional[float]):
+    from dealer_flow.redis_stream import get_redis, STREAM_KEY_METRICS, STREAM_KEY_RAW
+    from dealer_flow.deribit_ws import STREAM_KEY_BOOK_SUMMARIES_FEED
+    from dealer_flow.clickhouse_writer import ColumnBuffer, parse_dealer_metrics, parse_book_summary_message
+
+    redis = await get_redis()
+    columns = writer.columns
+    if writer.dataset in ("metrics", "summaries"):
+        stream, parser = ((STREAM_KEY_METRICS, parse_dealer_metrics) if writer.dataset == "metrics"
+                          else (STREAM_KEY_BOOK_SUMMARIES_FEED, parse_book_summary_message))
+        async for page in _xrange_pages(redis, stream, start_ts, end_ts):
+            buf = ColumnBuffer(columns)
+            for msg_id, fields in page:
+                raw = fields.get(b"d")
+                if raw:
+                    try:
+                        parser(raw, buf)
+                    except Exception as e:
+                        logger.warning(f"Skipping unparsable {stream} entry {msg_id.decode()}: {e}")
+            cols = _buffer_arrays(buf)
+            if writer.dataset == "metrics":
+                currency = np.full(len(buf), settings.currency, dtype=object)
+            else:
+                currency = currency_of(cols["instrument_name"], settings.currency)
+            writer.add(cols, currency)
+        return
+
+    # greeks: binary records decode directly; JSON frames are normalized through TickEncoder
+    registry = InstrumentRegistry()
+    registry.load(await redis.hgetall(INSTRUMENT_REGISTRY_KEY))
+    encoder = TickEncoder(registry)
+    async for page in _xrange_pages(redis, STREAM_KEY_RAW, start_ts, end_ts):
+        records = []
+        for _, fields in page:
+            if b"b" in fields:
+                records.append(fields[b"b"])
+            elif b"d" in fields:
+                params = (orjson.loads(fields[b"d"]).get("params") or {})
+                rec, _ = encoder.encode(params.get("channel") or "", params.get("data"))
+                if rec:
+                    records.append(rec)
+        ticks = decode_ticks(records)
+        ticks = ticks[ticks["kind"] == KIND_TICKER]
+        if not len(ticks):
+            continue
+        if int(ticks["inst_id"].max()) >= len(registry.names):  # registered after we loaded
+            registry.load(await redis.hgetall(INSTRUMENT_REGISTRY_KEY))
+        names = np.array(registry.names + [None], dtype=object)
+        inst = np.minimum(ticks["inst_id"], len(registry.names))
+        cols = {c: ticks[c] for c in columns if c not in ("ts", "instrument_name")}
+        cols["ts"] = ticks["ts_ms"]
+        cols["instrument_name"] = names[inst]
+        known = np.array([n is not None for n in cols["instrument_name"]], dtype=bool)
+        cols = {c: v[known] for c, v in cols.items()}
+        writer.add(cols, currency_of(cols["instrument_name"], settings.currency))
+
+
+# ----------------------------------------------------------- ClickHouse source
+
+CH_TABLES = {
+    "metrics": "dealer_flow_metrics_v1",
+    "summaries": "deribit_instrument_summaries_v1",
+    "greeks": greek_history.TABLE_INSTRUMENT_GREEKS,
+}
+# dataset column → ClickHouse column or expression, where the table differs from DATASETS
+CH_COLUMNS = {
+    "greeks": {
+        "instrument_name": "instrument", "expiry_ts": "toUnixTimestamp(expiry)",
+        "open_interest": "nan", "mark_price": "nan", "index_price": "nan",
+    },
+}
+
+
+def clickhouse_query(dataset: str) -> str:
+    """SELECT of DATASETS[dataset]'s columns, in order, for one [%(a)s, %(b)s) time window."""
+    ts_col, columns, _ = DATASETS[dataset]
+    source = CH_COLUMNS.get(dataset, {})
+    select = ", ".join(f"toUnixTimestamp64Milli({c})" if c == ts_col else source.get(c, c) for c in columns)
+    return (f"SELECT {select} FROM {CH_TABLES[dataset]} "
+            f"WHERE {ts_col} >= toDateTime64(%(a)s, 3, 'UTC') AND {ts_col} < toDateTime64(%(b)s, 3, 'UTC') "
+            f"ORDER BY {ts_col}")
+
+
+def export_clickhouse(writer: PartitionedParquetWriter, start_ts: float, end_ts: float, window_seconds: int = 3600):
+    from dealer_flow.clickhouse_writer import get_ch_client
+
+    if writer.dataset not in CH_TABLES:
+        raise ValueError(f"dataset {writer.dataset!r} is only exported from Redis")
+    client = get_ch_client()
+    columns = writer.columns
+    sql = clickhouse_query(writer.dataset)
+    try:
+        t = start_ts
+        while t < end_ts:
+            b = min(t + window_seconds, end_ts)
+            data = client.execute(sql, {"a": t, "b": b}, columnar=True)
+            if data and len(data[0]):
+                cols = {}
+                for (name, dtype), values in zip(columns.items(), data):
+                    values = np.asarray(values)
+                    if dtype == "O":
+                        cols[name] = values.astype(object)
+                    else:
+                        cols[name] = np.asarray(values, dtype="f8" if values.dtype == object else None).astype(dtype)
+                if writer.dataset == "metrics":
+                    currency = np.full(len(data[0]), settings.currency, dtype=object)
+                else:
+                    currency = currency_of(cols["instrument_name"], settings.currency)
+                writer.add(cols, currency)
+            t = b
+    finally:
+        client.disconnect()
+
+
+def _parse_time(value: Optional[str]) -> Optional[float]:
+    if value is None:
+        return None
+    try:
+        return float(value)
+    except ValueError:
+        d = dt.datetime.fromisoformat(value)
+        if d.tzinfo is None:
+            d = d.replace(tzinfo=dt.timezone.utc)
+        return d.timestamp()
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Export dealer_flow data to partitioned Parquet")
+    ap.add_argument("root")
+    ap.add_argument("--source", choices=("redis", "clickhouse"), default="redis")
+    ap.add_argument("--dataset", choices=tuple(DATASETS) + ("all",), default="all")
+    ap.add_argument("--start", help="epoch seconds or ISO date/time (UTC)")
+    ap.add_argument("--end", help="epoch seconds or ISO date/time (UTC)")
+    ap.add_argument("--row-group-rows", type=int, default=100_000)
+    ap.add_argument("--max-open-files", type=int, default=16)
+    ap.add_argument("--compression", default="zstd")
+    args = ap.parse_args()
+
+    start_ts, end_ts = _parse_time(args.start), _parse_time(args.end)
+    datasets = list(DATASETS) if args.dataset == "all" else [args.dataset]
+    if args.source == "clickhouse":
+        datasets = [d for d in datasets if d in CH_TABLES]
+        if start_ts is None:
+            ap.error("--start is required with --source clickhouse")
+        end_ts = end_ts if end_ts is not None else time.time()
+
+    for dataset in datasets:
+        t0 = time.perf_counter()
+        writer = PartitionedParquetWriter(args.root, dataset, args.row_group_rows, args.max_open_files, args.compression)
+        try:
+            if args.source == "redis":
+                asyncio.run(export_redis(writer, start_ts, end_ts))
+            else:
+                export_clickhouse(writer, start_ts, end_ts)
+        finally:
+            stats = writer.close()
+        logger.info(f"{dataset}: {stats['rows']} rows, {stats['row_groups']} row groups, "
+                    f"{stats['files']} files in {time.perf_counter() - t0:.1f}s")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,18 +1,29 @@
 # dealer_flow/processor.py
 import asyncio, time, orjson, pandas as pd, numpy as np, sys
-import re, datetime as dt, calendar
 import logging
 from collections import deque, defaultdict
 
 import aioredis # <--- Ensure aioredis.exceptions can be caught
 
+from dealer_flow.config import settings
 from dealer_flow.redis_stream import get_redis, STREAM_KEY_RAW, STREAM_KEY_METRICS
+from dealer_flow.shm_ring import ShmRingReader, RingOverrun, FIELD_TICK
 from dealer_flow.gamma_flip import gamma_flip_distance
 from dealer_flow.vanna_charm_volga import roll_up
 from dealer_flow.hpp_score import hpp
 from dealer_flow.rules import classify
 from dealer_flow.dealer_net import infer_dealer_net
 from dealer_flow.greek_calc import greeks as bs_greeks
+from dealer_flow.tick_schema import (
+    expiry_ts as _expiry_ts, decode as decode_ticks, InstrumentRegistry,
+    INSTRUMENT_REGISTRY_KEY, KIND_TICKER, KIND_INDEX, KIND_TRADE, instrument_fields,
+)
+from dealer_flow.trade_flow import TradeFlowBook
+from dealer_flow import exposures
+from dealer_flow.quantile_sketch import AdaptiveThresholds, seed_from_clickhouse
+from dealer_flow.expiry_wheel import ExpiryWheel
+from dealer_flow.spot_ws import STREAM_KEY_LIQUIDITY
+from dealer_flow import greek_history
 
 LOG_STORE_THRESHOLD = 5
 
@@ -20,7 +31,7 @@ JSON_OPTS = orjson.OPT_SERIALIZE_NUMPY
 GROUP, CONSUMER = "processor", "p1"
 BLOCK_MS = 200
 ROLL_FREQ = 1.0
-_DATE_RE = re.compile(r"(\d{1,2})([A-Z]{3})(\d{2})")
+LIQUIDITY_POLL_SECONDS = 1.0
 
 if not logging.getLogger().hasHandlers():
     logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(name)s:%(lineno)d %(message)s")
@@ -32,6 +43,17 @@ greek_store = {}
 gamma_by_strike = {} # Note: This global one isn't updated in the latest logic; current_gamma_by_strike is local to maybe_publish
 prices = deque(maxlen=1)
 tick_times = deque(maxlen=1000)
+last_tick_ts = [0.0]  # exchange timestamp of the newest ticker applied (epoch s), published as tick_ts
+instrument_registry = InstrumentRegistry()
+trade_flow = TradeFlowBook()  # customer net position per instrument id from the trades.* tape
+thresholds = AdaptiveThresholds(
+    half_life_seconds=settings.threshold_half_life_hours * 3600,
+    refresh_seconds=settings.threshold_refresh_seconds,
+    material_quantile=settings.threshold_material_quantile,
+)
+lifecycle = ExpiryWheel(idle_seconds=settings.instrument_idle_timeout_seconds)  # greek_store eviction
+liquidity = [None]  # newest dealer_liquidity payload from spot_ws
+_liquidity_polled = [0.0]
 
 
 async def wait_for_redis(redis_client, retries=10, delay_seconds=3): # Increased retries/delay
@@ -53,6 +75,25 @@ async def wait_for_redis(redis_client, retries=10, delay_seconds=3): # Increased
     logger.error(f"Redis not ready after {retries} retries. Processor might fail to connect or operate correctly.")
     return False
 
+async def seed_thresholds():
+    """Warms the adaptive-threshold sketches from ClickHouse history; failures just leave the defaults."""
+    if settings.threshold_seed_hours <= 0:
+        return
+    from dealer_flow.clickhouse_writer import get_ch_client  # clickhouse_writer imports this module
+
+    def run():
+        client = get_ch_client(use_numpy=False)
+        try:
+            return seed_from_clickhouse(thresholds, client, settings.clickhouse_db_name, settings.threshold_seed_hours)
+        finally:
+            client.disconnect()
+
+    try:
+        await asyncio.get_running_loop().run_in_executor(None, run)
+    except Exception as e:
+        logger.warning(f"Could not seed adaptive thresholds from ClickHouse, starting from defaults: {e}")
+
+
 async def ensure_group(r):
     try:
         await r.xgroup_create(STREAM_KEY_RAW, GROUP, id="$", mkstream=True)
@@ -66,11 +107,52 @@ async def ensure_group(r):
             logger.warning(f"Could not create or verify Redis stream group '{GROUP}' (may be non-critical if group exists): {e}")
 
 
-async def maybe_publish(redis):
-    # ... (existing maybe_publish logic from your last confirmed working version or my last good patch)
-    # For brevity, assuming the last version of maybe_publish is here.
-    # Key parts:
-    now = time.time()
+def evict_instruments(now: float):
+    """
+    Drops contracts past settlement or idle for instrument_idle_timeout_seconds from the greek
+    store. Only settled ones leave trade_flow: the tape is not replayed when an idle contract
+    ticks again, so its customer net must survive the gap.
+    """
+    gone = lifecycle.advance(now)
+    if not gone:
+        return
+    for name in gone:
+        greek_store.pop(name, None)
+    ids = instrument_registry.ids
+    settled = [name for name in gone if (instrument_fields(name) or (0.0, 0.0, 0))[1] <= now]
+    if settled:
+        trade_flow.evict([ids.get(name, -1) for name in settled])
+    logger.info(f"PROCESSOR: Evicted {len(gone)} instruments (e.g. {gone[0]}); {len(greek_store)} live. {lifecycle.stats()}")
+
+
+async def refresh_liquidity(redis, now: float):
+    """Newest dealer_liquidity entry, polled at most every LIQUIDITY_POLL_SECONDS."""
+    if now - _liquidity_polled[0] < LIQUIDITY_POLL_SECONDS:
+        return
+    _liquidity_polled[0] = now
+    try:
+        last = await redis.xrevrange(STREAM_KEY_LIQUIDITY, count=1)
+    except Exception as e:
+        logger.debug(f"No {STREAM_KEY_LIQUIDITY} read: {e}")
+        return
+    if last:
+        liquidity[0] = orjson.loads(last[0][1][b"d"])
+
+
+def liquidity_inputs(now: float):
+    """(ADV USD, min of bid/ask ±1% depth USD) from a fresh spot_ws payload, else (None, None)."""
+    liq = liquidity[0]
+    if not liq or now - liq.get("ts", 0.0) > settings.liquidity_stale_seconds:
+        return None, None
+    depths = [liq.get("depth_bid_usd"), liq.get("depth_ask_usd")]
+    return liq.get("adv_usd"), (min(depths) if None not in depths else None)
+
+
+async def maybe_publish(redis, now=None):
+    # `now` lets replay drive publishing on capture time instead of wall-clock time.
+    now = time.time() if now is None else now
+    evict_instruments(now)
+    await refresh_liquidity(redis, now)
     while tick_times and now - tick_times[0] > 1.0:
         tick_times.popleft()
 
@@ -81,11 +163,20 @@ async def maybe_publish(redis):
     if not greek_store:
         return
         
-    df = pd.DataFrame.from_dict(greek_store, orient="index")
+    df = pd.DataFrame(list(greek_store.values()), index=list(greek_store))  # same frame as from_dict(orient="index"), ~3x faster
     if df.empty:
         return
+    ids = instrument_registry.ids
+    inst_ids = np.fromiter((ids.get(n, -1) for n in df.index), np.int64, len(df))
+    df["customer_net"] = trade_flow.customer_net(inst_ids)
 
     dealer = infer_dealer_net(df.reset_index(names="instrument"))
+    if settings.greek_history:
+        # per-instrument snapshot at the roll cadence, unsigned greeks + dealer sign (greek_history)
+        await redis.xadd(
+            greek_history.STREAM_KEY_GREEKS, {"d": greek_history.encode(now, dealer)},
+            maxlen=greek_history.GREEKS_MAXLEN, approximate=True,
+        )
     signed = dealer.copy()
     greeks_to_sign = ["gamma", "vanna", "charm", "volga"]
     
@@ -108,7 +199,9 @@ async def maybe_publish(redis):
         if current_spot_for_payload > last_pub_price[0]: spot_move_sign = 1
         elif current_spot_for_payload < last_pub_price[0]: spot_move_sign = -1
     
-    HPP_val = hpp(spot_move_sign, agg.get("NGI", 0.0), agg.get("VSS", 0.0), agg.get("CHL_24h", 0.0))
+    weights = thresholds.current
+    HPP_val = hpp(spot_move_sign, agg.get("NGI", 0.0), agg.get("VSS", 0.0), agg.get("CHL_24h", 0.0),
+                  alpha=weights["alpha"], beta=weights["beta"])
     
     spot_change_pct = 0.0
     if last_pub_price[0] > 0:
@@ -120,31 +213,322 @@ async def maybe_publish(redis):
     }
     total_notional_usd = signed["notional_usd"].sum() if "notional_usd" in signed and not signed["notional_usd"].empty else 1.0
     adv_usd_placeholder = total_notional_usd * 0.001 if total_notional_usd > 0 else 1.0 
+    adv_usd, depth_usd = liquidity_inputs(now)
+    adv_usd = adv_usd or adv_usd_placeholder  # placeholder only until spot_ws has a venue ADV
 
-    scenario = classify(flow_for_classify, adv_usd=adv_usd_placeholder, spot_change_pct=spot_change_pct)
+    scenario = classify(flow_for_classify, adv_usd=adv_usd, spot_change_pct=spot_change_pct,
+                        material_ratio=weights["material_ratio"])
+    thresholds.observe(now, flow_for_classify, adv_usd)
     last_pub_price[0] = current_spot_for_payload
 
     payload = {
-        "ts": now, "price": current_spot_for_payload, "msg_rate": len(tick_times),
-        **agg, "flip_pct": flip, "HPP": HPP_val, "scenario": scenario,
+        "ts": now, "tick_ts": last_tick_ts[0], "price": current_spot_for_payload, "msg_rate": len(tick_times),
+        **agg, "flip_pct": flip, "HPP": HPP_val, "scenario": scenario, "adv_usd": adv_usd,
+        "hedge_depth_ratio": abs(flow_for_classify["NGI"]) / depth_usd if depth_usd else None,
     }
     await redis.xadd(
         STREAM_KEY_METRICS,
         {"d": orjson.dumps(payload, option=JSON_OPTS)}
     )
+    if "strike" in signed.columns:
+        expiry = signed["instrument"].map(lambda name: (instrument_fields(name) or (None, np.nan, None))[1])
+        await redis.xadd(
+            exposures.STREAM_KEY_EXPOSURES,
+            exposures.encode(now, current_spot_for_payload, exposures.profile(signed, signed["strike"]),
+                             exposures.profile(signed, expiry)),
+            maxlen=exposures.EXPOSURES_MAXLEN, approximate=True,
+        )
     logger.debug(f"Published metrics: Price={current_spot_for_payload:.2f}, NGI={agg.get('NGI',0):.4f}, VSS={agg.get('VSS',0):.4f}")
 
 
-def _expiry_ts(sym: str) -> float:
-    # ... (existing _expiry_ts logic)
-    date_part = sym.split("-")[1]
-    m = _DATE_RE.fullmatch(date_part)
-    if not m: raise ValueError(f"unparsable date {date_part}")
-    day, mon, yy = int(m[1]), m[2], int(m[3])
-    month_num = dt.datetime.strptime(mon, "%b").month
-    year_full = 2000 + yy
-    dt_exp = dt.datetime(year_full, month_num, day, 8, tzinfo=dt.timezone.utc)
-    return dt_exp.timestamp()
+def handle_raw_message(raw_msg_data: bytes, now=None):
+    """
+    Applies one raw collector frame (price index, ticker or option trades) to the in-memory state.
+    `now` overrides the wall clock for tick-rate accounting (used by replay).
+    """
+    j = orjson.loads(raw_msg_data)
+    params = j.get("params", {})
+    ch = params.get("channel")
+    msg_payload = params.get("data")
+
+    if ch and ch.startswith("trades.") and isinstance(msg_payload, list):
+        for tr in msg_payload:
+            name = tr.get("instrument_name") if isinstance(tr, dict) else None
+            if name and instrument_fields(name) is not None:
+                amount = float(tr.get("amount") or 0.0)
+                inst_id, _ = instrument_registry.assign(name)
+                trade_flow.apply_one(KIND_TRADE, inst_id, amount if tr.get("direction") == "buy" else -amount)
+        return
+
+    if not isinstance(msg_payload, dict) or not ch: return
+
+    if ch.lower().startswith("deribit_price_index"):
+        current_spot_price = float(msg_payload.get("price") or msg_payload.get("index_price") or 0.0)
+        if current_spot_price > 0: spot[0] = current_spot_price
+        return 
+
+    if ch.startswith("ticker."):
+        mark_price = float(msg_payload.get("mark_price", 0.0))
+        inst = msg_payload.get("instrument_name")
+        if not inst: return
+
+        strike_str = inst.split("-")[2] if len(inst.split("-")) > 2 else None
+        if not strike_str: return
+        strike = float(strike_str)
+
+        try: expiry_ts = _expiry_ts(inst)
+        except ValueError: return
+        option_type = instrument_fields(inst)[2]  # names end in -C / -P
+        if not lifecycle.touch(inst, expiry_ts, time.time() if now is None else now): return  # settled
+
+        now_ts = msg_payload.get("timestamp", time.time() * 1000) / 1000
+        if now_ts > last_tick_ts[0]: last_tick_ts[0] = now_ts
+        T = max((expiry_ts - now_ts), 0.0) / (365 * 24 * 3600)
+
+        open_interest = msg_payload.get("open_interest", 0.0)
+        inst_id, _ = instrument_registry.assign(inst)  # JSON frames carry names; ids only key trade_flow here
+        trade_flow.apply_one(KIND_TICKER, inst_id, float(open_interest or 0.0))
+        current_underlying_price = spot[0] or mark_price 
+        notional = open_interest * current_underlying_price if current_underlying_price > 0 else 0.0
+
+        deriv_greeks = msg_payload.get("greeks", {})
+        gamma_deribit = deriv_greeks.get("gamma") 
+        vanna_deribit = deriv_greeks.get("vanna")
+        charm_deribit = deriv_greeks.get("charm")
+        volga_deribit = deriv_greeks.get("volga")
+
+        gamma = float(gamma_deribit) if gamma_deribit is not None else None
+        vanna = float(vanna_deribit) if vanna_deribit is not None else None
+        charm = float(charm_deribit) if charm_deribit is not None else None
+        volga = float(volga_deribit) if volga_deribit is not None else None
+
+        sigma = msg_payload.get("mark_iv", 0.0) / 100.0
+        can_calc_bs = sigma > 0 and T > 0 and current_underlying_price > 0
+        calculated_gamma_bs = None
+
+        if can_calc_bs:
+            S_param_bs = np.array([current_underlying_price])
+            K_param_bs = np.array([strike])
+
+            _g_calc, v_calc, c_calc, vg_calc = bs_greeks(
+                S_param_bs, K_param_bs, np.array([T]),
+                0.0, np.array([sigma]), np.array([option_type])
+            )
+
+            calculated_gamma_bs = float(_g_calc[0]) if not np.isnan(_g_calc[0]) else 0.0
+            gamma = calculated_gamma_bs 
+
+            if vanna is None: vanna = float(v_calc[0]) if not np.isnan(v_calc[0]) else 0.0
+            if charm is None: charm = float(c_calc[0]) if not np.isnan(c_calc[0]) else 0.0
+            if volga is None: volga = float(vg_calc[0]) if not np.isnan(vg_calc[0]) else 0.0
+        else: 
+            if gamma is None: gamma = 0.0
+            if vanna is None: vanna = 0.0
+            if charm is None: charm = 0.0
+            if volga is None: volga = 0.0
+
+        gamma = gamma if gamma is not None else 0.0
+        vanna = vanna if vanna is not None else 0.0
+        charm = charm if charm is not None else 0.0
+        volga = volga if volga is not None else 0.0
+
+        # logger.info(...) # Your detailed GREEK_PROCESSING log
+
+        final_greeks_payload = {
+            "gamma": gamma, "vanna": vanna, "charm": charm, "volga": volga,
+            "notional_usd": notional, "strike": strike,
+            "gamma_deribit": float(gamma_deribit) if gamma_deribit is not None else np.nan,
+            "mark_iv": float(msg_payload.get("mark_iv", np.nan)), "expiry_ts": expiry_ts,
+            "option_type": option_type,
+        }
+        greek_store[inst] = final_greeks_payload
+
+        if len(greek_store) % LOG_STORE_THRESHOLD == 0 and len(greek_store) > 0:
+            logger.info(f"PROCESSOR: Stored greeks for {len(greek_store)} instruments. Latest: {inst}")
+
+    tick_times.append(time.time() if now is None else now)
+
+
+def handle_tick_batch(records: np.ndarray, now=None):
+    """
+    Binary-path equivalent of handle_raw_message for a decoded batch (tick_schema.TICK_DTYPE).
+    Greeks for the whole batch are computed with one vectorised bs_greeks call.
+    """
+    if not len(records):
+        return
+    trade_flow.apply(records)
+    kind = records["kind"]
+
+    # Spot as each record saw it: forward-fill index prices through the batch.
+    idx_px = np.where((kind == KIND_INDEX) & (records["index_price"] > 0), records["index_price"], np.nan)
+    pos = np.where(np.isnan(idx_px), -1, np.arange(len(records)))
+    np.maximum.accumulate(pos, out=pos)
+    spot_seen = np.where(pos >= 0, idx_px[np.maximum(pos, 0)], spot[0])
+    if pos[-1] >= 0:
+        spot[0] = float(idx_px[pos[-1]])
+
+    is_ticker = kind == KIND_TICKER
+    t = records[is_ticker]
+    if not len(t):
+        return
+    S = np.where(spot_seen[is_ticker] > 0, spot_seen[is_ticker], t["mark_price"])
+    T = np.maximum(t["expiry_ts"] - t["ts_ms"] / 1000.0, 0.0) / (365 * 24 * 3600)
+    notional = np.where(S > 0, t["open_interest"] * S, 0.0)
+    sigma = t["mark_iv"] / 100.0
+
+    gamma_deribit = t["gamma"]
+    gamma, vanna, charm, volga = (t[c].copy() for c in ("gamma", "vanna", "charm", "volga"))
+    can_calc_bs = (sigma > 0) & (T > 0) & (S > 0)
+    if can_calc_bs.any():
+        g_calc, v_calc, c_calc, vg_calc = bs_greeks(
+            S[can_calc_bs], t["strike"][can_calc_bs], T[can_calc_bs],
+            0.0, sigma[can_calc_bs], t["option_type"][can_calc_bs].astype(np.float64),
+        )
+        gamma[can_calc_bs] = g_calc  # our BS gamma always replaces Deribit's
+        for arr, calc in ((vanna, v_calc), (charm, c_calc), (volga, vg_calc)):
+            sub = arr[can_calc_bs]
+            arr[can_calc_bs] = np.where(np.isnan(sub), calc, sub)
+    for arr in (gamma, vanna, charm, volga):
+        np.nan_to_num(arr, copy=False, nan=0.0)
+
+    before = len(greek_store)
+    names = instrument_registry.names
+    ts_now = time.time() if now is None else now
+    inst_ids = t["inst_id"].tolist()
+    strikes = t["strike"].tolist()
+    rows = zip(inst_ids, gamma.tolist(), vanna.tolist(), charm.tolist(), volga.tolist(), notional.tolist(), strikes,
+               t["expiry_ts"].tolist(), gamma_deribit.tolist(), t["mark_iv"].tolist(), t["option_type"].tolist())
+    for inst_id, g, v, c, vg, n, k, exp, gd, iv, ot in rows:
+        inst = names[inst_id] if inst_id < len(names) else None
+        if inst is None or not lifecycle.touch(inst, exp, ts_now):
+            continue
+        greek_store[inst] = {"gamma": g, "vanna": v, "charm": c, "volga": vg, "notional_usd": n, "strike": k,
+                             "gamma_deribit": gd, "mark_iv": iv, "expiry_ts": exp, "option_type": ot}
+    if len(greek_store) // LOG_STORE_THRESHOLD != before // LOG_STORE_THRESHOLD:
+        logger.info(f"PROCESSOR: Stored greeks for {len(greek_store)} instruments.")
+
+    last_tick_ts[0] = max(last_tick_ts[0], float(t["ts_ms"].max()) / 1000.0)
+    tick_times.extend([ts_now] * len(t))
+
+
+async def resolve_instruments(redis, records: np.ndarray):
+    """Reloads the collector's id registry if the batch carries ids we have not seen yet."""
+    ids = records["inst_id"][records["kind"] == KIND_TICKER]
+    if not len(ids):
+        return
+    top = int(ids.max())
+    names = instrument_registry.names
+    if top < len(names) and all(names[i] is not None for i in np.unique(ids).tolist()):
+        return
+    instrument_registry.load(await redis.hgetall(INSTRUMENT_REGISTRY_KEY))
+
+
+async def process_entries(redis, msgs):
+    """
+    Applies one batch of dealer_raw entries [(id, fields)]: binary tick records are decoded
+    and applied in bulk, legacy JSON frames one by one.
+    """
+    binary_ticks = []
+    for mid, data_dict in msgs:
+        tick_record = data_dict.get(b"b")
+        if tick_record:
+            binary_ticks.append(tick_record)
+            continue
+        raw_msg_data = data_dict.get(b"d")
+        if not raw_msg_data: continue
+        try:
+            handle_raw_message(raw_msg_data)
+        except Exception as e:
+            failing_message_id = mid.decode() if isinstance(mid, bytes) else str(mid)
+            logger.error(f"PROCESSOR MSG PARSE ERR (msg_id: {failing_message_id}): {e} -- Failing Msg: {str(raw_msg_data)[:200]}", exc_info=False) # Keep exc_info False or True based on verbosity preference
+    if binary_ticks:
+        try:
+            records = decode_ticks(binary_ticks)
+            await resolve_instruments(redis, records)
+            handle_tick_batch(records)
+        except ValueError as e:
+            logger.error(f"PROCESSOR BINARY TICK DECODE ERR ({len(binary_ticks)} records): {e}")
+
+
+async def processor_from_queue(bus, shutdown_event=None):
+    """
+    Single-process variant of processor(): consumes dealer_raw entries from an in-memory
+    bounded queue (single_process.InProcessBus) instead of XREADGROUP and publishes through it.
+    """
+    logger.info("PROCESSOR: in-process mode, waiting for data …")
+    await seed_thresholds()
+    batch_size = 500
+    last_pub = time.time()
+    while shutdown_event is None or not shutdown_event.is_set():
+        try:
+            try:
+                first = await asyncio.wait_for(bus.raw.get(), timeout=BLOCK_MS / 1000.0)
+            except asyncio.TimeoutError:
+                first = None
+            if first is not None:
+                batch = [first]
+                while len(batch) < batch_size:
+                    try:
+                        batch.append(bus.raw.get_nowait())
+                    except asyncio.QueueEmpty:
+                        break
+                await process_entries(bus, batch)
+                bus.note_consumed(batch)
+
+            current_loop_time = time.time()
+            if current_loop_time - last_pub >= ROLL_FREQ:
+                await maybe_publish(bus)
+                last_pub = current_loop_time
+        except Exception as e:
+            logger.error(f"Unhandled error in in-process processor loop: {e}", exc_info=True)
+            await asyncio.sleep(1)
+
+
+async def processor_from_ring(redis_connection):
+    """
+    dealer_raw over the shared-memory ring (RAW_TRANSPORT=shm). Each polled batch is copied out
+    of the ring and seqlock-checked (ShmRingReader.take) before anything is applied, so torn
+    slots are dropped; Redis is still used for the instrument registry and for publishing metrics.
+    """
+    reader = ShmRingReader.attach(settings.shm_ring_name, settings.shm_overrun_policy, wait_seconds=60.0)
+    logger.info(f"PROCESSOR: consuming shm ring '{settings.shm_ring_name}' ({reader.n_slots} slots), waiting for data …")
+    poll_sleep = settings.shm_poll_interval_ms / 1000.0
+    last_pub = time.time()
+    last_stats = time.time()
+    while True:
+        try:
+            polled = reader.poll(500)
+            if polled is None:
+                await asyncio.sleep(poll_sleep)
+            else:
+                first_seq, view = polled
+                rows = reader.take(first_seq, view)
+                if len(rows) < len(view):
+                    logger.warning(f"PROCESSOR: dropped {len(view) - len(rows)} ring entries from seq {first_seq}, "
+                                   f"overwritten while being read.")
+                if "rec" in rows.dtype.names and (rows["field"] == FIELD_TICK).all():
+                    records = rows["rec"]
+                    await resolve_instruments(redis_connection, records)
+                    handle_tick_batch(records)
+                else:
+                    await process_entries(redis_connection, reader.entries(first_seq, rows))
+
+            current_loop_time = time.time()
+            if current_loop_time - last_pub >= ROLL_FREQ:
+                await maybe_publish(redis_connection)
+                last_pub = current_loop_time
+            if current_loop_time - last_stats >= 60.0:
+                logger.info(f"PROCESSOR: shm ring lag={reader.lag()} stats={reader.stats}")
+                last_stats = current_loop_time
+        except (aioredis.exceptions.ConnectionError, ConnectionRefusedError) as e:
+            logger.error(f"Redis connection error in ring processor: {e}. Retrying...", exc_info=True)
+            await asyncio.sleep(5)
+            redis_connection = await get_redis()
+        except RingOverrun:
+            raise  # SHM_OVERRUN_POLICY=fail: let the supervisor restart us
+        except Exception as e:
+            logger.error(f"Unhandled error in ring processor loop: {e}", exc_info=True)
+            await asyncio.sleep(1)
 
 
 async def processor():
@@ -162,6 +546,12 @@ async def processor():
         # Decide if this is critical enough to stop the processor
         # For now, we'll let it try to continue, as xreadgroup might still work if group exists.
 
+    await seed_thresholds()
+
+    if settings.raw_transport == "shm":
+        await processor_from_ring(redis_connection)
+        return
+
     logger.info("PROCESSOR: started, waiting for data …")
     last_pub = time.time()
 
@@ -171,103 +561,7 @@ async def processor():
             resp = await redis_connection.xreadgroup(GROUP, CONSUMER, streams={STREAM_KEY_RAW: ">"}, count=500, block=BLOCK_MS)
             if resp:
                 for _, msgs in resp:
-                    for mid, data_dict in msgs:
-                        # ... (the rest of your existing processing loop for messages)
-                        # For brevity, assuming the message processing logic is here.
-                        # Key part from your latest working/patched version:
-                        try:
-                            raw_msg_data = data_dict.get(b"d")
-                            if not raw_msg_data: continue
-                            
-                            j = orjson.loads(raw_msg_data)
-                            params = j.get("params", {})
-                            ch = params.get("channel")
-                            msg_payload = params.get("data")
-
-                            if not isinstance(msg_payload, dict) or not ch: continue
-                            
-                            if ch.lower().startswith("deribit_price_index"):
-                                current_spot_price = float(msg_payload.get("price") or msg_payload.get("index_price") or 0.0)
-                                if current_spot_price > 0: spot[0] = current_spot_price
-                                continue 
-
-                            if ch.startswith("ticker."):
-                                mark_price = float(msg_payload.get("mark_price", 0.0))
-                                inst = msg_payload.get("instrument_name")
-                                if not inst: continue
-                                
-                                strike_str = inst.split("-")[2] if len(inst.split("-")) > 2 else None
-                                if not strike_str: continue
-                                strike = float(strike_str)
-
-                                try: expiry_ts = _expiry_ts(inst)
-                                except ValueError: continue
-
-                                now_ts = msg_payload.get("timestamp", time.time() * 1000) / 1000
-                                T = max((expiry_ts - now_ts), 0.0) / (365 * 24 * 3600)
-                                
-                                open_interest = msg_payload.get("open_interest", 0.0)
-                                current_underlying_price = spot[0] or mark_price 
-                                notional = open_interest * current_underlying_price if current_underlying_price > 0 else 0.0
-
-                                deriv_greeks = msg_payload.get("greeks", {})
-                                gamma_deribit = deriv_greeks.get("gamma") 
-                                vanna_deribit = deriv_greeks.get("vanna")
-                                charm_deribit = deriv_greeks.get("charm")
-                                volga_deribit = deriv_greeks.get("volga")
-
-                                gamma = float(gamma_deribit) if gamma_deribit is not None else None
-                                vanna = float(vanna_deribit) if vanna_deribit is not None else None
-                                charm = float(charm_deribit) if charm_deribit is not None else None
-                                volga = float(volga_deribit) if volga_deribit is not None else None
-                                
-                                sigma = msg_payload.get("mark_iv", 0.0) / 100.0
-                                can_calc_bs = sigma > 0 and T > 0 and current_underlying_price > 0
-                                calculated_gamma_bs = None
-
-                                if can_calc_bs:
-                                    S_param_bs = np.array([current_underlying_price])
-                                    K_param_bs = np.array([strike])
-                                    option_type_bs = 1 if "-C-" in inst else (0 if "-P-" in inst else 1)
-                                    
-                                    _g_calc, v_calc, c_calc, vg_calc = bs_greeks(
-                                        S_param_bs, K_param_bs, np.array([T]),
-                                        0.0, np.array([sigma]), np.array([option_type_bs])
-                                    )
-                                    
-                                    calculated_gamma_bs = float(_g_calc[0]) if not np.isnan(_g_calc[0]) else 0.0
-                                    gamma = calculated_gamma_bs 
-
-                                    if vanna is None: vanna = float(v_calc[0]) if not np.isnan(v_calc[0]) else 0.0
-                                    if charm is None: charm = float(c_calc[0]) if not np.isnan(c_calc[0]) else 0.0
-                                    if volga is None: volga = float(vg_calc[0]) if not np.isnan(vg_calc[0]) else 0.0
-                                else: 
-                                    if gamma is None: gamma = 0.0
-                                    if vanna is None: vanna = 0.0
-                                    if charm is None: charm = 0.0
-                                    if volga is None: volga = 0.0
-                                
-                                gamma = gamma if gamma is not None else 0.0
-                                vanna = vanna if vanna is not None else 0.0
-                                charm = charm if charm is not None else 0.0
-                                volga = volga if volga is not None else 0.0
-
-                                # logger.info(...) # Your detailed GREEK_PROCESSING log
-
-                                final_greeks_payload = {
-                                    "gamma": gamma, "vanna": vanna, "charm": charm, "volga": volga,
-                                    "notional_usd": notional, "strike": strike,
-                                }
-                                greek_store[inst] = final_greeks_payload
-                                
-                                if len(greek_store) % LOG_STORE_THRESHOLD == 0 and len(greek_store) > 0:
-                                    logger.info(f"PROCESSOR: Stored greeks for {len(greek_store)} instruments. Latest: {inst}")
-                            
-                            tick_times.append(time.time())
-
-                        except Exception as e:
-                            failing_message_id = mid.decode() if isinstance(mid, bytes) else str(mid)
-                            logger.error(f"PROCESSOR MSG PARSE ERR (msg_id: {failing_message_id}): {e} -- Failing Msg: {str(raw_msg_data)[:200]}", exc_info=False) # Keep exc_info False or True based on verbosity preference
+                    await process_entries(redis_connection, msgs)
 
             current_loop_time = time.time()
             if current_loop_time - last_pub >= ROLL_FREQ:
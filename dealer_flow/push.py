@@ -0,0 +1,124 @@
+# dealer_flow/push.py
+"""
+Fan-out of dealer_metrics to WebSocket / SSE subscribers.
+
+Each published entry becomes one Frame. A Frame renders its payload lazily and caches it
+per (field filter, wire format), so N clients with the same filter cost one
+serialization per tick however large N is.
+
+Subscribers never queue. A Subscriber holds only the newest Frame. A slow client
+skips straight to the latest frame when it next sends (conflation), and the skips are
+counted in `dropped`. max_hz additionally caps the per-client send rate.
+"""
+import asyncio
+import time
+from typing import Dict, Optional, Set, Tuple
+
+import orjson
+
+FORMAT_TEXT = "text"   # str, for WebSocket text frames
+FORMAT_SSE = "sse"     # bytes, "id: …\ndata: …\n\n"
+
+
+def parse_fields(value: Optional[str]) -> Optional[Tuple[str, ...]]:
+    """'NGI, HPP' → ('HPP', 'NGI'); empty / None → None (all fields). Sorted so equal filters share a cache slot."""
+    if not value:
+        return None
+    fields = tuple(sorted({f.strip() for f in value.split(",") if f.strip()}))
+    return fields or None
+
+
+class Frame:
+    __slots__ = ("entry_id", "payload", "_decoded", "_rendered")
+
+    def __init__(self, entry_id: str, payload: bytes):
+        self.entry_id = entry_id
+        self.payload = payload
+        self._decoded = None
+        self._rendered: Dict[Tuple, object] = {}
+
+    def _json(self, fields: Optional[Tuple[str, ...]]) -> bytes:
+        if fields is None:
+            return self.payload
+        key = (fields, "json")
+        out = self._rendered.get(key)
+        if out is None:
+            if self._decoded is None:
+                self._decoded = orjson.loads(self.payload)
+            d = self._decoded
+            out = orjson.dumps({k: d[k] for k in fields if k in d})
+            self._rendered[key] = out
+        return out
+
+    def render(self, fields: Optional[Tuple[str, ...]], fmt: str):
+        key = (fields, fmt)
+        out = self._rendered.get(key)
+        if out is None:
+            body = self._json(fields)
+            if fmt == FORMAT_SSE:
+                out = b"id: " + self.entry_id.encode() + b"\ndata: " + body + b"\n\n"
+            else:
+                out = body.decode()
+            self._rendered[key] = out
+        return out
+
+
+class Subscriber:
+    def __init__(self, fields: Optional[Tuple[str, ...]] = None, max_hz: float = 0.0):
+        self.fields = fields
+        self.min_interval = 1.0 / max_hz if max_hz and max_hz > 0 else 0.0
+        self.latest: Optional[Frame] = None
+        self.event = asyncio.Event()
+        self.sent = 0
+        self.dropped = 0
+        self._last_sent = 0.0
+
+    def offer(self, frame: Frame):
+        if self.latest is not None:
+            self.dropped += 1  # conflated: the client never saw the previous frame
+        self.latest = frame
+        self.event.set()
+
+    async def next_frame(self) -> Frame:
+        """Waits for a frame newer than the last one taken, honouring max_hz."""
+        if self.min_interval:
+            wait = self._last_sent + self.min_interval - time.monotonic()
+            if wait > 0:
+                await asyncio.sleep(wait)
+        await self.event.wait()
+        self.event.clear()
+        frame, self.latest = self.latest, None
+        self._last_sent = time.monotonic()
+        self.sent += 1
+        return frame
+
+
+class Broadcaster:
+    def __init__(self):
+        self.subscribers: Set[Subscriber] = set()
+        self.latest: Optional[Frame] = None
+        self.published = 0
+
+    def subscribe(self, fields: Optional[Tuple[str, ...]] = None, max_hz: float = 0.0) -> Subscriber:
+        sub = Subscriber(fields, max_hz)
+        if self.latest is not None:
+            sub.offer(self.latest)  # new clients get the current state immediately
+        self.subscribers.add(sub)
+        return sub
+
+    def unsubscribe(self, sub: Subscriber):
+        self.subscribers.discard(sub)
+
+    def publish(self, entry_id: str, payload: bytes):
+        frame = Frame(entry_id, payload)
+        self.latest = frame
+        self.published += 1
+        for sub in self.subscribers:
+            sub.offer(frame)
+
+    def stats(self) -> dict:
+        return {
+            "subscribers": len(self.subscribers),
+            "published": self.published,
+            "dropped": sum(s.dropped for s in self.subscribers),
+        }
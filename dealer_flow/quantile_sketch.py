@@ -0,0 +1,165 @@
+# dealer_flow/quantile_sketch.py
+"""
+Constant-memory, time-decayed quantiles for adaptive scenario thresholds and HPP weights.
+
+DecayingQuantileSketch is a DDSketch-style sketch:
+    - values land in fixed log-spaced buckets (relative error `rel_err`), separately for
+      positive and negative values plus a zero bucket, so memory is fixed at construction;
+    - observations are forward-decayed: an observation at time t has weight
+      exp((t - landmark) / tau), so older data fades with `half_life_seconds` without
+      ever touching the stored buckets; they are rescaled once exp() grows large.
+add() is O(1). quantile() is a cumsum over the buckets (a few thousand floats).
+
+AdaptiveThresholds keeps sketches of NGI, VSS, CHL_24h and |NGI| / ADV. It observes each
+published tick and refreshes its thresholds every `refresh_seconds`:
+    material_ratio  q-th percentile of |NGI| / ADV → rules.classify materiality
+    alpha, beta     HPP weights scaled by IQR(NGI) / IQR(VSS) and IQR(NGI) / IQR(CHL_24h),
+                    so each term moves HPP by a comparable amount (0.1 when spreads match)
+Until a sketch has `min_count` effective observations the static defaults are used.
+"""
+import logging
+import math
+import time
+from typing import Dict, Optional, Sequence
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+DEFAULTS = {"material_ratio": 0.1, "alpha": 0.1, "beta": 0.1}
+WEIGHT_BOUNDS = (1e-4, 1e4)  # alpha / beta clamp, guards against a near-zero IQR
+FLOW_METRICS = ("NGI", "VSS", "CHL_24h")
+RESCALE_EXPONENT = 50.0  # rescale buckets once the forward-decay weight reaches e^50
+
+
+class DecayingQuantileSketch:
+    def __init__(self, rel_err: float = 0.01, half_life_seconds: float = 86400.0,
+                 min_value: float = 1e-3, max_value: float = 1e15):
+        gamma = (1 + rel_err) / (1 - rel_err)
+        self._gamma = gamma
+        self._log_gamma = math.log(gamma)
+        self.min_value = min_value  # |x| below this counts as zero
+        self._offset = math.floor(math.log(min_value) / self._log_gamma)
+        n = math.ceil(math.log(max_value) / self._log_gamma) - self._offset + 1
+        self.pos = np.zeros(n)
+        self.neg = np.zeros(n)
+        self.zero = 0.0
+        self._rate = math.log(2) / half_life_seconds
+        self._landmark: Optional[float] = None
+        self.count = 0
+
+    def _weight(self, ts: float) -> float:
+        if self._landmark is None:
+            self._landmark = ts
+        e = (ts - self._landmark) * self._rate
+        if e > RESCALE_EXPONENT:
+            scale = math.exp(-e)
+            self.pos *= scale
+            self.neg *= scale
+            self.zero *= scale
+            self._landmark = ts
+            e = 0.0
+        return math.exp(e)
+
+    def add(self, x: float, ts: float):
+        if x != x:  # NaN
+            return
+        w = self._weight(ts)
+        self.count += 1
+        ax = abs(x)
+        if ax < self.min_value:
+            self.zero += w
+            return
+        idx = min(max(math.ceil(math.log(ax) / self._log_gamma) - self._offset, 0), len(self.pos) - 1)
+        if x > 0:
+            self.pos[idx] += w
+        else:
+            self.neg[idx] += w
+
+    def effective_count(self, now: float) -> float:
+        """Decayed number of observations as seen from `now`."""
+        if self._landmark is None:
+            return 0.0
+        total = self.pos.sum() + self.neg.sum() + self.zero
+        return total * math.exp(-(now - self._landmark) * self._rate)
+
+    def _bucket_value(self, idx: np.ndarray) -> np.ndarray:
+        return 2.0 * self._gamma ** (idx + self._offset) / (self._gamma + 1.0)
+
+    def quantiles(self, qs: Sequence[float]) -> np.ndarray:
+        n = len(self.pos)
+        weights = np.concatenate((self.neg[::-1], [self.zero], self.pos))
+        cum = np.cumsum(weights)
+        total = cum[-1]
+        if total <= 0:
+            return np.full(len(qs), np.nan)
+        i = np.minimum(np.searchsorted(cum, np.asarray(qs, dtype=float) * total, side="left"), len(cum) - 1)
+        out = np.zeros(len(i))
+        below, above = i < n, i > n
+        out[below] = -self._bucket_value(n - 1 - i[below])
+        out[above] = self._bucket_value(i[above] - n - 1)
+        return out
+
+    def quantile(self, q: float) -> float:
+        return float(self.quantiles([q])[0])
+
+    def iqr(self) -> float:
+        q25, q75 = self.quantiles([0.25, 0.75])
+        return float(q75 - q25)
+
+
+class AdaptiveThresholds:
+    def __init__(self, half_life_seconds: float = 86400.0, refresh_seconds: float = 60.0,
+                 material_quantile: float = 0.8, min_count: float = 300.0):
+        self.sketches = {m: DecayingQuantileSketch(half_life_seconds=half_life_seconds) for m in FLOW_METRICS}
+        self.sketches["flow_adv"] = DecayingQuantileSketch(half_life_seconds=half_life_seconds, min_value=1e-9)
+        self.refresh_seconds = refresh_seconds
+        self.material_quantile = material_quantile
+        self.min_count = min_count
+        self.current: Dict[str, float] = dict(DEFAULTS)
+        self._next_refresh = 0.0
+
+    def observe(self, ts: float, flow: dict, adv_usd: Optional[float] = None):
+        """O(1); thresholds are recomputed at most every refresh_seconds."""
+        for m in FLOW_METRICS:
+            self.sketches[m].add(flow.get(m, 0.0), ts)
+        if adv_usd:
+            self.sketches["flow_adv"].add(abs(flow.get("NGI", 0.0)) / adv_usd, ts)
+        if ts >= self._next_refresh:
+            self.refresh(ts)
+
+    def refresh(self, now: float) -> Dict[str, float]:
+        out = dict(DEFAULTS)
+        ratio = self.sketches["flow_adv"]
+        if ratio.effective_count(now) >= self.min_count:
+            out["material_ratio"] = ratio.quantile(self.material_quantile)
+        if all(self.sketches[m].effective_count(now) >= self.min_count for m in FLOW_METRICS):
+            ngi, vss, chl = (self.sketches[m].iqr() for m in FLOW_METRICS)
+            lo, hi = WEIGHT_BOUNDS
+            if ngi > 0 and vss > 0:
+                out["alpha"] = min(max(DEFAULTS["alpha"] * ngi / vss, lo), hi)
+            if ngi > 0 and chl > 0:
+                out["beta"] = min(max(DEFAULTS["beta"] * ngi / chl, lo), hi)
+        self.current = out
+        self._next_refresh = now + self.refresh_seconds
+        return out
+
+
+def seed_from_clickhouse(thresholds: AdaptiveThresholds, client, database: str, hours: float,
+                         max_rows: int = 500000) -> int:
+    """
+    Blocking. Replays the last `hours` of NGI / VSS / CHL_24h from the raw metrics table into
+    the sketches. |NGI| / ADV is not stored there, so that sketch warms up live.
+    """
+    from dealer_flow.metric_rollups import RAW_TABLE
+
+    rows = client.execute(
+        f"SELECT toUnixTimestamp64Milli(ts), NGI, VSS, CHL_24h FROM {database}.{RAW_TABLE} "
+        f"WHERE ts >= now64(3) - toIntervalSecond(%(seconds)s) ORDER BY ts DESC LIMIT %(limit)s",
+        {"seconds": int(hours * 3600), "limit": max_rows},
+    )
+    for ts_ms, ngi, vss, chl in reversed(rows):
+        thresholds.observe(ts_ms / 1000.0, {"NGI": ngi, "VSS": vss, "CHL_24h": chl})
+    thresholds.refresh(time.time())
+    logger.info(f"Seeded adaptive thresholds from {len(rows)} rows of {database}.{RAW_TABLE}: {thresholds.current}")
+    return len(rows)
@@ -0,0 +1,181 @@
+# dealer_flow/replay.py
+"""
+Replays a raw frame capture (see feed_capture.py).
+
+    python -m dealer_flow.replay <capture_dir> [--speed 1|N|max] [--target streams|processor]
+
+--target streams    re-publishes frames to dealer_raw / deribit_book_summaries_feed exactly as
+                    the collector would, so the live processor + CH writer consume them.
+--target processor  feeds frames straight into the processor in this process (binary batches via
+                    handle_tick_batch, or handle_raw_message when TICK_FORMAT=json) and publishes
+                    metrics on capture time (deterministic for a given capture).
+"""
+import argparse
+import asyncio
+import logging
+import time
+from typing import Optional
+
+import orjson
+
+from dealer_flow.config import settings
+from dealer_flow.feed_capture import iter_frames
+from dealer_flow.redis_stream import get_redis
+from dealer_flow.deribit_ws import STREAM_KEY_BOOK_SUMMARIES_FEED, publish_tick, publish_trades
+from dealer_flow.tick_schema import TickEncoder, INSTRUMENT_REGISTRY_KEY, decode as decode_ticks
+from dealer_flow import processor as proc
+
+if __name__ == "__main__" and not logging.getLogger().hasHandlers():
+    logging.basicConfig(
+        level=logging.INFO,
+        format="%(asctime)s %(levelname)s %(name)s:%(lineno)d - REPLAY: %(message)s"
+    )
+logger = logging.getLogger(__name__)
+
+STATS_EVERY_FRAMES = 50_000
+PROCESSOR_BATCH = 500  # matches the processor's XREADGROUP count
+
+
+class _NullSink:
+    """Stands in for the Redis client when replaying into the processor without publishing."""
+
+    async def xadd(self, *args, **kwargs):
+        return None
+
+
+def parse_speed(value: str) -> float:
+    """'max' → 0.0 (no pacing); otherwise a positive multiple of capture speed."""
+    if value.lower() in ("max", "0"):
+        return 0.0
+    speed = float(value.rstrip("x"))
+    if speed <= 0:
+        raise ValueError(f"speed must be positive or 'max', got {value}")
+    return speed
+
+
+async def publish_frame_to_streams(redis, encoder: TickEncoder, frame: bytes, recv_ts: float):
+    j = orjson.loads(frame)
+    if j.get("method") != "subscription":
+        return
+    params = j.get("params") or {}
+    channel = params.get("channel") or ""
+    if channel.startswith("book_summary.option."):
+        data = params.get("data")
+        if isinstance(data, list):
+            await redis.xadd(STREAM_KEY_BOOK_SUMMARIES_FEED, {"d": orjson.dumps({"ts": recv_ts, "summary_data": data})})
+    elif channel.startswith("deribit_price_index.") or channel.startswith("ticker."):
+        await publish_tick(redis, encoder, channel, params.get("data"), frame)
+    elif channel.startswith("trades."):
+        await publish_trades(redis, encoder, params.get("data"), frame)
+
+
+async def replay(
+    capture_dir: str,
+    speed: float = 1.0,
+    target: str = "streams",
+    redis=None,
+    start_ts: Optional[float] = None,
+    end_ts: Optional[float] = None,
+) -> dict:
+    """
+    Replays a capture and returns run stats. speed=0 replays as fast as possible.
+    """
+    if target not in ("streams", "processor"):
+        raise ValueError(f"unknown replay target {target}")
+    if target == "streams" and redis is None:
+        raise ValueError("target 'streams' needs a Redis client")
+
+    encoder = None
+    if target == "streams":
+        encoder = TickEncoder()
+        encoder.registry.load(await redis.hgetall(INSTRUMENT_REGISTRY_KEY))
+    else:
+        if redis is None:
+            redis = _NullSink()
+        if settings.tick_format != "json":
+            encoder = TickEncoder(proc.instrument_registry)
+    pending = []
+
+    frames = 0
+    publishes = 0
+    first_cap_ts = None
+    last_pub_ts = None
+    wall_start = time.monotonic()
+
+    for recv_ts, frame in iter_frames(capture_dir, start_ts, end_ts):
+        if first_cap_ts is None:
+            first_cap_ts = recv_ts
+        if speed > 0:
+            delay = wall_start + (recv_ts - first_cap_ts) / speed - time.monotonic()
+            if delay > 0:
+                await asyncio.sleep(delay)
+
+        try:
+            if target == "streams":
+                await publish_frame_to_streams(redis, encoder, frame, recv_ts)
+            elif encoder is None:
+                proc.handle_raw_message(frame, now=recv_ts)
+            else:
+                j = orjson.loads(frame)
+                params = j.get("params") or {}
+                if j.get("method") == "subscription":
+                    channel = params.get("channel") or ""
+                    if channel.startswith("trades."):
+                        record, _ = encoder.encode_trades(params.get("data"))
+                    else:
+                        record, _ = encoder.encode(channel, params.get("data"))
+                    if record:
+                        pending.append(record)
+                if len(pending) >= PROCESSOR_BATCH:
+                    proc.handle_tick_batch(decode_ticks(pending), now=recv_ts)
+                    pending = []
+            if target == "processor":
+                if last_pub_ts is None:
+                    last_pub_ts = recv_ts
+                if recv_ts - last_pub_ts >= proc.ROLL_FREQ:
+                    if pending:
+                        proc.handle_tick_batch(decode_ticks(pending), now=recv_ts)
+                        pending = []
+                    await proc.maybe_publish(redis, now=recv_ts)
+                    last_pub_ts = recv_ts
+                    publishes += 1
+        except Exception as e:
+            logger.error(f"Replay failed on frame at {recv_ts:.3f}: {e} -- {frame[:200]!r}")
+
+        frames += 1
+        if frames % STATS_EVERY_FRAMES == 0:
+            elapsed = time.monotonic() - wall_start
+            logger.info(f"Replayed {frames} frames in {elapsed:.1f}s ({frames / elapsed:.0f} frames/s)")
+
+    elapsed = time.monotonic() - wall_start
+    stats = {
+        "frames": frames,
+        "publishes": publishes,
+        "elapsed_s": elapsed,
+        "frames_per_s": frames / elapsed if elapsed > 0 else 0.0,
+        "capture_span_s": (recv_ts - first_cap_ts) if frames else 0.0,
+    }
+    logger.info(f"Replay done: {stats}")
+    return stats
+
+
+async def main():
+    ap = argparse.ArgumentParser(description="Replay a raw Deribit frame capture.")
+    ap.add_argument("capture_dir")
+    ap.add_argument("--speed", default="1", help="1, N (e.g. 10 or 10x) or max")
+    ap.add_argument("--target", choices=["streams", "processor"], default="streams")
+    ap.add_argument("--start-ts", type=float, default=None)
+    ap.add_argument("--end-ts", type=float, default=None)
+    ap.add_argument("--no-publish", action="store_true",
+                    help="with --target processor: compute metrics without writing to Redis")
+    args = ap.parse_args()
+
+    redis = None
+    if not (args.target == "processor" and args.no_publish):
+        redis = await get_redis()
+
+    await replay(args.capture_dir, parse_speed(args.speed), args.target, redis, args.start_ts, args.end_ts)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
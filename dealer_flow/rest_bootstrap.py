@@ -0,0 +1,148 @@
+# dealer_flow/rest_bootstrap.py
+"""
+Whole-chain REST snapshot for the collector: cold start and a refresh of unsubscribed contracts.
+
+Without it the processor sees nothing until the first WebSocket tickers arrive, and a contract
+outside the DERIBIT_MAX_AUTH_INSTRUMENTS ticker budget never arrives at all. One snapshot is:
+    public/get_index_price               → spot
+    public/get_book_summary_by_currency  → every option's OI; ranks the chain for subscriptions
+    public/ticker  × N                   → mark IV, greeks, OI per contract, highest OI first
+The collector publishes each result as the WebSocket notification it stands for
+(deribit_ws.DeribitCollector._publish_snapshot). The processor, the book-summary writer,
+capture and replay therefore need no separate REST path.
+
+All requests share one pooled aiohttp session (keep-alive, at most `concurrency` connections)
+and go through a RateLimiter token bucket. Deribit meters public REST calls per IP; a
+too_many_requests reply (HTTP 429 / error 10028) is retried after a backoff. The cold start
+runs at BOOTSTRAP_REQUESTS_PER_SECOND before the WebSocket connects. The refresh runs every
+BOOTSTRAP_REFRESH_SECONDS at the lower BOOTSTRAP_REFRESH_REQUESTS_PER_SECOND, so it never
+competes with the live feed for the rate budget. It must run more often than the processor's
+INSTRUMENT_IDLE_TIMEOUT_SECONDS, or refreshed contracts are evicted between passes.
+"""
+import asyncio
+import logging
+import time
+from typing import Awaitable, Callable, Iterable, List, Optional
+
+import aiohttp
+
+from dealer_flow.config import settings
+
+logger = logging.getLogger(__name__)
+
+REST_TIMEOUT_SECONDS = 10.0
+RETRIES = 3
+RETRY_BACKOFF_SECONDS = 1.0
+TOO_MANY_REQUESTS = 10028  # Deribit JSON-RPC error code
+
+
+class RestError(Exception):
+    pass
+
+
+class RateLimiter:
+    """Token bucket: `rate` requests per second on average, bursts of up to `burst`."""
+
+    def __init__(self, rate: float, burst: Optional[float] = None, clock=time.monotonic):
+        self.rate = rate
+        self.burst = burst or max(rate, 1.0)
+        self.tokens = self.burst
+        self.clock = clock
+        self.updated = clock()
+        self._lock = asyncio.Lock()
+
+    def _refill(self):
+        now = self.clock()
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    async def acquire(self):
+        async with self._lock:  # FIFO: waiters are served in arrival order
+            self._refill()
+            if self.tokens < 1.0:
+                await asyncio.sleep((1.0 - self.tokens) / self.rate)
+                self._refill()
+            self.tokens -= 1.0
+
+
+def new_session(concurrency: int) -> aiohttp.ClientSession:
+    """Keep-alive session; the connector caps concurrent connections to the REST host."""
+    return aiohttp.ClientSession(
+        connector=aiohttp.TCPConnector(limit=concurrency, ttl_dns_cache=300),
+        timeout=aiohttp.ClientTimeout(total=REST_TIMEOUT_SECONDS),
+    )
+
+
+async def rest_call(http: aiohttp.ClientSession, limiter: RateLimiter, method: str, **params):
+    """GET {DERIBIT_REST}/{method}; the JSON-RPC `result`, retried on rate-limit replies."""
+    url = f"{settings.deribit_rest}/{method}"
+    for attempt in range(RETRIES + 1):
+        await limiter.acquire()
+        async with http.get(url, params=params) as resp:
+            try:
+                body = await resp.json(content_type=None) or {}
+            except ValueError:  # an HTML error page from a proxy
+                body = {}
+            error = body.get("error") or {}
+            if resp.status == 429 or error.get("code") == TOO_MANY_REQUESTS:
+                if attempt < RETRIES:
+                    await asyncio.sleep(RETRY_BACKOFF_SECONDS * 2 ** attempt)
+                    continue
+            if resp.status != 200 or error:
+                raise RestError(f"{method} {params}: HTTP {resp.status} {error or ''}")
+            return body.get("result")
+    raise RestError(f"{method} {params}: still rate limited after {RETRIES} retries")
+
+
+async def fetch_index(http, limiter, currency: str) -> float:
+    result = await rest_call(http, limiter, "public/get_index_price", index_name=f"{currency.lower()}_usd")
+    return float(result["index_price"])
+
+
+async def fetch_book_summaries(http, limiter, currency: str) -> list:
+    return await rest_call(http, limiter, "public/get_book_summary_by_currency", currency=currency, kind="option") or []
+
+
+def rank_by_oi(summaries: list, exclude: Iterable[str] = (), keep: Callable[[str], bool] = lambda name: True) -> List[str]:
+    """Option names from a book summary, highest open interest first, minus `exclude`."""
+    exclude = set(exclude)
+    valid = [s for s in summaries
+             if isinstance(s, dict) and s.get("instrument_name") and s["instrument_name"] not in exclude
+             and keep(s["instrument_name"])]
+    valid.sort(key=lambda s: s.get("open_interest") or 0.0, reverse=True)
+    return [s["instrument_name"] for s in valid]
+
+
+async def fetch_tickers(http, limiter, names: List[str], concurrency: int,
+                        on_ticker: Callable[[str, dict], Awaitable[None]]) -> int:
+    """
+    Fetches public/ticker for `names` with at most `concurrency` requests in flight and hands
+    each result to on_ticker in completion order. Returns how many succeeded; failures are
+    logged and skipped.
+    """
+    queue = asyncio.Queue()
+    for name in names:
+        queue.put_nowait(name)
+    done = [0]
+    failed = []
+
+    async def worker():
+        while True:
+            try:
+                name = queue.get_nowait()
+            except asyncio.QueueEmpty:
+                return
+            try:
+                result = await rest_call(http, limiter, "public/ticker", instrument_name=name)
+            except (RestError, aiohttp.ClientError, asyncio.TimeoutError) as e:
+                failed.append(name)
+                logger.debug(f"Ticker snapshot for {name} failed: {e}")
+                continue
+            if result:
+                await on_ticker(name, result)
+                done[0] += 1
+
+    await asyncio.gather(*(worker() for _ in range(max(min(concurrency, len(names)), 1))))
+    if failed:
+        logger.warning(f"{len(failed)} of {len(names)} ticker snapshots failed (e.g. {failed[0]}).")
+    return done[0]
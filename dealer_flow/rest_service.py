@@ -1,22 +1,314 @@
-from fastapi import FastAPI, Response, status
+from fastapi import FastAPI, Request, Response, WebSocket, WebSocketDisconnect, status
+from fastapi.responses import StreamingResponse
 from dealer_flow.redis_stream import get_redis, STREAM_KEY_METRICS
-import orjson
+from dealer_flow.push import Broadcaster, parse_fields, FORMAT_SSE, FORMAT_TEXT
+from dealer_flow.config import settings
+from dealer_flow.history import HistoryCache, METHODS, fetch_history, is_closed
+from dealer_flow import exposures
 import asyncio
+import logging
+import time
+import orjson
+import zlib
+from typing import Optional
+
+logger = logging.getLogger(__name__)
 
 app = FastAPI()
 
+# Set by single_process.run_single_process(); /snapshot then serves the in-memory latest metrics.
+local_bus = None
+
+TAIL_BLOCK_MS = 5000
+SSE_KEEPALIVE_SECONDS = 15.0
+
+HISTORY_MAX_POINTS = 10_000
+HISTORY_CH_CLIENTS = 2
+
+_redis = None        # one pooled client for the whole service (aioredis pools connections per client)
+_tail_tasks = []
+_ch_pool = None      # ClickHouse clients for /history, created on first use
+_ch_pool_lock = None # asyncio.Lock, created on the serving loop (3.9 binds locks to a loop at creation)
+history_cache = HistoryCache(maxsize=256, ttl_seconds=3600.0)
+
+
+class MetricsCache:
+    """Latest dealer_metrics payload exactly as published (already JSON bytes) plus its ETag."""
+
+    def __init__(self):
+        self.payload: Optional[bytes] = None
+        self.etag: Optional[str] = None
+        self.entry_id: Optional[bytes] = None
+
+    def update(self, entry_id: bytes, payload: bytes):
+        self.entry_id = entry_id
+        self.payload = payload
+        self.etag = f'"{entry_id.decode()}"'  # stream ids are unique and monotonic
+
+
+metrics_cache = MetricsCache()
+broadcaster = Broadcaster()  # /ws/metrics and /stream/metrics subscribers
+_local_etag = (None, None)  # (payload object, etag) for local_bus mode
+_local_seq = 0
+
+
+def publish_local(payload: bytes):
+    """InProcessBus metrics hook (single-process mode): fans the new payload out to push clients."""
+    global _local_seq
+    _local_seq += 1
+    broadcaster.publish(str(_local_seq), payload)
+
+
+async def get_shared_redis():
+    global _redis
+    if _redis is None:
+        _redis = await get_redis()
+    return _redis
+
+
+async def tail_stream(stream_key: str, on_entry):
+    """Calls on_entry(entry_id, fields) for the newest entry of `stream_key`: XREVRANGE once, then blocking XREAD."""
+    last_id = None
+    while True:
+        try:
+            redis = await get_shared_redis()
+            if last_id is None:
+                last = await redis.xrevrange(stream_key, count=1)
+                if last:
+                    on_entry(*last[0])
+                last_id = last[0][0] if last else b"$"
+            resp = await redis.xread({stream_key: last_id}, count=100, block=TAIL_BLOCK_MS)
+            for _, entries in resp or []:
+                if entries:
+                    entry_id, fields = entries[-1]  # only the newest matters
+                    on_entry(entry_id, fields)
+                    last_id = entry_id
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.error(f"{stream_key} tail failed: {e}. Retrying in 1s.")
+            last_id = None
+            await asyncio.sleep(1)
+
+
+def _on_metrics(entry_id: bytes, fields):
+    metrics_cache.update(entry_id, fields[b"d"])
+    broadcaster.publish(entry_id.decode(), metrics_cache.payload)
+
+
+class ExposureCache:
+    """Latest dealer_exposures entry; each (kind, format) rendering is built once per entry."""
+
+    def __init__(self):
+        self.fields = None
+        self.version: Optional[str] = None
+        self.rendered = {}
+
+    def update(self, version: str, fields):
+        if version != self.version:
+            self.version = version
+            self.fields = fields
+            self.rendered = {}
+
+
+exposure_cache = ExposureCache()
+
+
+@app.on_event("startup")
+async def _start_tail():
+    if local_bus is None:
+        _tail_tasks.append(asyncio.create_task(tail_stream(STREAM_KEY_METRICS, _on_metrics)))
+        _tail_tasks.append(asyncio.create_task(tail_stream(
+            exposures.STREAM_KEY_EXPOSURES, lambda entry_id, fields: exposure_cache.update(entry_id.decode(), fields))))
+
+
+@app.on_event("shutdown")
+async def _stop_tail():
+    global _redis, _ch_pool
+    for t in _tail_tasks:
+        t.cancel()
+    _tail_tasks.clear()
+    if _redis is not None:
+        await _redis.close()
+        _redis = None
+    if _ch_pool is not None:
+        _ch_pool.close()
+        _ch_pool = None
+
+
+async def get_ch_pool():
+    global _ch_pool, _ch_pool_lock
+    if _ch_pool is None:
+        if _ch_pool_lock is None:
+            _ch_pool_lock = asyncio.Lock()
+        async with _ch_pool_lock:  # concurrent first requests share one pool
+            if _ch_pool is None:
+                from dealer_flow.clickhouse_writer import ClickHousePool  # only /history needs ClickHouse
+                _ch_pool = await ClickHousePool.connect(HISTORY_CH_CLIENTS, "rest", use_numpy=False)
+    return _ch_pool
+
+
+def _etag_matches(request: Request, etag: str) -> bool:
+    header = request.headers.get("if-none-match")
+    if not header:
+        return False
+    return header.strip() == "*" or etag in (t.strip().removeprefix("W/") for t in header.split(","))
+
+
+def _latest():
+    """(payload, etag) of the newest metrics, or (None, None)."""
+    global _local_etag
+    if local_bus is not None:
+        payload = local_bus.latest_metrics
+        if payload is None:
+            return None, None
+        if _local_etag[0] is not payload:
+            _local_etag = (payload, f'"{zlib.crc32(payload):08x}-{len(payload)}"')
+        return payload, _local_etag[1]
+    return metrics_cache.payload, metrics_cache.etag
+
+
 @app.get("/snapshot")
-async def snapshot():
-    redis = await get_redis()
-    last = await redis.xrevrange(STREAM_KEY_METRICS, count=1)
-    if not last:
+async def snapshot(request: Request):
+    payload, etag = _latest()
+    if payload is None:
         # metrics not produced yet → 204 No Content
         return Response(status_code=status.HTTP_204_NO_CONTENT)
+    headers = {"ETag": etag, "Cache-Control": "no-cache"}
+    if _etag_matches(request, etag):
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+    return Response(content=payload, media_type="application/json", headers=headers)
+
 
-    return orjson.loads(last[0][1][b"d"])
+@app.websocket("/ws/metrics")
+async def ws_metrics(websocket: WebSocket, fields: Optional[str] = None, max_hz: float = 0.0):
+    """Pushes each new metrics payload (latest-only for slow clients). ?fields=NGI,HPP&max_hz=2"""
+    await websocket.accept()
+    sub = broadcaster.subscribe(parse_fields(fields), max_hz)
+    try:
+        while True:
+            frame = await sub.next_frame()
+            await websocket.send_text(frame.render(sub.fields, FORMAT_TEXT))
+    except WebSocketDisconnect:
+        pass
+    finally:
+        broadcaster.unsubscribe(sub)
 
 
+@app.get("/stream/metrics")
+async def sse_metrics(request: Request, fields: Optional[str] = None, max_hz: float = 0.0):
+    """Server-Sent Events flavour of /ws/metrics."""
+    sub = broadcaster.subscribe(parse_fields(fields), max_hz)
 
+    async def events():
+        try:
+            while not await request.is_disconnected():
+                try:
+                    frame = await asyncio.wait_for(sub.next_frame(), SSE_KEEPALIVE_SECONDS)
+                except asyncio.TimeoutError:
+                    yield b": keepalive\n\n"
+                    continue
+                yield frame.render(sub.fields, FORMAT_SSE)
+        finally:
+            broadcaster.unsubscribe(sub)
 
+    return StreamingResponse(events(), media_type="text/event-stream",
+                             headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
 
 
+@app.get("/stream/stats")
+async def stream_stats():
+    return broadcaster.stats()
+
+
+@app.get("/history")
+async def history(metrics: str = "NGI,HPP", start: Optional[float] = None, end: Optional[float] = None,
+                  points: int = 500, method: str = "lttb"):
+    """
+    Downsampled metric series: ?metrics=NGI,VSS,HPP,flip_pct&start=<epoch s>&end=<epoch s>&points=500&method=lttb|minmax|avg
+    Defaults to the last 24h. Closed ranges are served from an LRU/TTL cache.
+    """
+    end = end if end is not None else time.time()
+    start = start if start is not None else end - 86400
+    names = parse_fields(metrics)
+    if not names or end <= start or not (2 <= points <= HISTORY_MAX_POINTS) or method not in METHODS:
+        return Response(status_code=status.HTTP_400_BAD_REQUEST, content=orjson.dumps(
+            {"error": f"need metrics, start < end, 2 <= points <= {HISTORY_MAX_POINTS}, method in {METHODS}"}),
+            media_type="application/json")
+
+    closed = is_closed(end)
+    key = (names, start, end, points, method)
+    body = history_cache.get(key) if closed else None
+    if body is None:
+        pool = await get_ch_pool()
+        try:
+            result = await pool.run(fetch_history, settings.clickhouse_db_name, names, start, end, points, method)
+        except ValueError as e:
+            return Response(status_code=status.HTTP_400_BAD_REQUEST, content=orjson.dumps({"error": str(e)}),
+                            media_type="application/json")
+        body = orjson.dumps(result, option=orjson.OPT_SERIALIZE_NUMPY)
+        if closed:
+            history_cache.put(key, body)
+    headers = {"Cache-Control": "public, max-age=3600" if closed else "no-cache"}
+    return Response(content=body, media_type="application/json", headers=headers)
+
+
+EXPOSURE_FORMATS = {
+    "json": "application/json",
+    "raw": "application/octet-stream",
+    "arrow": "application/vnd.apache.arrow.stream",
+}
+
+
+def _negotiate(accept: str, fmt: Optional[str]) -> Optional[str]:
+    if fmt:
+        return fmt if fmt in EXPOSURE_FORMATS else None
+    accept = accept or ""
+    if EXPOSURE_FORMATS["arrow"] in accept:
+        return "arrow"
+    if EXPOSURE_FORMATS["raw"] in accept:
+        return "raw"
+    return "json"
+
+
+@app.get("/exposures/{kind}")
+async def exposure_profile(kind: str, request: Request, format: Optional[str] = None):
+    """
+    Per-strike / per-expiry dealer exposure vectors from the latest processor tick.
+    Accept: application/json (default) | application/octet-stream (row-major <f8, see X-Columns / X-Rows)
+            | application/vnd.apache.arrow.stream (Arrow IPC). ?format=json|raw|arrow overrides Accept.
+    """
+    if kind not in exposures.KINDS:
+        return Response(status_code=status.HTTP_404_NOT_FOUND)
+    fmt = _negotiate(request.headers.get("accept"), format)
+    if fmt is None:
+        return Response(status_code=status.HTTP_406_NOT_ACCEPTABLE)
+
+    if local_bus is not None and local_bus.latest_exposures is not None:
+        started, seq = local_bus.exposures_version
+        exposure_cache.update(f"{started}-{seq}", local_bus.latest_exposures)
+    if exposure_cache.fields is None:
+        return Response(status_code=status.HTTP_204_NO_CONTENT)
+
+    etag = f'"{exposure_cache.version}-{kind}-{fmt}"'
+    if _etag_matches(request, etag):
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers={"ETag": etag})
+    rendered = exposure_cache.rendered.get((kind, fmt))
+    if rendered is None:
+        header, matrix = exposures.decode(exposure_cache.fields, kind)
+        columns = exposures.KINDS[kind][1]
+        headers = {"X-Ts": str(header["ts"]), "X-Spot": str(header["spot"])}
+        if fmt == "json":
+            body = exposures.to_json(header, matrix, kind)
+        elif fmt == "raw":
+            body = exposure_cache.fields[exposures.KINDS[kind][0]]  # already row-major <f8, served as stored
+            headers.update({"X-Columns": ",".join(columns), "X-Rows": str(len(matrix)), "X-Dtype": "<f8"})
+        else:
+            body = exposures.to_arrow_ipc(header, matrix, kind)
+            if body is None:
+                return Response(status_code=status.HTTP_406_NOT_ACCEPTABLE,
+                                content=b"Arrow IPC needs pyarrow on the server; use format=raw or json")
+        rendered = exposure_cache.rendered[(kind, fmt)] = (body, headers)
+    body, headers = rendered
+    return Response(content=body, media_type=EXPOSURE_FORMATS[fmt],
+                    headers={**headers, "ETag": etag, "Vary": "Accept", "Cache-Control": "no-cache"})
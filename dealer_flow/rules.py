@@ -1,9 +1,10 @@
-def classify(flow: dict, adv_usd: float, spot_change_pct: float):
+def classify(flow: dict, adv_usd: float, spot_change_pct: float, material_ratio: float = 0.1):
     """
     flow keys: NGI, VSS, CHL_24h, HPP
+    material_ratio: |NGI| / ADV above which flow is material (AdaptiveThresholds supplies a percentile)
     Returns bucket label 1-6
     """
-    material = abs(flow["NGI"]) > 0.1 * adv_usd
+    material = abs(flow["NGI"]) > material_ratio * adv_usd
     rising = spot_change_pct > 0
     falling = spot_change_pct < 0
     
@@ -0,0 +1,274 @@
+# dealer_flow/shm_ring.py
+"""
+Shared-memory single-producer / multi-consumer ring buffer for collector → processor on one host.
+
+Layout (multiprocessing.shared_memory, name = SHM_RING_NAME):
+
+    header (64 B)   magic "DFRB" | version | n_slots (u8) | slot_size (u8) | write_seq (u8)
+    slots           n_slots × slot_size:  seq (u8) | length (u4) | field (u1) | pad | payload
+
+`seq` in a slot is the ring sequence number + 1 of the entry it holds (0 = never written,
+WRITING while the producer is mid-copy). The producer never waits for consumers; each
+consumer keeps its own cursor and detects being lapped by comparing slot seqs with the
+sequence it expects (seqlock-style: check before and after use).
+
+With the default 128-byte slots a slot holds exactly one tick_schema record. poll() returns
+a strided structured view (slots["rec"]) straight into shared memory; take() copies it out in
+one memcpy and re-checks every slot's seq afterwards, so entries the producer overwrote during
+the copy are dropped instead of processed. Larger slots also carry legacy JSON frames
+(field "d"), copied out by entries().
+"""
+import logging
+import struct
+import time
+from multiprocessing import shared_memory
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+from dealer_flow.tick_schema import TICK_DTYPE
+
+logger = logging.getLogger(__name__)
+
+MAGIC = b"DFRB"
+VERSION = 1
+HEADER_SIZE = 64
+SLOT_HEADER_SIZE = 16
+WRITING = np.uint64(2 ** 64 - 1)
+FIELD_TICK = 1   # tick_schema record (stream field b"b")
+FIELD_JSON = 2   # raw JSON frame (stream field b"d")
+_FIELD_CODES = {b"b": FIELD_TICK, b"d": FIELD_JSON}
+_FIELD_NAMES = {v: k for k, v in _FIELD_CODES.items()}
+
+_HEADER = struct.Struct("<4sIQQ")
+_WRITE_SEQ_OFFSET = _HEADER.size
+_U64 = struct.Struct("<Q")
+_SLOT_META = struct.Struct("<IB")
+
+OVERRUN_POLICIES = ("latest", "oldest", "fail")
+
+
+class RingOverrun(Exception):
+    """Consumer fell more than a full ring behind and the policy is 'fail'."""
+
+
+def _slot_dtype(slot_size: int) -> np.dtype:
+    names, formats, offsets = ["seq", "length", "field"], ["<u8", "<u4", "u1"], [0, 8, 12]
+    if slot_size - SLOT_HEADER_SIZE >= TICK_DTYPE.itemsize:
+        names.append("rec"); formats.append(TICK_DTYPE); offsets.append(SLOT_HEADER_SIZE)
+    return np.dtype({"names": names, "formats": formats, "offsets": offsets, "itemsize": slot_size})
+
+
+def _untrack(shm: shared_memory.SharedMemory):
+    # Attaching processes must not unlink the segment on exit (resource_tracker quirk < 3.13).
+    try:
+        from multiprocessing import resource_tracker
+        resource_tracker.unregister(shm._name, "shared_memory")
+    except Exception:
+        pass
+
+
+class _Ring:
+    def __init__(self, shm: shared_memory.SharedMemory):
+        self.shm = shm
+        magic, version, n_slots, slot_size = _HEADER.unpack_from(shm.buf, 0)
+        if magic != MAGIC or version != VERSION:
+            raise ValueError(f"shared memory {shm.name} is not a dealer_flow ring")
+        self.n_slots = n_slots
+        self.slot_size = slot_size
+        self.payload_size = slot_size - SLOT_HEADER_SIZE
+        self.slots = np.ndarray((n_slots,), dtype=_slot_dtype(slot_size), buffer=shm.buf, offset=HEADER_SIZE)
+
+    def head(self) -> int:
+        return _U64.unpack_from(self.shm.buf, _WRITE_SEQ_OFFSET)[0]
+
+    def close(self):
+        self.slots = None
+        self.shm.close()
+
+
+class ShmRingWriter(_Ring):
+    @classmethod
+    def create(cls, name: str, n_slots: int = 1 << 20, slot_size: int = 128) -> "ShmRingWriter":
+        """Creates the ring, or re-attaches to an existing one with the same geometry (collector restart)."""
+        size = HEADER_SIZE + n_slots * slot_size
+        try:
+            shm = shared_memory.SharedMemory(name=name, create=True, size=size)
+            _HEADER.pack_into(shm.buf, 0, MAGIC, VERSION, n_slots, slot_size)
+            _U64.pack_into(shm.buf, _WRITE_SEQ_OFFSET, 0)
+            logger.info(f"Created shm ring {name}: {n_slots} slots × {slot_size} B ({size / 2**20:.0f} MiB)")
+        except FileExistsError:
+            shm = shared_memory.SharedMemory(name=name)
+            _, _, have_slots, have_size = _HEADER.unpack_from(shm.buf, 0)
+            if (have_slots, have_size) != (n_slots, slot_size):
+                shm.close()
+                raise ValueError(f"shm ring {name} exists with geometry {have_slots}×{have_size}, wanted {n_slots}×{slot_size}")
+            logger.info(f"Re-attached to shm ring {name} at seq {_U64.unpack_from(shm.buf, _WRITE_SEQ_OFFSET)[0]}")
+        _untrack(shm)  # segment outlives the collector so consumers keep their mapping across restarts
+        return cls(shm)
+
+    def __init__(self, shm):
+        super().__init__(shm)
+        self.write_seq = self.head()
+
+    def write(self, payload: bytes, field: bytes = b"b") -> int:
+        n = len(payload)
+        if n > self.payload_size:
+            raise ValueError(f"payload of {n} B exceeds ring slot payload {self.payload_size} B")
+        seq = self.write_seq
+        buf = self.shm.buf
+        off = HEADER_SIZE + (seq % self.n_slots) * self.slot_size
+        _U64.pack_into(buf, off, int(WRITING))
+        buf[off + SLOT_HEADER_SIZE: off + SLOT_HEADER_SIZE + n] = payload
+        _SLOT_META.pack_into(buf, off + 8, n, _FIELD_CODES[field])
+        _U64.pack_into(buf, off, seq + 1)
+        self.write_seq = seq + 1
+        _U64.pack_into(buf, _WRITE_SEQ_OFFSET, seq + 1)
+        return seq
+
+    def unlink(self):
+        from multiprocessing import resource_tracker
+        resource_tracker.register(self.shm._name, "shared_memory")  # unlink() unregisters it again
+        self.shm.unlink()
+
+
+class ShmRingReader(_Ring):
+    @classmethod
+    def attach(cls, name: str, overrun_policy: str = "latest", from_start: bool = False,
+               wait_seconds: float = 0.0) -> "ShmRingReader":
+        deadline = time.monotonic() + wait_seconds
+        while True:
+            try:
+                shm = shared_memory.SharedMemory(name=name)
+                break
+            except FileNotFoundError:
+                if time.monotonic() >= deadline:
+                    raise
+                time.sleep(0.5)
+        _untrack(shm)
+        return cls(shm, overrun_policy, from_start)
+
+    def __init__(self, shm, overrun_policy: str = "latest", from_start: bool = False):
+        super().__init__(shm)
+        if overrun_policy not in OVERRUN_POLICIES:
+            raise ValueError(f"overrun_policy must be one of {OVERRUN_POLICIES}")
+        self.overrun_policy = overrun_policy
+        head = self.head()
+        self.cursor = max(head - self.n_slots + 1, 0) if from_start else head
+        self.stats = {"consumed": 0, "overruns": 0, "skipped": 0, "torn": 0}
+
+    def lag(self) -> int:
+        return self.head() - self.cursor
+
+    def _handle_overrun(self, head: int):
+        self.stats["overruns"] += 1
+        if self.overrun_policy == "fail":
+            raise RingOverrun(f"consumer at {self.cursor} lapped by producer at {head} ({self.n_slots} slots)")
+        # 'oldest' keeps a quarter ring of headroom so the next reads are not immediately overwritten.
+        target = head if self.overrun_policy == "latest" else head - (self.n_slots * 3) // 4
+        self.stats["skipped"] += target - self.cursor
+        logger.warning(f"shm ring overrun: skipping {target - self.cursor} entries (policy={self.overrun_policy})")
+        self.cursor = target
+
+    def poll(self, max_n: int = 500) -> Optional[Tuple[int, np.ndarray]]:
+        """
+        Returns (first_seq, slots view) for up to max_n contiguous published entries, or None.
+        The view aliases shared memory; call release() once done with it.
+        """
+        head = self.head()
+        if head - self.cursor > self.n_slots:
+            self._handle_overrun(head)
+        if head == self.cursor:
+            return None
+        start = self.cursor % self.n_slots
+        n = min(max_n, head - self.cursor, self.n_slots - start)
+        view = self.slots[start:start + n]
+        expected = np.arange(self.cursor + 1, self.cursor + n + 1, dtype=np.uint64)
+        bad = np.flatnonzero(view["seq"] != expected)
+        if bad.size:
+            first_bad = int(bad[0])
+            if view["seq"][first_bad] != WRITING and view["seq"][first_bad] > expected[first_bad]:
+                self._handle_overrun(self.head())
+                return self.poll(max_n)
+            if first_bad == 0:
+                return None
+            view = view[:first_bad]
+        return self.cursor, view
+
+    def release(self, first_seq: int, view: np.ndarray) -> bool:
+        """Advances past a polled view; False if the producer overwrote part of it meanwhile."""
+        n = len(view)
+        expected = np.arange(first_seq + 1, first_seq + n + 1, dtype=np.uint64)
+        intact = bool((view["seq"] == expected).all())
+        if not intact:
+            self.stats["torn"] += 1
+        self.cursor = max(self.cursor, first_seq + n)
+        self.stats["consumed"] += n
+        return intact
+
+    def take(self, first_seq: int, view: np.ndarray) -> np.ndarray:
+        """
+        Copies a polled view out of shared memory and advances past it. Slots whose seq changed
+        during the copy (seqlock check) were overwritten mid-read and are left out.
+        """
+        rows = view.copy()
+        expected = np.arange(first_seq + 1, first_seq + len(view) + 1, dtype=np.uint64)
+        intact = (rows["seq"] == expected) & (view["seq"] == expected)
+        torn = len(view) - int(intact.sum())
+        if torn:
+            self.stats["torn"] += torn
+            rows = rows[intact]
+        self.cursor = max(self.cursor, first_seq + len(view))
+        self.stats["consumed"] += len(view)
+        return rows
+
+    def entries(self, first_seq: int, view: np.ndarray) -> List[Tuple[int, Dict[bytes, bytes]]]:
+        """Copies polled (or taken) slots out as dealer_raw-style entries [(seq, {field: payload})]."""
+        raw = view.view(np.uint8).reshape(len(view), self.slot_size)
+        out = []
+        for i in range(len(view)):
+            length = int(view["length"][i])
+            field = _FIELD_NAMES.get(int(view["field"][i]), b"d")
+            out.append((int(view["seq"][i]) - 1, {field: raw[i, SLOT_HEADER_SIZE:SLOT_HEADER_SIZE + length].tobytes()}))
+        return out
+
+
+class RingRawTransport:
+    """
+    Redis-client stand-in for the collector: entries for `raw_stream_key` go to the ring
+    (tick record preferred over the JSON frame when both are present), everything else to Redis.
+    An entry carrying several tick records (a trades.* notification) is written one record per
+    slot, since consumers read exactly one record per slot.
+    """
+
+    def __init__(self, redis, writer: ShmRingWriter, raw_stream_key: str):
+        self.redis = redis
+        self.writer = writer
+        self.raw_stream_key = raw_stream_key
+        self.dropped_oversize = 0
+
+    async def xadd(self, stream, fields, **kwargs):
+        if stream != self.raw_stream_key:
+            return await self.redis.xadd(stream, fields, **kwargs)
+        fields = {k.encode() if isinstance(k, str) else k: v for k, v in fields.items()}
+        field = b"b" if b"b" in fields else b"d"
+        payload = fields[field]
+        if isinstance(payload, str):
+            payload = payload.encode()
+        rec_size = TICK_DTYPE.itemsize
+        if field == b"b" and len(payload) > rec_size and len(payload) % rec_size == 0:
+            seq = None
+            for off in range(0, len(payload), rec_size):
+                seq = self.writer.write(payload[off:off + rec_size], field)
+            return seq
+        try:
+            return self.writer.write(payload, field)
+        except ValueError:
+            self.dropped_oversize += 1
+            if self.dropped_oversize % 1000 == 1:
+                logger.error(f"Dropping {field.decode()} entries larger than ring slot payload "
+                             f"({self.writer.payload_size} B); use TICK_FORMAT=binary or a larger SHM_SLOT_SIZE.")
+            return None
+
+    def __getattr__(self, name):
+        return getattr(self.redis, name)
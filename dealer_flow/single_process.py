@@ -0,0 +1,165 @@
+# dealer_flow/single_process.py
+"""
+Single-process low-latency mode: collector, processor, publisher and REST API share one
+event loop and talk through bounded asyncio queues instead of Redis streams.
+
+    python -m dealer_flow single
+
+InProcessBus exposes the small slice of the Redis client API the collector and processor
+use (xadd / xrevrange / hset / hgetall), so both run unchanged against it:
+    dealer_raw       → bounded queue consumed by processor.processor_from_queue (back-pressure
+                       on the collector when full)
+    dealer_metrics   → kept as latest bytes for /snapshot
+    dealer_liquidity → kept as latest fields (spot_ws runs in the same loop when LIQUIDITY_FEEDS is set)
+Redis is optional: when INPROC_REDIS_SINK is on, metrics, book summaries and the instrument
+registry are forwarded through a separate bounded queue (drop-oldest) so the ClickHouse
+writer keeps working, without Redis latency ever reaching the hot path.
+"""
+import asyncio
+import logging
+import time
+from collections import defaultdict
+from typing import Optional
+
+import uvicorn
+
+from dealer_flow.config import settings
+from dealer_flow.redis_stream import get_redis, STREAM_KEY_RAW, STREAM_KEY_METRICS
+from dealer_flow.deribit_ws import DeribitCollector
+from dealer_flow.processor import processor_from_queue, wait_for_redis
+from dealer_flow.tick_schema import INSTRUMENT_REGISTRY_KEY
+from dealer_flow.exposures import STREAM_KEY_EXPOSURES
+from dealer_flow.spot_ws import STREAM_KEY_LIQUIDITY, run_liquidity
+from dealer_flow import rest_service
+
+logger = logging.getLogger(__name__)
+
+STATS_LOG_INTERVAL = 60.0
+
+
+class InProcessBus:
+    def __init__(self, maxsize: int = 10000, sink=None, sink_maxsize: int = 10000, sink_raw: bool = False):
+        self.raw: asyncio.Queue = asyncio.Queue(maxsize=maxsize)
+        self.sink = sink
+        self.sink_raw = sink_raw
+        self._sink_queue: Optional[asyncio.Queue] = asyncio.Queue(maxsize=sink_maxsize) if sink is not None else None
+        self.hashes = defaultdict(dict)
+        self.latest_metrics: Optional[bytes] = None
+        self.on_metrics = None  # callback(payload) for push subscribers
+        self.latest_exposures: Optional[dict] = None  # dealer_exposures fields, served by /exposures
+        # /exposures ETag: bumped on every dealer_exposures xadd, prefixed by start time so a restart never repeats one
+        self.exposures_version = (int(time.time() * 1000), 0)
+        self.latest_liquidity: Optional[dict] = None  # dealer_liquidity fields, read by the processor
+        self.stats = {"raw_in": 0, "raw_max_depth": 0, "sink_dropped": 0,
+                      "queue_wait_ms_max": 0.0, "queue_wait_ms_last": 0.0}
+
+    def _forward(self, op: str, *args, **kwargs):
+        if self._sink_queue is None:
+            return
+        if self._sink_queue.full():
+            self._sink_queue.get_nowait()
+            self.stats["sink_dropped"] += 1
+        self._sink_queue.put_nowait((op, args, kwargs))
+
+    async def xadd(self, stream, fields, **kwargs):
+        fields = {k.encode() if isinstance(k, str) else k: v for k, v in fields.items()}
+        if stream == STREAM_KEY_RAW:
+            await self.raw.put((time.perf_counter(), fields))
+            self.stats["raw_in"] += 1
+            depth = self.raw.qsize()
+            if depth > self.stats["raw_max_depth"]:
+                self.stats["raw_max_depth"] = depth
+            if self.sink_raw:
+                self._forward("xadd", stream, fields)
+            return None
+        if stream == STREAM_KEY_EXPOSURES:
+            self.latest_exposures = fields
+            self.exposures_version = (self.exposures_version[0], self.exposures_version[1] + 1)
+        if stream == STREAM_KEY_LIQUIDITY:
+            self.latest_liquidity = fields
+        if stream == STREAM_KEY_METRICS:
+            self.latest_metrics = fields.get(b"d")
+            if self.on_metrics is not None and self.latest_metrics is not None:
+                self.on_metrics(self.latest_metrics)
+        self._forward("xadd", stream, fields, **kwargs)  # keeps maxlen on the capped streams
+        return None
+
+    async def xrevrange(self, stream, count=1):
+        """Latest-only: dealer_liquidity is the one stream read back in-process."""
+        if stream == STREAM_KEY_LIQUIDITY and self.latest_liquidity is not None:
+            return [(b"0-0", self.latest_liquidity)]
+        return []
+
+    async def hset(self, key, field, value):
+        field = field.encode() if isinstance(field, str) else field
+        self.hashes[key][field] = str(value).encode()
+        self._forward("hset", key, field, value)
+        return 1
+
+    async def hgetall(self, key):
+        return dict(self.hashes.get(key, {}))
+
+    async def set(self, key, value):
+        self._forward("set", key, value)
+        return True
+
+    def note_consumed(self, batch):
+        wait_ms = (time.perf_counter() - batch[0][0]) * 1000.0
+        self.stats["queue_wait_ms_last"] = wait_ms
+        if wait_ms > self.stats["queue_wait_ms_max"]:
+            self.stats["queue_wait_ms_max"] = wait_ms
+
+    async def run_sink(self):
+        """Drains forwarded writes into Redis; retries the current item on error."""
+        if self._sink_queue is None:
+            return
+        while True:
+            op, args, kwargs = await self._sink_queue.get()
+            while True:
+                try:
+                    await getattr(self.sink, op)(*args, **kwargs)
+                    break
+                except Exception as e:
+                    logger.error(f"Redis sink {op} failed: {e}. Retrying in 1s.")
+                    await asyncio.sleep(1)
+
+    async def log_stats(self):
+        while True:
+            await asyncio.sleep(STATS_LOG_INTERVAL)
+            logger.info(f"In-process bus: depth={self.raw.qsize()} {self.stats}")
+            self.stats["queue_wait_ms_max"] = 0.0
+
+
+async def run_single_process():
+    sink = None
+    if settings.inproc_redis_sink:
+        sink = await get_redis()
+        if not await wait_for_redis(sink):
+            logger.warning("Redis sink unavailable; continuing without persistence.")
+            sink = None
+
+    bus = InProcessBus(maxsize=settings.inproc_queue_size, sink=sink,
+                       sink_maxsize=settings.inproc_sink_queue_size)
+    if sink is not None:
+        # Keep instrument ids consistent with anything else reading the Redis registry.
+        bus.hashes[INSTRUMENT_REGISTRY_KEY] = await sink.hgetall(INSTRUMENT_REGISTRY_KEY)
+    rest_service.local_bus = bus
+    bus.on_metrics = rest_service.publish_local
+
+    collector = DeribitCollector(bus)
+    server = uvicorn.Server(uvicorn.Config(rest_service.app, host="0.0.0.0", port=8000, log_level="info"))
+    tasks = [
+        asyncio.create_task(collector.run_forever()),
+        asyncio.create_task(processor_from_queue(bus)),
+        asyncio.create_task(bus.run_sink()),
+        asyncio.create_task(bus.log_stats()),
+    ]
+    if settings.liquidity_feeds:
+        tasks.append(asyncio.create_task(run_liquidity(bus)))
+    try:
+        await server.serve()
+    finally:
+        collector.stop()
+        for t in tasks:
+            t.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
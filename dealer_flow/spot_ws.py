@@ -0,0 +1,356 @@
+# dealer_flow/spot_ws.py
+"""
+Perp / spot order-book liquidity → rolling ADV and ±1% depth for the processor.
+
+    python -m dealer_flow.spot_ws
+
+Venues (LIQUIDITY_FEEDS, comma-separated):
+    deribit   book.{ccy}-PERPETUAL.100ms + trades.{ccy}-PERPETUAL.100ms on the Deribit WS (sizes in USD)
+    binance   {ccy}USDT@depth@100ms + @aggTrade, synced against the REST /api/v3/depth snapshot
+
+Each venue keeps an L2Book:
+    - exact levels in a dict price → USD notional (both feeds send absolute sizes per level)
+    - the same notional summed into a dense float64 array of `bucket_bp`-wide log-price buckets
+      around an anchor, so an update is one dict store plus one array add
+    - ±1% depth is a slice sum over ~2 × 100 buckets, the touch is a flatnonzero; the array
+      is rebuilt from the dict when the mid drifts out of the central half of the window
+A sequence gap marks the book out of sync until the next snapshot. Deribit resubscribes the
+book channel, which always starts with a snapshot. Binance refetches the REST snapshot, which
+is capped at 5000 levels; depth beyond that fills in as those levels update.
+RollingVolume sums trade notional in 1-minute buckets over 24h. Before a full day has been
+seen, ADV is extrapolated from the covered span (at least `min_coverage` seconds).
+
+Every LIQUIDITY_PUBLISH_SECONDS the venue sums go to dealer_liquidity as {"d": JSON}. The
+processor polls the newest entry. ADV replaces its notional-based proxy in rules.classify,
+and |NGI| / min(bid, ask depth) is published as hedge_depth_ratio.
+"""
+import asyncio
+import logging
+import math
+import time
+from collections import deque
+from typing import Dict, List, Optional
+
+import aiohttp
+import numpy as np
+import orjson
+import websockets
+
+from dealer_flow.config import settings
+
+if __name__ == "__main__" and not logging.getLogger().hasHandlers():
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(name)s:%(lineno)d - LIQUIDITY: %(message)s")
+logger = logging.getLogger(__name__)
+
+STREAM_KEY_LIQUIDITY = "dealer_liquidity"
+LIQUIDITY_MAXLEN = 10000
+BID, ASK = 0, 1
+EPS_USD = 1e-6  # bucket sums below this count as empty (float residue of add/remove)
+BINANCE_SNAPSHOT_LEVELS = 5000
+BINANCE_PENDING_MAX = 2000
+RECONNECT_SECONDS = 5.0
+
+
+class L2Book:
+    def __init__(self, bucket_bp: float = 1.0, window_pct: float = 10.0):
+        self.bucket_bp = bucket_bp
+        self.n_half = int(round(window_pct * 100 / bucket_bp))  # buckets on each side of the anchor
+        self._inv_step = 1.0 / math.log1p(bucket_bp * 1e-4)
+        self.levels = ({}, {})  # bids, asks: price → USD notional
+        self.buckets = (np.zeros(2 * self.n_half + 1), np.zeros(2 * self.n_half + 1))
+        self.anchor = 0.0
+        self.seq = None
+        self.synced = False
+        self.updates = 0
+        self.resyncs = 0
+
+    def _index(self, price: float) -> int:
+        return int(round(math.log(price / self.anchor) * self._inv_step)) + self.n_half
+
+    def _rebuild(self, anchor: float):
+        self.anchor = anchor
+        size = len(self.buckets[BID])
+        for side in (BID, ASK):
+            arr = self.buckets[side]
+            arr[:] = 0.0
+            for price, usd in self.levels[side].items():
+                i = self._index(price)
+                if 0 <= i < size:
+                    arr[i] += usd
+
+    def reset(self, bids, asks, seq):
+        """Snapshot: iterables of (price, usd)."""
+        self.levels = ({float(p): float(u) for p, u in bids if u > 0}, {float(p): float(u) for p, u in asks if u > 0})
+        best_bid = max(self.levels[BID], default=0.0)
+        best_ask = min(self.levels[ASK], default=0.0)
+        anchor = (best_bid + best_ask) / 2 if best_bid and best_ask else (best_bid or best_ask)
+        self._rebuild(anchor)
+        self.seq = seq
+        self.synced = anchor > 0
+
+    def update(self, side: int, price: float, usd: float):
+        """Absolute size at one level; usd <= 0 deletes it."""
+        levels = self.levels[side]
+        old = levels.get(price, 0.0)
+        if usd > 0:
+            levels[price] = usd
+        else:
+            levels.pop(price, None)
+            usd = 0.0
+        self.updates += 1
+        if self.anchor > 0:
+            i = self._index(price)
+            if 0 <= i < len(self.buckets[side]):
+                self.buckets[side][i] += usd - old
+
+    def _touch_index(self):
+        bids = np.flatnonzero(self.buckets[BID] > EPS_USD)
+        asks = np.flatnonzero(self.buckets[ASK] > EPS_USD)
+        if not len(bids) or not len(asks):
+            return None
+        return (bids[-1] + asks[0]) // 2
+
+    def depth(self, pct: float = 1.0):
+        """(mid, bid USD within pct below mid, ask USD within pct above mid), or None when unusable."""
+        if not self.synced or self.anchor <= 0:
+            return None
+        mid_i = self._touch_index()
+        if mid_i is None:
+            return None
+        if abs(mid_i - self.n_half) > self.n_half // 2:  # recentre on the mid
+            self._rebuild(self.anchor * math.exp((mid_i - self.n_half) / self._inv_step))
+            mid_i = self._touch_index()
+            if mid_i is None:
+                return None
+        k = int(round(pct * 100 / self.bucket_bp))
+        bid_usd = float(self.buckets[BID][max(mid_i - k, 0):mid_i + 1].sum())
+        ask_usd = float(self.buckets[ASK][mid_i:mid_i + k + 1].sum())
+        mid = self.anchor * math.exp((mid_i - self.n_half) / self._inv_step)
+        return mid, bid_usd, ask_usd
+
+
+def apply_deribit_book(book: L2Book, data: dict) -> bool:
+    """One book.* notification. False when it reveals a change_id gap (resubscribe for a new snapshot)."""
+    if data.get("type") == "snapshot":
+        book.reset(((p, a) for _, p, a in data.get("bids", [])), ((p, a) for _, p, a in data.get("asks", [])),
+                   data.get("change_id"))
+        return True
+    if not book.synced:
+        return True  # waiting for the snapshot a resubscribe brings
+    if data.get("prev_change_id") != book.seq:
+        book.synced = False
+        book.resyncs += 1
+        return False
+    for side, key in ((BID, "bids"), (ASK, "asks")):
+        for action, price, amount in data.get(key, []):
+            book.update(side, float(price), 0.0 if action == "delete" else float(amount))
+    book.seq = data.get("change_id")
+    return True
+
+
+class BinanceDepthSync:
+    """Binance diff-depth ordering rules on top of an L2Book; quantities are converted to USD."""
+
+    def __init__(self, book: L2Book):
+        self.book = book
+        self.pending = deque(maxlen=BINANCE_PENDING_MAX)  # events received while out of sync
+
+    def on_snapshot(self, snap: dict):
+        self.book.reset(((float(p), float(p) * float(q)) for p, q in snap.get("bids", [])),
+                        ((float(p), float(p) * float(q)) for p, q in snap.get("asks", [])),
+                        snap.get("lastUpdateId"))
+        pending, self.pending = list(self.pending), deque(maxlen=BINANCE_PENDING_MAX)
+        for ev in pending:
+            self.on_event(ev)
+
+    def on_event(self, ev: dict) -> bool:
+        """One depthUpdate. False while a (new) REST snapshot is needed."""
+        if not self.book.synced:
+            self.pending.append(ev)
+            return False
+        if ev["u"] <= self.book.seq:
+            return True  # already contained in the snapshot
+        if ev["U"] > self.book.seq + 1:
+            self.book.synced = False
+            self.book.resyncs += 1
+            self.pending.append(ev)
+            return False
+        for side, key in ((BID, "b"), (ASK, "a")):
+            for p, q in ev.get(key, []):
+                price = float(p)
+                self.book.update(side, price, price * float(q))
+        self.book.seq = ev["u"]
+        return True
+
+
+class RollingVolume:
+    def __init__(self, window_seconds: float = 86400.0, bucket_seconds: float = 60.0, min_coverage: float = 300.0):
+        self.bucket_seconds = bucket_seconds
+        self.window_seconds = window_seconds
+        self.min_coverage = min_coverage
+        self.buckets = np.zeros(int(window_seconds // bucket_seconds))
+        self._last: Optional[int] = None  # newest bucket index
+        self.first_ts: Optional[float] = None
+
+    def _roll(self, b: int):
+        n = len(self.buckets)
+        if self._last is None:
+            self._last = b
+        elif b > self._last:
+            for i in range(max(self._last + 1, b - n + 1), b + 1):
+                self.buckets[i % n] = 0.0
+            self._last = b
+
+    def add(self, ts: float, usd: float):
+        b = int(ts // self.bucket_seconds)
+        self._roll(b)
+        if b <= self._last - len(self.buckets):
+            return  # older than the window
+        if self.first_ts is None or ts < self.first_ts:
+            self.first_ts = ts
+        self.buckets[b % len(self.buckets)] += usd
+
+    def adv(self, now: float) -> Optional[float]:
+        """Trailing 24h notional, extrapolated while less than a day has been seen."""
+        if self.first_ts is None:
+            return None
+        self._roll(int(now // self.bucket_seconds))
+        covered = min(now - self.first_ts, self.window_seconds)
+        if covered < self.min_coverage:
+            return None
+        return float(self.buckets.sum()) * self.window_seconds / covered
+
+
+class Venue:
+    def __init__(self, name: str):
+        self.name = name
+        self.book = L2Book()
+        self.volume = RollingVolume()
+
+    def summary(self, now: float, pct: float) -> dict:
+        depth = self.book.depth(pct)
+        mid, bid_usd, ask_usd = depth if depth is not None else (None, None, None)
+        return {"adv_usd": self.volume.adv(now), "mid": mid, "depth_bid_usd": bid_usd, "depth_ask_usd": ask_usd,
+                "synced": self.book.synced, "resyncs": self.book.resyncs}
+
+
+def aggregate(venues: List[Venue], now: float, pct: float) -> dict:
+    """Venue sums; a total is None when no venue has that input yet."""
+    per_venue = {v.name: v.summary(now, pct) for v in venues}
+
+    def total(key):
+        vals = [s[key] for s in per_venue.values() if s[key] is not None]
+        return float(sum(vals)) if vals else None
+
+    return {"ts": now, "depth_pct": pct, "adv_usd": total("adv_usd"), "depth_bid_usd": total("depth_bid_usd"),
+            "depth_ask_usd": total("depth_ask_usd"), "venues": per_venue}
+
+
+async def _send(ws, method: str, channels: List[str]):
+    await ws.send(orjson.dumps({"jsonrpc": "2.0", "id": int(time.time() * 1000), "method": method,
+                                "params": {"channels": channels}}))
+
+
+async def run_deribit(venue: Venue, shutdown: asyncio.Event):
+    inst = f"{settings.currency}-PERPETUAL"
+    book_ch, trades_ch = f"book.{inst}.100ms", f"trades.{inst}.100ms"
+    while not shutdown.is_set():
+        try:
+            async with websockets.connect(settings.deribit_ws, ping_interval=20, ping_timeout=20) as ws:
+                await _send(ws, "public/subscribe", [book_ch, trades_ch])
+                logger.info(f"Deribit liquidity feed subscribed to {book_ch}, {trades_ch}")
+                async for raw in ws:
+                    params = orjson.loads(raw).get("params") or {}
+                    channel, data = params.get("channel"), params.get("data")
+                    if channel == book_ch and isinstance(data, dict):
+                        if not apply_deribit_book(venue.book, data):
+                            logger.warning(f"{book_ch} change_id gap; resubscribing for a fresh snapshot.")
+                            await _send(ws, "public/unsubscribe", [book_ch])
+                            await _send(ws, "public/subscribe", [book_ch])
+                    elif channel == trades_ch and isinstance(data, list):
+                        for tr in data:  # perpetual amounts are USD
+                            venue.volume.add(tr.get("timestamp", time.time() * 1000) / 1000.0, float(tr.get("amount") or 0.0))
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.error(f"Deribit liquidity feed failed: {e}. Reconnecting in {RECONNECT_SECONDS:.0f}s.")
+        venue.book.synced = False
+        await asyncio.sleep(RECONNECT_SECONDS)
+
+
+async def run_binance(venue: Venue, shutdown: asyncio.Event):
+    symbol = f"{settings.currency}USDT"
+    url = f"{settings.binance_ws}/stream?streams={symbol.lower()}@depth@100ms/{symbol.lower()}@aggTrade"
+    sync = BinanceDepthSync(venue.book)
+
+    async def fetch_snapshot(http):
+        async with http.get(f"{settings.binance_rest}/api/v3/depth",
+                            params={"symbol": symbol, "limit": BINANCE_SNAPSHOT_LEVELS}) as resp:
+            resp.raise_for_status()
+            sync.on_snapshot(await resp.json())
+        logger.info(f"Binance {symbol} book synced at {venue.book.seq} ({len(venue.book.levels[BID])} bids).")
+
+    async with aiohttp.ClientSession() as http:
+        while not shutdown.is_set():
+            snapshot_task = None
+            try:
+                async with websockets.connect(url, ping_interval=20, ping_timeout=20) as ws:
+                    logger.info(f"Binance liquidity feed connected ({symbol})")
+                    async for raw in ws:
+                        data = orjson.loads(raw).get("data") or {}
+                        event = data.get("e")
+                        if event == "depthUpdate":
+                            if not sync.on_event(data) and (snapshot_task is None or snapshot_task.done()):
+                                snapshot_task = asyncio.create_task(fetch_snapshot(http))
+                        elif event == "aggTrade":
+                            venue.volume.add(data["T"] / 1000.0, float(data["p"]) * float(data["q"]))
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Binance liquidity feed failed: {e}. Reconnecting in {RECONNECT_SECONDS:.0f}s.")
+            finally:
+                if snapshot_task is not None:
+                    snapshot_task.cancel()
+            venue.book.synced = False
+            sync.pending.clear()
+            await asyncio.sleep(RECONNECT_SECONDS)
+
+
+FEEDS = {"deribit": run_deribit, "binance": run_binance}
+
+
+async def run_liquidity(redis, shutdown: Optional[asyncio.Event] = None):
+    """Runs the configured feeds and publishes their aggregate to dealer_liquidity until cancelled."""
+    shutdown = shutdown or asyncio.Event()
+    names = [n.strip() for n in settings.liquidity_feeds.split(",") if n.strip()]
+    unknown = [n for n in names if n not in FEEDS]
+    if unknown:
+        raise ValueError(f"unknown liquidity feeds {unknown}; choose from {sorted(FEEDS)}")
+    venues = [Venue(n) for n in names]
+    tasks = [asyncio.create_task(FEEDS[v.name](v, shutdown)) for v in venues]
+    logger.info(f"Liquidity aggregator started for {names}")
+    try:
+        while not shutdown.is_set():
+            await asyncio.sleep(settings.liquidity_publish_seconds)
+            payload = aggregate(venues, time.time(), settings.liquidity_depth_pct)
+            try:
+                await redis.xadd(STREAM_KEY_LIQUIDITY, {"d": orjson.dumps(payload)},
+                                 maxlen=LIQUIDITY_MAXLEN, approximate=True)
+            except Exception as e:
+                logger.error(f"XADD {STREAM_KEY_LIQUIDITY} failed: {e}")
+    finally:
+        for t in tasks:
+            t.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+
+async def main():
+    from dealer_flow.redis_stream import get_redis
+    await run_liquidity(await get_redis())
+
+
+if __name__ == "__main__":
+    try:
+        asyncio.run(main())
+    except KeyboardInterrupt:
+        logger.info("Liquidity aggregator stopped.")
@@ -0,0 +1,275 @@
+# dealer_flow/supervisor.py
+"""
+Production process runner: one child process per service, restarted with backoff.
+
+    python -m dealer_flow run                       # RUN_SERVICES, default all below
+    python -m dealer_flow run processor api         # a subset
+
+Services (RUN_SERVICES, comma-separated):
+    collector   deribit_ws.main_run_collector
+    liquidity   spot_ws.main (skipped when LIQUIDITY_FEEDS is empty)
+    processor   processor.processor
+    writer      clickhouse_writer.main
+    api         uvicorn serving rest_service.app on :8000
+The processor keeps the whole option chain in one greek store, so it runs as a single process;
+start more than one and each would publish partial metrics.
+
+Each child is `python -m dealer_flow.supervisor --child <name>`. It pins itself to its cores,
+installs uvloop as the event-loop policy (RUN_UVLOOP, when installed), and runs the service
+coroutine. SIGTERM / SIGINT cancel it cleanly.
+RUN_CPUS pins services to cores, e.g. "processor=2;collector=3;writer=4-5,7". Unlisted services
+get the allowed cores minus the pinned ones, so a pinned stage has its cores to itself (give
+ClickHouse / Redis their own cpuset outside this container).
+A child that exits is restarted after 1s, 2s, 4s … up to RUN_RESTART_BACKOFF_MAX_SECONDS. The
+delay resets once a child has stayed up for STABLE_SECONDS. Every RUN_REPORT_SECONDS the
+supervisor logs CPU % and RSS of each child from /proc.
+"""
+import argparse
+import asyncio
+import importlib
+import logging
+import os
+import signal
+import subprocess
+import sys
+import time
+from typing import Dict, List, Optional, Set, Tuple
+
+from dealer_flow.config import settings
+
+logger = logging.getLogger(__name__)
+
+SERVICES = {
+    "collector": ("dealer_flow.deribit_ws", "main_run_collector"),
+    "liquidity": ("dealer_flow.spot_ws", "main"),
+    "processor": ("dealer_flow.processor", "processor"),
+    "writer": ("dealer_flow.clickhouse_writer", "main"),
+    "api": ("dealer_flow.supervisor", "serve_api"),
+}
+RESTART_BACKOFF_BASE = 1.0
+STABLE_SECONDS = 60.0
+STOP_TIMEOUT_SECONDS = 10.0
+POLL_SECONDS = 0.5
+LOG_FORMAT = "%(asctime)s %(levelname)s %(name)s:%(lineno)d - {}: %(message)s"
+
+
+def parse_cpus(spec: str) -> Set[int]:
+    """'2', '4-5,7' → {2}, {4, 5, 7}"""
+    cpus = set()
+    for part in spec.split(","):
+        part = part.strip()
+        if not part:
+            continue
+        lo, _, hi = part.partition("-")
+        cpus.update(range(int(lo), int(hi or lo) + 1))
+    return cpus
+
+
+def parse_cpu_map(spec: str) -> Dict[str, Set[int]]:
+    """'processor=2;writer=4-5,7' → {"processor": {2}, "writer": {4, 5, 7}}"""
+    out = {}
+    for item in spec.split(";"):
+        if not item.strip():
+            continue
+        name, _, cpus = item.partition("=")
+        name = name.strip()
+        if name not in SERVICES:
+            raise ValueError(f"RUN_CPUS names unknown service {name!r}; choose from {sorted(SERVICES)}")
+        out[name] = parse_cpus(cpus)
+    return out
+
+
+def plan_affinity(services: List[str], cpu_map: Dict[str, Set[int]], available: Set[int]) -> Dict[str, Set[int]]:
+    """Cores per service: pinned ones as configured, the rest share whatever nobody pinned."""
+    pinned = set().union(*cpu_map.values()) if cpu_map else set()
+    missing = pinned - available
+    if missing:
+        raise ValueError(f"RUN_CPUS uses cores {sorted(missing)} outside the allowed set {sorted(available)}")
+    shared = (available - pinned) or available  # every core pinned → unpinned services float
+    return {name: set(cpu_map.get(name, shared)) for name in services}
+
+
+def restart_delay(failures: int, cap: float) -> float:
+    return min(RESTART_BACKOFF_BASE * 2 ** max(failures - 1, 0), cap)
+
+
+_CLK_TCK = os.sysconf("SC_CLK_TCK") if hasattr(os, "sysconf") else 100
+
+
+def proc_usage(pid: int) -> Optional[Tuple[float, int]]:
+    """(CPU seconds user+system, RSS bytes) from /proc, or None where /proc is unavailable."""
+    try:
+        with open(f"/proc/{pid}/stat", "rb") as f:
+            fields = f.read().rsplit(b")", 1)[1].split()
+        with open(f"/proc/{pid}/statm", "rb") as f:
+            rss_pages = int(f.read().split()[1])
+    except (OSError, IndexError, ValueError):
+        return None
+    return (int(fields[11]) + int(fields[12])) / _CLK_TCK, rss_pages * os.sysconf("SC_PAGE_SIZE")
+
+
+class Child:
+    def __init__(self, name: str, cpus: Set[int]):
+        self.name = name
+        self.cpus = cpus
+        self.proc: Optional[subprocess.Popen] = None
+        self.started = 0.0
+        self.restarts = 0
+        self.failures = 0
+        self.next_start = 0.0
+        self._last_usage = None  # (cpu seconds, wall time) at the previous report
+
+    def start(self):
+        cmd = [sys.executable, "-m", "dealer_flow.supervisor", "--child", self.name]
+        self.proc = subprocess.Popen(cmd)
+        self.started = time.monotonic()
+        self._last_usage = None
+        logger.info(f"Started {self.name} (pid {self.proc.pid}, cpus {_fmt_cpus(self.cpus)})")
+
+    def poll(self, now: float, backoff_cap: float):
+        """Restarts an exited child once its backoff delay has passed."""
+        if self.proc is None:
+            if now >= self.next_start:
+                self.start()
+            return
+        code = self.proc.poll()
+        if code is None:
+            return
+        uptime = now - self.started
+        self.failures = 1 if uptime >= STABLE_SECONDS else self.failures + 1
+        delay = restart_delay(self.failures, backoff_cap)
+        logger.warning(f"{self.name} (pid {self.proc.pid}) exited with code {code} after {uptime:.0f}s; "
+                       f"restarting in {delay:.0f}s")
+        self.proc = None
+        self.restarts += 1
+        self.next_start = now + delay
+
+    def report(self, now: float) -> str:
+        if self.proc is None:
+            return f"{self.name}: down, restart in {max(self.next_start - now, 0):.0f}s (restarts={self.restarts})"
+        usage = proc_usage(self.proc.pid)
+        if usage is None:
+            return f"{self.name}: pid={self.proc.pid} up={max(now - self.started, 0):.0f}s restarts={self.restarts}"
+        cpu_s, rss = usage
+        last = self._last_usage or (0.0, self.started)
+        cpu_pct = 100.0 * (cpu_s - last[0]) / max(now - last[1], 1e-9)
+        self._last_usage = (cpu_s, now)
+        return (f"{self.name}: pid={self.proc.pid} cpu={cpu_pct:.1f}% rss={rss / 2**20:.0f}MB "
+                f"cpus={_fmt_cpus(self.cpus)} up={max(now - self.started, 0):.0f}s restarts={self.restarts}")
+
+    def stop(self):
+        if self.proc is not None and self.proc.poll() is None:
+            self.proc.terminate()
+
+
+def _fmt_cpus(cpus: Set[int]) -> str:
+    return ",".join(str(c) for c in sorted(cpus))
+
+
+def _allowed_cpus() -> Set[int]:
+    if hasattr(os, "sched_getaffinity"):
+        return set(os.sched_getaffinity(0))
+    return set(range(os.cpu_count() or 1))
+
+
+def supervise(services: List[str]):
+    cpu_map = parse_cpu_map(settings.run_cpus)
+    affinity = plan_affinity(services, cpu_map, _allowed_cpus())
+    children = [Child(name, affinity[name]) for name in services]
+    stopping = []
+
+    def request_stop(signum, _frame):
+        logger.info(f"Received signal {signum}; stopping {len(children)} services.")
+        stopping.append(signum)
+
+    signal.signal(signal.SIGTERM, request_stop)
+    signal.signal(signal.SIGINT, request_stop)
+    logger.info(f"Supervising {services} (uvloop={'on' if settings.run_uvloop else 'off'}, "
+                f"pinned={ {k: _fmt_cpus(v) for k, v in cpu_map.items()} })")
+
+    next_report = time.monotonic() + settings.run_report_seconds
+    while not stopping:
+        now = time.monotonic()
+        for child in children:
+            child.poll(now, settings.run_restart_backoff_max_seconds)
+        if now >= next_report:
+            for child in children:
+                logger.info(child.report(now))
+            next_report = now + settings.run_report_seconds
+        time.sleep(POLL_SECONDS)
+
+    for child in children:
+        child.stop()
+    deadline = time.monotonic() + STOP_TIMEOUT_SECONDS
+    for child in children:
+        if child.proc is None:
+            continue
+        try:
+            child.proc.wait(timeout=max(deadline - time.monotonic(), 0.1))
+        except subprocess.TimeoutExpired:
+            logger.warning(f"{child.name} did not stop within {STOP_TIMEOUT_SECONDS:.0f}s; killing it.")
+            child.proc.kill()
+    logger.info("All services stopped.")
+
+
+# ----------------------------------------------------------------- child side
+
+async def serve_api():
+    import uvicorn
+    from dealer_flow.rest_service import app
+    server = uvicorn.Server(uvicorn.Config(app, host="0.0.0.0", port=8000, log_level="info", loop="none"))
+    await server.serve()
+
+
+async def _run_until_signalled(entry):
+    task = asyncio.ensure_future(entry())
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGTERM, signal.SIGINT):
+        loop.add_signal_handler(sig, task.cancel)
+    try:
+        await task
+    except asyncio.CancelledError:
+        logger.info("Stopped by signal.")
+
+
+def run_child(name: str):
+    cpus = plan_affinity([name], parse_cpu_map(settings.run_cpus), _allowed_cpus())[name]
+    if hasattr(os, "sched_setaffinity"):
+        os.sched_setaffinity(0, cpus)  # before the service starts numba / ClickHouse threads, which inherit it
+    if settings.run_uvloop:
+        try:
+            import uvloop
+            asyncio.set_event_loop_policy(uvloop.EventLoopPolicy())
+        except ImportError:
+            logger.warning("RUN_UVLOOP is set but uvloop is not installed; using the default asyncio loop.")
+    module, attr = SERVICES[name]
+    entry = getattr(importlib.import_module(module), attr)
+    logger.info(f"{name} running on cpus {_fmt_cpus(cpus)} with {type(asyncio.get_event_loop_policy()).__module__}")
+    asyncio.run(_run_until_signalled(entry))
+
+
+def configured_services() -> List[str]:
+    names = [n.strip() for n in settings.run_services.split(",") if n.strip()]
+    return [n for n in names if n != "liquidity" or settings.liquidity_feeds]
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(prog="python -m dealer_flow run", description="Run and supervise dealer-flow services")
+    ap.add_argument("services", nargs="*", help=f"subset of {list(SERVICES)} (default: RUN_SERVICES)")
+    ap.add_argument("--child", help=argparse.SUPPRESS)
+    args = ap.parse_args(argv)
+    name = args.child or "SUPERVISOR"
+    if not logging.getLogger().hasHandlers():
+        logging.basicConfig(level=logging.INFO, format=LOG_FORMAT.format(name.upper()))
+    if args.child:
+        run_child(args.child)
+        return
+    services = args.services or configured_services()
+    unknown = [n for n in services if n not in SERVICES]
+    if unknown:
+        ap.error(f"unknown services {unknown}; choose from {list(SERVICES)}")
+    supervise(services)
+
+
+if __name__ == "__main__":
+    main()
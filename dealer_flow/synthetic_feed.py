@@ -0,0 +1,338 @@
+# dealer_flow/synthetic_feed.py
+"""
+Local stand-in for Deribit, for load tests without the exchange.
+
+Speaks the subset of JSON-RPC the collector uses:
+    GET  /api/v2/public/auth           → fake access token (collector runs in auth mode)
+    GET  /api/v2/public/get_index_price, get_book_summary_by_currency, ticker
+                                       → REST snapshots for the collector's cold start (rest_bootstrap)
+    WS   /ws/api/v2                    → public/subscribe, public/unsubscribe, public/test,
+                                         public/set_heartbeat (+ test_request heartbeats)
+    notifications                      → ticker.<inst>.100ms, book_summary.option.<ccy>.all,
+                                         deribit_price_index.<ccy>_usd
+    GET  /control/stats, POST /control/rate {"msgs_per_sec": N}   (load-test control)
+
+    python -m dealer_flow.synthetic_feed --port 8765 --rate 2000
+    DERIBIT_WS=ws://127.0.0.1:8765/ws/api/v2 DERIBIT_REST=http://127.0.0.1:8765/api/v2 python -m dealer_flow.deribit_ws
+"""
+import argparse
+import asyncio
+import datetime as dt
+import logging
+import math
+import time
+
+import numpy as np
+import orjson
+from aiohttp import web, WSMsgType
+
+if __name__ == "__main__" and not logging.getLogger().hasHandlers():
+    logging.basicConfig(
+        level=logging.INFO,
+        format="%(asctime)s %(levelname)s %(name)s:%(lineno)d - SYNTH: %(message)s"
+    )
+logger = logging.getLogger(__name__)
+
+SECONDS_PER_YEAR = 365 * 24 * 3600
+PUMP_INTERVAL = 0.01  # scheduler slice for ticker emission
+_norm_cdf = np.vectorize(lambda x: 0.5 * (1.0 + math.erf(x / math.sqrt(2.0))), otypes=[float])
+
+
+class SyntheticChain:
+    """
+    Option chain with a random-walk spot, a simple smile and OI concentrated around ATM.
+    Greeks/marks are recomputed vectorised on each spot step, so emitting a ticker is a dict build.
+    """
+
+    def __init__(self, currency="BTC", spot=60000.0, expiry_days=(1, 7, 30, 90),
+                 strikes_per_expiry=40, strike_step=1000.0, atm_vol=0.6, seed=7):
+        self.currency = currency
+        self.spot = float(spot)
+        self.atm_vol = atm_vol
+        self.rng = np.random.default_rng(seed)
+
+        now = dt.datetime.now(dt.timezone.utc)
+        center = round(spot / strike_step) * strike_step
+        names, strikes, expiries, calls = [], [], [], []
+        for days in expiry_days:
+            exp = (now + dt.timedelta(days=days)).replace(hour=8, minute=0, second=0, microsecond=0)
+            tag = f"{exp.day}{exp.strftime('%b%y').upper()}"
+            for k in range(-(strikes_per_expiry // 2), strikes_per_expiry - strikes_per_expiry // 2):
+                K = center + k * strike_step
+                if K <= 0:
+                    continue
+                for cp in ("C", "P"):
+                    names.append(f"{currency}-{tag}-{int(K)}-{cp}")
+                    strikes.append(K)
+                    expiries.append(exp.timestamp())
+                    calls.append(cp == "C")
+
+        self.names = names
+        self.strike = np.array(strikes)
+        self.expiry_ts = np.array(expiries)
+        self.is_call = np.array(calls)
+        moneyness = np.log(self.strike / spot)
+        self.oi = np.round(self.rng.gamma(2.0, 150.0, len(names)) * np.exp(-4.0 * np.abs(moneyness)), 1)
+        self.volume = np.zeros(len(names))
+        self.refresh(time.time())
+
+    def __len__(self):
+        return len(self.names)
+
+    def step_spot(self, dt_seconds: float):
+        sd = self.atm_vol * math.sqrt(dt_seconds / SECONDS_PER_YEAR)
+        self.spot *= math.exp(sd * self.rng.standard_normal() - 0.5 * sd * sd)
+
+    def refresh(self, now_ts: float):
+        S, K = self.spot, self.strike
+        T = np.maximum(self.expiry_ts - now_ts, 60.0) / SECONDS_PER_YEAR
+        self.iv = self.atm_vol * (1.0 + 0.8 * np.log(K / S) ** 2)
+        sq = self.iv * np.sqrt(T)
+        d1 = (np.log(S / K) + 0.5 * self.iv ** 2 * T) / sq
+        d2 = d1 - sq
+        pdf = np.exp(-0.5 * d1 * d1) / math.sqrt(2 * math.pi)
+        n1, n2 = _norm_cdf(d1), _norm_cdf(d2)
+        call = S * n1 - K * n2
+        put = call - S + K
+        price_usd = np.where(self.is_call, call, put)
+        self.mark_price = np.maximum(price_usd, 0.0) / S  # Deribit quotes options in BTC
+        self.delta = np.where(self.is_call, n1, n1 - 1.0)
+        self.gamma = pdf / (S * sq)
+        self.vega = S * pdf * np.sqrt(T) / 100.0
+        self.theta = -S * pdf * self.iv / (2 * np.sqrt(T)) / 365.0
+
+    def ticker(self, i: int, now_ms: int) -> dict:
+        return {
+            "instrument_name": self.names[i],
+            "timestamp": now_ms,
+            "state": "open",
+            "index_price": self.spot,
+            "underlying_price": self.spot,
+            "mark_price": float(self.mark_price[i]),
+            "mark_iv": float(self.iv[i] * 100.0),
+            "open_interest": float(self.oi[i]),
+            "greeks": {
+                "delta": float(self.delta[i]), "gamma": float(self.gamma[i]),
+                "vega": float(self.vega[i]), "theta": float(self.theta[i]), "rho": 0.0,
+            },
+        }
+
+    def book_summary(self, now_ms: int) -> list:
+        iv = self.iv * 100.0
+        return [
+            {
+                "instrument_name": self.names[i],
+                "creation_timestamp": now_ms,
+                "underlying_price": self.spot,
+                "underlying_index": "index_price",
+                "quote_currency": self.currency,
+                "open_interest": float(self.oi[i]),
+                "volume": float(self.volume[i]),
+                "volume_usd": float(self.volume[i] * self.spot),
+                "bid_iv": float(iv[i] - 1.0),
+                "ask_iv": float(iv[i] + 1.0),
+                "mark_iv": float(iv[i]),
+                "mark_price": float(self.mark_price[i]),
+                "interest_rate": 0.0,
+            }
+            for i in range(len(self.names))
+        ]
+
+
+def _notification(channel: str, data) -> str:
+    return orjson.dumps({"jsonrpc": "2.0", "method": "subscription",
+                         "params": {"channel": channel, "data": data}}).decode()
+
+
+class SyntheticDeribitServer:
+    def __init__(self, chain: SyntheticChain, msgs_per_sec: float = 1000.0,
+                 index_interval: float = 0.1, summary_interval: float = 1.0):
+        self.chain = chain
+        self.msgs_per_sec = msgs_per_sec
+        self.index_interval = index_interval
+        self.summary_interval = summary_interval
+        self.index_by_name = {n: i for i, n in enumerate(chain.names)}
+        self.sent_tickers = 0
+        self.sent_total = 0
+        self.rest_requests = 0
+        self.connections = 0
+        self._runner = None
+
+    def build_app(self) -> web.Application:
+        app = web.Application()
+        app.router.add_get("/api/v2/public/auth", self._auth)
+        app.router.add_get("/api/v2/public/get_index_price", self._rest_index)
+        app.router.add_get("/api/v2/public/get_book_summary_by_currency", self._rest_book_summary)
+        app.router.add_get("/api/v2/public/ticker", self._rest_ticker)
+        app.router.add_get("/ws/api/v2", self._ws_handler)
+        app.router.add_get("/control/stats", self._stats)
+        app.router.add_post("/control/rate", self._set_rate)
+        return app
+
+    async def start(self, host="127.0.0.1", port=8765) -> int:
+        """Starts serving and returns the bound port (pass port=0 for any free one)."""
+        self._runner = web.AppRunner(self.build_app())
+        await self._runner.setup()
+        await web.TCPSite(self._runner, host, port).start()
+        port = self._runner.addresses[0][1]
+        logger.info(f"Synthetic Deribit on {host}:{port} ({len(self.chain)} instruments, {self.msgs_per_sec:.0f} msgs/s)")
+        return port
+
+    async def stop(self):
+        if self._runner:
+            await self._runner.cleanup()
+
+    def stats(self) -> dict:
+        return {"sent_tickers": self.sent_tickers, "sent_total": self.sent_total,
+                "msgs_per_sec": self.msgs_per_sec, "connections": self.connections, "spot": self.chain.spot,
+                "rest_requests": self.rest_requests}
+
+    async def _auth(self, request):
+        return web.json_response({"jsonrpc": "2.0", "result": {
+            "access_token": "synthetic", "expires_in": 31536000, "token_type": "bearer"}})
+
+    def _rest_result(self, result):
+        self.rest_requests += 1
+        return web.json_response({"jsonrpc": "2.0", "result": result}, dumps=lambda o: orjson.dumps(o).decode())
+
+    async def _rest_index(self, request):
+        return self._rest_result({"index_price": self.chain.spot, "estimated_delivery_price": self.chain.spot})
+
+    async def _rest_book_summary(self, request):
+        return self._rest_result(self.chain.book_summary(int(time.time() * 1000)))
+
+    async def _rest_ticker(self, request):
+        i = self.index_by_name.get(request.query.get("instrument_name", ""))
+        if i is None:
+            self.rest_requests += 1
+            return web.json_response({"jsonrpc": "2.0", "error": {"code": 10020, "message": "instrument_not_found"}},
+                                     status=400)
+        return self._rest_result(self.chain.ticker(i, int(time.time() * 1000)))
+
+    async def _stats(self, request):
+        return web.json_response(self.stats())
+
+    async def _set_rate(self, request):
+        body = await request.json()
+        self.msgs_per_sec = float(body["msgs_per_sec"])
+        logger.info(f"Ticker rate set to {self.msgs_per_sec:.0f} msgs/s")
+        return web.json_response(self.stats())
+
+    async def _ws_handler(self, request):
+        ws = web.WebSocketResponse()
+        await ws.prepare(request)
+        self.connections += 1
+        subs = set()
+        pump = asyncio.create_task(self._pump(ws, subs))
+        hb_task = None
+        try:
+            async for msg in ws:
+                if msg.type != WSMsgType.TEXT and msg.type != WSMsgType.BINARY:
+                    continue
+                req = orjson.loads(msg.data)
+                method, params, req_id = req.get("method"), req.get("params") or {}, req.get("id")
+                if method == "public/subscribe":
+                    subs.update(params.get("channels", []))
+                    result = params.get("channels", [])
+                elif method == "public/unsubscribe":
+                    subs.difference_update(params.get("channels", []))
+                    result = params.get("channels", [])
+                elif method == "public/set_heartbeat":
+                    if hb_task:
+                        hb_task.cancel()
+                    hb_task = asyncio.create_task(self._heartbeat(ws, float(params.get("interval", 15))))
+                    result = "ok"
+                elif method == "public/test":
+                    result = {"version": "synthetic"}
+                else:
+                    await ws.send_str(orjson.dumps({"jsonrpc": "2.0", "id": req_id, "error": {
+                        "code": 11050, "message": f"unsupported method {method}"}}).decode())
+                    continue
+                await ws.send_str(orjson.dumps({"jsonrpc": "2.0", "id": req_id, "result": result}).decode())
+        finally:
+            pump.cancel()
+            if hb_task:
+                hb_task.cancel()
+            self.connections -= 1
+        return ws
+
+    async def _heartbeat(self, ws, interval: float):
+        while not ws.closed:
+            await asyncio.sleep(interval)
+            await ws.send_str(orjson.dumps({"jsonrpc": "2.0", "method": "heartbeat",
+                                            "params": {"type": "test_request"}}).decode())
+
+    async def _pump(self, ws, subs: set):
+        ccy = self.chain.currency.lower()
+        index_ch = f"deribit_price_index.{ccy}_usd"
+        summary_ch = f"book_summary.option.{ccy}.all"
+        last = time.monotonic()
+        last_index = last_summary = 0.0
+        budget = 0.0
+        cursor = 0
+        try:
+            while not ws.closed:
+                await asyncio.sleep(PUMP_INTERVAL)
+                t = time.monotonic()
+                elapsed, last = t - last, t
+                now = time.time()
+                now_ms = int(now * 1000)
+
+                if t - last_index >= self.index_interval:
+                    self.chain.step_spot(t - last_index if last_index else self.index_interval)
+                    self.chain.refresh(now)
+                    last_index = t
+                    if index_ch in subs:
+                        await ws.send_str(_notification(index_ch, {
+                            "index_name": f"{ccy}_usd", "price": self.chain.spot, "timestamp": now_ms}))
+                        self.sent_total += 1
+
+                if summary_ch in subs and t - last_summary >= self.summary_interval:
+                    await ws.send_str(_notification(summary_ch, self.chain.book_summary(now_ms)))
+                    self.sent_total += 1
+                    last_summary = t
+
+                targets = [self.index_by_name[c[7:-6]] for c in subs
+                           if c.startswith("ticker.") and c[7:-6] in self.index_by_name]
+                if not targets:
+                    budget = 0.0
+                    continue
+                budget += self.msgs_per_sec * elapsed
+                n = int(budget)
+                budget -= n
+                for _ in range(n):
+                    i = targets[cursor % len(targets)]
+                    cursor += 1
+                    await ws.send_str(_notification(f"ticker.{self.chain.names[i]}.100ms", self.chain.ticker(i, now_ms)))
+                self.sent_tickers += n
+                self.sent_total += n
+        except (ConnectionResetError, asyncio.CancelledError):
+            pass
+
+
+async def main():
+    ap = argparse.ArgumentParser(description="Synthetic Deribit WebSocket feed.")
+    ap.add_argument("--host", default="127.0.0.1")
+    ap.add_argument("--port", type=int, default=8765)
+    ap.add_argument("--rate", type=float, default=1000.0, help="ticker msgs/sec per connection")
+    ap.add_argument("--spot", type=float, default=60000.0)
+    ap.add_argument("--expiries", default="1,7,30,90", help="expiry offsets in days")
+    ap.add_argument("--strikes", type=int, default=40, help="strikes per expiry")
+    ap.add_argument("--strike-step", type=float, default=1000.0)
+    ap.add_argument("--seed", type=int, default=7)
+    args = ap.parse_args()
+
+    chain = SyntheticChain(
+        spot=args.spot, expiry_days=[int(d) for d in args.expiries.split(",")],
+        strikes_per_expiry=args.strikes, strike_step=args.strike_step, seed=args.seed,
+    )
+    server = SyntheticDeribitServer(chain, msgs_per_sec=args.rate)
+    await server.start(args.host, args.port)
+    try:
+        await asyncio.Event().wait()
+    finally:
+        await server.stop()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,16 @@
+# dealer_flow/tests/test_bench.py
+from dealer_flow.bench import compare, run
+
+
+def test_compare_scales_by_calibration():
+    baseline = {"calibration_s": 0.010, "benchmarks": {"a": 1.0, "b": 1.0}}
+    rows = {r[0]: r for r in compare({"a": 2.2, "b": 2.6, "c": 1.0}, 0.020, baseline, tolerance=0.25)}
+    assert rows["a"][2] == 2.0 and rows["a"][3] == "ok"           # machine is 2x slower: 2.2 is within 25%
+    assert rows["b"][3] == "REGRESSION"
+    assert rows["c"][3] == "new"
+
+
+def test_pure_benchmarks_run():
+    results, errors = run(["gamma_flip", "roll_up"], repeats=2, min_time=0.01)
+    assert not errors and set(results) == {"gamma_flip_200", "roll_up_5000"}
+    assert all(t > 0 for t in results.values())
@@ -0,0 +1,110 @@
+# dealer_flow/tests/test_ch_spill.py
+import asyncio
+import os
+
+import pytest
+
+from dealer_flow.ch_spill import SpillQueue, insert_or_bisect, is_unavailable
+
+
+def test_spill_roundtrip_resume_and_torn_tail(tmp_path):
+    q = SpillQueue(str(tmp_path))
+    q.append([b"a", b"bb"])
+    q.append([b"ccc"])
+    name = q.segments()[0]
+
+    chunks = list(q.iter_chunks(name, max_payloads=2))
+    assert [p for _, c in chunks for p in c] == [b"a", b"bb", b"ccc"]
+
+    q.mark(name, chunks[0][0])  # first chunk inserted, then crash
+    with open(tmp_path / name, "ab") as f:
+        f.write(b"\x05\x00\x00\x00\x00\x00")  # torn header + partial record
+    reopened = SpillQueue(str(tmp_path))
+    assert [c for _, c in reopened.iter_chunks(name)] == [[b"ccc"]]
+
+    reopened.remove(name)
+    assert not reopened and reopened.backlog_bytes() == 0
+
+
+def test_bisect_isolates_rejected_payloads_and_stops_on_outage():
+    from clickhouse_driver.errors import NetworkError, ServerException
+
+    inserted, rejected = [], []
+
+    async def insert(part):
+        if b"bad" in part:
+            raise ServerException("Cannot parse input", code=27)
+        if b"down" in part:
+            raise NetworkError("Connection refused")
+        inserted.extend(part)
+
+    async def reject(part, exc):
+        rejected.extend(part)
+
+    left = asyncio.run(insert_or_bisect(insert, [b"a", b"b", b"bad", b"c", b"d"], reject))
+    assert left == [] and rejected == [b"bad"] and sorted(inserted) == [b"a", b"b", b"c", b"d"]
+
+    inserted.clear()
+    left = asyncio.run(insert_or_bisect(insert, [b"e", b"bad", b"down", b"f"], reject))
+    assert left == [b"down", b"f"] and inserted == [b"e"] and rejected == [b"bad", b"bad"]
+    assert is_unavailable(ServerException("Too many parts", code=252)) and not is_unavailable(ValueError("x"))
+
+
+def test_quarantine_moves_segment_out_of_the_queue(tmp_path):
+    q = SpillQueue(str(tmp_path / "t"))
+    q.append([b"a"])
+    name = q.segments()[0]
+    q.mark(name, 0)
+    path = q.quarantine(name, str(tmp_path / "quarantine"))
+    assert not q and (tmp_path / "quarantine" / name).exists() and path.endswith(name)
+
+
+class _Stream:
+    """One XREADGROUP delivery, then shutdown; records the XACKs."""
+
+    def __init__(self, entries, shutdown: asyncio.Event):
+        self.entries, self.shutdown, self.acked = entries, shutdown, []
+
+    async def xgroup_create(self, **kwargs):
+        pass
+
+    async def xpending(self, stream, group):
+        return {"pending": 0}
+
+    async def xreadgroup(self, groupname, consumername, streams, count, block):
+        entries, self.entries = self.entries, []
+        if not entries:
+            self.shutdown.set()
+            return []
+        return [(list(streams)[0].encode(), entries)]
+
+    async def xack(self, stream, group, *ids):
+        self.acked.extend(ids)
+
+
+class _Client:
+    def __init__(self):
+        self.inserts = 0
+
+    def execute(self, *args, **kwargs):
+        self.inserts += 1
+
+
+def test_batch_parsing_to_no_rows_is_acked_without_insert_or_spill(tmp_path, monkeypatch):
+    try:
+        from dealer_flow import clickhouse_writer as chw
+    except TypeError:  # aioredis 2.0 does not import on Python >= 3.11; the project pins 3.9
+        pytest.skip("aioredis needs Python < 3.11")
+    monkeypatch.setattr(chw.settings, "ch_spill_dir", str(tmp_path))
+
+    async def run():
+        shutdown, client = asyncio.Event(), _Client()
+        redis = _Stream([(b"1-0", {b"d": b'{"ts": 1.0, "summary_data": []}'})], shutdown)
+        pool = chw.ClickHousePool(1, "t", clients=[client])
+        await asyncio.wait_for(chw.stream_consumer_task(
+            redis, pool, "s", "summaries", chw.SUMMARY_COLUMNS, chw.parse_book_summary_message, shutdown), 5.0)
+        return redis.acked, client.inserts
+
+    acked, inserts = asyncio.run(run())
+    assert acked == [b"1-0"] and inserts == 0
+    assert not SpillQueue(os.path.join(str(tmp_path), "summaries"))
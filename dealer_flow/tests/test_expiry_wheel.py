@@ -0,0 +1,36 @@
+# dealer_flow/tests/test_expiry_wheel.py
+from dealer_flow.expiry_wheel import ExpiryWheel
+from dealer_flow.tick_schema import expiry_ts
+
+T0 = 1_782_460_800.0  # 2026-06-26 08:00 UTC
+
+
+def test_evicts_at_settlement_and_after_idle():
+    wheel = ExpiryWheel(idle_seconds=900, resolution=60, slots=16)  # 16 minutes per rotation
+    front, back = "BTC-26JUN26-100000-C", "BTC-25SEP26-100000-C"
+    assert expiry_ts(front) == T0
+    now = T0 - 3600
+    assert wheel.touch(front, expiry_ts(front), now) and wheel.touch(back, expiry_ts(back), now)
+    wheel.touch("BTC-25SEP26-90000-P", expiry_ts(back), now)
+
+    gone = []
+    for step in range(1, 60):  # the calls keep ticking, the put goes quiet
+        now = T0 - 3600 + step * 60
+        wheel.touch(front, expiry_ts(front), now)
+        wheel.touch(back, expiry_ts(back), now)
+        gone += wheel.advance(now)
+    assert gone == ["BTC-25SEP26-90000-P"] and wheel.evicted["idle"] == 1
+    assert front in wheel and back in wheel
+
+    assert wheel.advance(T0 + 30) == []             # settlement bucket not closed yet
+    assert wheel.advance(T0 + 61) == [front]
+    assert not wheel.touch(front, expiry_ts(front), T0 + 62)  # late ticker cannot resurrect it
+    assert wheel.stats() == {"live": 1, "evicted_expired": 1, "evicted_idle": 1}
+
+
+def test_long_gap_visits_every_bucket_once():
+    wheel = ExpiryWheel(resolution=60, slots=8)
+    names = [f"BTC-26JUN26-{k}-C" for k in range(50000, 150000, 1000)]
+    for i, name in enumerate(names):  # deadlines spread over many rotations
+        wheel.touch(name, T0 - 600 * i, T0 - 86400)
+    assert sorted(wheel.advance(T0 + 3600)) == sorted(names) and len(wheel) == 0
@@ -0,0 +1,26 @@
+# dealer_flow/tests/test_exposures.py
+import numpy as np
+import pandas as pd
+from dealer_flow import exposures
+
+
+def test_profile_sums_and_roundtrip():
+    signed = pd.DataFrame({
+        "strike": [100.0, 110.0, 100.0],
+        "gamma": [0.01, -0.02, 0.03],
+        "vanna": [0.1, 0.2, 0.3],
+        "charm": [-0.5, 0.5, 1.0],
+        "volga": [1.0, 2.0, 3.0],
+        "notional_usd": [1e6, 2e6, 1e6],
+    })
+    by_strike = exposures.profile(signed, signed["strike"])
+    assert by_strike[:, 0].tolist() == [100.0, 110.0]
+    assert np.isclose(by_strike[:, 1].sum(), (signed["gamma"] * signed["notional_usd"] * 0.01).sum())
+    assert np.isclose(by_strike[0, 1], (0.01 + 0.03) * 1e6 * 0.01)
+
+    by_expiry = exposures.profile(signed, pd.Series([1.0, np.nan, 1.0]))  # unparsable expiry dropped
+    assert by_expiry.shape == (1, 5)
+
+    fields = {k.encode(): v for k, v in exposures.encode(1.0, 100.0, by_strike, by_expiry).items()}
+    header, matrix = exposures.decode(fields, "strike")
+    assert header["strike"]["rows"] == 2 and np.array_equal(matrix, by_strike)
@@ -0,0 +1,14 @@
+# dealer_flow/tests/test_feed_capture.py
+from dealer_flow.feed_capture import FrameCaptureWriter, iter_frames, read_index
+
+
+def test_capture_roundtrip_with_rotation(tmp_path):
+    w = FrameCaptureWriter(str(tmp_path), rotate_bytes=200)
+    frames = [(1000.0 + i, b'{"method":"subscription","n":%d}' % i) for i in range(20)]
+    for ts, f in frames:
+        w.append(ts, f)
+    w.close()
+
+    assert len(read_index(str(tmp_path))) > 1
+    assert list(iter_frames(str(tmp_path))) == frames
+    assert [ts for ts, _ in iter_frames(str(tmp_path), 1005.0, 1009.0)] == [1005.0, 1006.0, 1007.0, 1008.0, 1009.0]
@@ -0,0 +1,29 @@
+# dealer_flow/tests/test_greek_history.py
+import numpy as np
+import pandas as pd
+
+from dealer_flow import greek_history
+
+
+def test_encode_decode_round_trip():
+    frame = pd.DataFrame({
+        "instrument": ["BTC-26JUN26-100000-C", "BTC-26JUN26-90000-P", "BTC-26JUN26-80000-P"],
+        "gamma": [1e-5, 2e-5, 3e-5], "vanna": [0.1, 0.2, 0.3], "charm": [0.0, 0.0, 0.0], "volga": [1.0, 2.0, 3.0],
+        "notional_usd": [1e6, 2e6, 3e6], "strike": [100000.0, 90000.0, 80000.0],
+        "gamma_deribit": [1.1e-5, np.nan, 3.1e-5], "mark_iv": [55.0, 60.0, 65.0],
+        "expiry_ts": [1_782_460_800.0] * 3, "option_type": [1, 0, 0],
+        "customer_net": [5.0, -2.0, 0.0], "dealer_side_mult": [1, -1, 1],
+    })
+    rec = greek_history.decode(greek_history.encode(1_782_400_000.5, frame))
+    assert rec["instrument"].tolist() == [b"BTC-26JUN26-100000-C", b"BTC-26JUN26-90000-P", b"BTC-26JUN26-80000-P"]
+    assert rec["ts"].tolist() == [1_782_400_000_500] * 3
+    assert rec["strike"].tolist() == [100000.0, 90000.0, 80000.0] and rec["option_type"].tolist() == [1, 0, 0]
+    assert rec["dealer_sign"].tolist() == [1, -1, 1] and rec["expiry"].tolist() == [1_782_460_800] * 3
+    assert np.isnan(rec["gamma_deribit"][1]) and rec["customer_net"].tolist() == [5.0, -2.0, 0.0]
+
+
+def test_missing_columns_fill_nan():
+    frame = pd.DataFrame({"gamma": [1e-5], "vanna": [0.0], "charm": [0.0], "volga": [0.0],
+                          "notional_usd": [1.0], "strike": [1.0], "dealer_side_mult": [-1]})
+    rec = greek_history.decode(greek_history.encode(0.0, frame))
+    assert np.isnan(rec["gamma_deribit"][0]) and np.isnan(rec["mark_iv"][0]) and rec["dealer_sign"][0] == -1
@@ -0,0 +1,25 @@
+# dealer_flow/tests/test_history.py
+import numpy as np
+from dealer_flow.history import lttb, HistoryCache
+
+
+def test_lttb_keeps_endpoints_and_spike():
+    x = np.arange(1000, dtype=np.int64)
+    y = np.sin(x / 50.0)
+    y[437] = 25.0
+    y[600] = np.nan
+    tx, ty = lttb(x, y, 50)
+    assert len(tx) == 50 and tx[0] == 0 and tx[-1] == 999
+    assert 437 in tx and not np.isnan(ty).any()
+    assert np.all(np.diff(tx) > 0)
+
+
+def test_history_cache_lru_and_ttl():
+    c = HistoryCache(maxsize=2, ttl_seconds=10)
+    c.put("a", b"1", now=0)
+    c.put("b", b"2", now=0)
+    assert c.get("a", now=1) == b"1"
+    c.put("c", b"3", now=1)              # evicts b (least recently used)
+    assert c.get("b", now=1) is None
+    assert c.get("a", now=11) is None    # expired
+    assert c.get("c", now=5) == b"3"
@@ -0,0 +1,52 @@
+# dealer_flow/tests/test_metric_rollups.py
+import pytest
+from dealer_flow.metric_rollups import pick_tier, build_query, ensure_rollups, tier_table, tier_view
+
+NOW = 1_750_000_000.0
+
+
+def test_pick_tier_coarsest_that_fits():
+    assert pick_tier(NOW - 30 * 86400, NOW, now=NOW) == "1m"           # 30d / 2000 pts ≈ 21 min buckets
+    assert pick_tier(NOW - 30 * 86400, NOW, resolution_s=3600, now=NOW) == "1h"
+    assert pick_tier(NOW - 600, NOW, resolution_s=5, now=NOW) == "1s"
+    assert pick_tier(NOW - 600, NOW, resolution_s=0.5, now=NOW) == "raw"
+
+
+def test_pick_tier_skips_expired_tiers():
+    assert pick_tier(NOW - 30 * 86400, NOW, resolution_s=10, now=NOW) == "raw"   # 1s tier TTL is 14d
+    assert pick_tier(NOW - 500 * 86400, NOW, resolution_s=120, now=NOW) == "raw"
+    assert pick_tier(NOW - 500 * 86400, NOW, resolution_s=7200, now=NOW) == "1h"
+
+
+def test_build_query_rejects_unknown_metric():
+    assert "argMaxMerge(NGI_last)" in build_query("1m", "db", 300, ("NGI",))
+    with pytest.raises(ValueError):
+        build_query("1m", "db", 300, ("NGI; DROP TABLE x",))
+
+
+class _Client:
+    """Records statements; answers EXISTS from `present` and the newest-bucket query from `newest`."""
+
+    def __init__(self, present, newest):
+        self.present, self.newest, self.sql = present, newest, []
+
+    def execute(self, sql):
+        self.sql.append(sql)
+        if sql.startswith("EXISTS TABLE"):
+            return [(int(sql.split(".", 1)[1] in self.present),)]
+        if "countMerge(n)" in sql:
+            return self.newest
+        return []
+
+
+def test_ensure_rollups_backfills_only_what_a_tier_missed():
+    present = {tier_table("1s"), tier_view("1s"), tier_table("1m"), tier_table("1h")}  # 1m / 1h views dropped
+    client = _Client(present, newest=[(1_750_000_000, 42)])
+    assert ensure_rollups(client, "db") == ["1m", "1h"]
+    inserts = [q for q in client.sql if q.startswith("INSERT")]
+    assert len(inserts) == 2 and all(q.startswith("INSERT INTO db.dealer_flow_metrics_v1_1") for q in inserts)
+    assert all("ts >= toDateTime64(1750000000, 3, 'UTC') ORDER BY ts OFFSET 42 ROWS" in q for q in inserts)
+
+    fresh = _Client(set(), newest=[])
+    assert ensure_rollups(fresh, "db") == ["1s", "1m", "1h"]
+    assert all("FROM db.dealer_flow_metrics_v1\n" in q for q in fresh.sql if q.startswith("INSERT"))
@@ -0,0 +1,52 @@
+# dealer_flow/tests/test_parquet_export.py
+import numpy as np
+import pytest
+
+from dealer_flow.parquet_export import DATASETS, clickhouse_query, split_partitions, currency_of
+
+
+def test_split_partitions_by_currency_and_utc_day():
+    day = 86_400_000
+    ts = np.array([0, day - 1, day, day + 5, 10], dtype="i8")
+    cur = currency_of(np.array(["BTC-1JAN70-1-C", "BTC-1JAN70-1-C", "ETH-2JAN70-1-P", "BTC-2JAN70-1-P", None],
+                               dtype=object), "BTC")
+    parts = {k: list(v) for k, v in split_partitions(ts, cur)}
+    assert parts == {
+        ("BTC", "1970-01-01"): [0, 1, 4],
+        ("BTC", "1970-01-02"): [3],
+        ("ETH", "1970-01-02"): [2],
+    }
+
+
+def test_partitioned_writer_round_trip(tmp_path):
+    pytest.importorskip("pyarrow")
+    import pyarrow.dataset as ds
+    from dealer_flow.parquet_export import PartitionedParquetWriter
+
+    day = 86_400_000
+    writer = PartitionedParquetWriter(str(tmp_path), "metrics", row_group_rows=2, max_open_files=1)
+    cols = {
+        "ts": np.array([0, 1, 2, day], dtype="i8"), "price": np.array([1.0, 2.0, 3.0, 4.0]),
+        "msg_rate": np.array([5, 6, 7, 8], dtype="i4"), "NGI": np.array([0.1, np.nan, 0.3, 0.4]),
+        "VSS": np.zeros(4), "CHL_24h": np.zeros(4), "VOLG": np.zeros(4), "flip_pct": np.zeros(4),
+        "HPP": np.zeros(4), "scenario": np.array(["Pin", "Pin", "Squeeze", "Pin"], dtype=object),
+    }
+    writer.add(cols, np.array(["BTC"] * 4, dtype=object))
+    stats = writer.close()
+    assert stats["rows"] == 4 and stats["files"] == 2
+
+    table = ds.dataset(str(tmp_path / "metrics"), format="parquet", partitioning="hive").to_table()
+    df = table.to_pandas().sort_values("price").reset_index(drop=True)
+    assert df["price"].tolist() == [1.0, 2.0, 3.0, 4.0] and df["msg_rate"].tolist() == [5, 6, 7, 8]
+    assert np.isnan(df["NGI"][1]) and df["scenario"].astype(str).tolist() == ["Pin", "Pin", "Squeeze", "Pin"]
+    assert df["date"].astype(str).tolist() == ["1970-01-01"] * 3 + ["1970-01-02"]
+    assert str(table.schema.field("ts").type) == "timestamp[ms, tz=UTC]"
+
+
+def test_clickhouse_greeks_query_maps_greek_history_columns():
+    sql = clickhouse_query("greeks")
+    select = sql[len("SELECT "):sql.index(" FROM ")].split(", ")
+    assert len(select) == len(DATASETS["greeks"][1]) and " FROM dealer_instrument_greeks_v1 " in sql
+    assert select[:5] == ["toUnixTimestamp64Milli(ts)", "instrument", "strike", "toUnixTimestamp(expiry)", "option_type"]
+    assert select[6:9] == ["nan"] * 3  # open_interest, mark_price, index_price are not stored
+    assert clickhouse_query("metrics").startswith("SELECT toUnixTimestamp64Milli(ts), price, msg_rate, ")
@@ -0,0 +1,32 @@
+# dealer_flow/tests/test_processor.py
+import orjson
+import pytest
+
+from dealer_flow.expiry_wheel import ExpiryWheel
+from dealer_flow.tick_schema import InstrumentRegistry
+from dealer_flow.trade_flow import TradeFlowBook
+
+try:
+    from dealer_flow import processor as proc
+except TypeError:  # aioredis 2.0 does not import on Python >= 3.11; the project pins 3.9
+    pytest.skip("aioredis needs Python < 3.11", allow_module_level=True)
+
+T0 = 1_780_000_000.0  # 2026-05-28, before the instruments' expiries
+
+
+def _ticker(name: str) -> bytes:
+    return orjson.dumps({"params": {"channel": f"ticker.{name}.100ms", "data": {
+        "instrument_name": name, "timestamp": int(T0 * 1000), "mark_price": 0.05, "mark_iv": 50.0,
+        "open_interest": 10.0, "index_price": 100000.0}}})
+
+
+def test_json_ticker_keeps_option_type(monkeypatch):
+    monkeypatch.setattr(proc, "spot", [100000.0])
+    monkeypatch.setattr(proc, "greek_store", {})
+    monkeypatch.setattr(proc, "lifecycle", ExpiryWheel())
+    monkeypatch.setattr(proc, "instrument_registry", InstrumentRegistry())
+    monkeypatch.setattr(proc, "trade_flow", TradeFlowBook())
+    for name in ("BTC-26JUN26-90000-P", "BTC-26JUN26-110000-C"):
+        proc.handle_raw_message(_ticker(name), now=T0)
+    assert proc.greek_store["BTC-26JUN26-90000-P"]["option_type"] == 0
+    assert proc.greek_store["BTC-26JUN26-110000-C"]["option_type"] == 1
@@ -0,0 +1,20 @@
+# dealer_flow/tests/test_push.py
+import asyncio
+from dealer_flow.push import Broadcaster, parse_fields, FORMAT_TEXT, FORMAT_SSE
+
+
+def test_conflation_and_shared_render():
+    async def run():
+        b = Broadcaster()
+        fast = b.subscribe(parse_fields("NGI"))
+        slow = b.subscribe(parse_fields(" NGI ,"))
+        for i in range(3):
+            b.publish(f"{i}-0", b'{"NGI": %d, "HPP": 0}' % i)
+        f1, f2 = await fast.next_frame(), await slow.next_frame()
+        assert f1 is f2 and f1.entry_id == "2-0"
+        assert slow.dropped == 2
+        text = f1.render(fast.fields, FORMAT_TEXT)
+        assert text == '{"NGI":2}' and f1.render(slow.fields, FORMAT_TEXT) is text  # serialized once
+        assert f1.render(None, FORMAT_SSE) == b'id: 2-0\ndata: {"NGI": 2, "HPP": 0}\n\n'
+
+    asyncio.run(run())
@@ -0,0 +1,34 @@
+# dealer_flow/tests/test_quantile_sketch.py
+import numpy as np
+from dealer_flow.quantile_sketch import AdaptiveThresholds, DecayingQuantileSketch
+
+
+def test_quantiles_within_relative_error_and_decay():
+    rng = np.random.default_rng(0)
+    xs = rng.normal(0, 1e6, 20000)
+    sk = DecayingQuantileSketch(rel_err=0.01, half_life_seconds=1e9)
+    for i, x in enumerate(xs):
+        sk.add(x, float(i))
+    for q in (0.05, 0.25, 0.5, 0.75, 0.95):
+        exact = np.quantile(xs, q)
+        assert abs(sk.quantile(q) - exact) <= 0.02 * abs(exact) + 2e4  # bucket error + rank error around the median
+
+    decayed = DecayingQuantileSketch(half_life_seconds=10.0)
+    for i in range(1000):
+        decayed.add(1.0, float(i))          # old regime
+    for i in range(1000, 1200):
+        decayed.add(100.0, float(i))        # last 20 half-lives
+    assert abs(decayed.quantile(0.5) - 100.0) < 2.0
+    assert abs(decayed.effective_count(1200.0) - 10 / np.log(2)) < 2.0
+
+
+def test_iqr_scaled_weights():
+    th = AdaptiveThresholds(refresh_seconds=1e9, min_count=100)
+    rng = np.random.default_rng(1)
+    for i in range(2000):
+        th.observe(float(i), {"NGI": rng.normal(0, 1000), "VSS": rng.normal(0, 100), "CHL_24h": rng.normal(0, 1000)},
+                   adv_usd=1000.0)
+    out = th.refresh(2000.0)
+    assert 0.9 < out["alpha"] < 1.1       # VSS spread 10× smaller → 10× the default weight
+    assert 0.09 < out["beta"] < 0.11
+    assert 1.1 < out["material_ratio"] < 1.5  # 80th pct of |N(0, 1)| ≈ 1.28
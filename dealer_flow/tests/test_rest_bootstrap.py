@@ -0,0 +1,113 @@
+# dealer_flow/tests/test_rest_bootstrap.py
+import asyncio
+import time
+
+import orjson
+import pytest
+
+from dealer_flow import rest_bootstrap
+from dealer_flow.config import settings
+from dealer_flow.synthetic_feed import SyntheticChain, SyntheticDeribitServer
+
+
+def test_snapshot_whole_chain_from_synthetic_rest(monkeypatch):
+    async def run():
+        chain = SyntheticChain(expiry_days=(7, 30), strikes_per_expiry=6)
+        server = SyntheticDeribitServer(chain)
+        port = await server.start("127.0.0.1", 0)
+        monkeypatch.setattr(settings, "deribit_rest", f"http://127.0.0.1:{port}/api/v2")
+        try:
+            limiter = rest_bootstrap.RateLimiter(1000.0)
+            async with rest_bootstrap.new_session(4) as http:
+                price = await rest_bootstrap.fetch_index(http, limiter, "BTC")
+                summaries = await rest_bootstrap.fetch_book_summaries(http, limiter, "BTC")
+                names = rest_bootstrap.rank_by_oi(summaries, exclude=chain.names[:3])
+                seen = {}
+
+                async def on_ticker(name, data):
+                    seen[name] = data
+                n = await rest_bootstrap.fetch_tickers(http, limiter, names + ["BTC-1JAN20-1-C"], 4, on_ticker)
+            return chain, price, summaries, names, seen, n, server.rest_requests
+        finally:
+            await server.stop()
+
+    chain, price, summaries, names, seen, n, requests = asyncio.run(run())
+    assert price == chain.spot and len(summaries) == len(chain)
+    assert len(names) == len(chain) - 3 and not set(chain.names[:3]) & set(names)
+    oi = {s["instrument_name"]: s["open_interest"] for s in summaries}
+    assert [oi[n] for n in names] == sorted(oi[n] for n in names)[::-1]  # highest OI first
+    assert n == len(names) == len(seen)  # the unknown contract failed and was skipped
+    assert seen[names[0]]["greeks"]["gamma"] > 0 and requests == 2 + len(names) + 1
+
+    # The collector's bootstrap publishes the summary; the subscription manager must rank it at
+    # once rather than sit out dynamic_subscription_refresh_interval_seconds.
+    try:
+        from dealer_flow import deribit_ws
+    except TypeError:  # aioredis 2.0 does not import on Python >= 3.11; the project pins 3.9
+        pytest.skip("aioredis needs Python < 3.11")
+    monkeypatch.setattr(settings, "dynamic_subscription_refresh_interval_seconds", 60)
+    monkeypatch.setattr(settings, "deribit_max_auth_instruments", 5)
+    collector, ws, waited = asyncio.run(_bootstrap_then_manage(deribit_ws, chain, monkeypatch))
+    top = {s["instrument_name"] for s in sorted(summaries, key=lambda s: s["open_interest"])[-5:]}
+    assert collector.active_ticker_subscriptions == top and waited < 5.0
+    assert [m["method"] for m in ws.sent] == ["public/subscribe"]
+    assert len(collector.redis.entries) == 2 + len(chain)  # index, summary, a ticker per contract
+
+
+class _Redis:
+    def __init__(self):
+        self.entries, self.hashes, self.values = [], {}, {}
+
+    async def xadd(self, stream, fields):
+        self.entries.append((stream, fields))
+
+    async def hset(self, key, name, value):
+        self.hashes.setdefault(key, {})[name.encode()] = str(value).encode()
+
+    async def hgetall(self, key):
+        return dict(self.hashes.get(key, {}))
+
+    async def set(self, key, value):
+        self.values[key] = value
+
+
+class _Ws:
+    closed = False
+
+    def __init__(self):
+        self.sent = []
+
+    async def send(self, raw):
+        self.sent.append(orjson.loads(raw))
+
+
+async def _bootstrap_then_manage(deribit_ws, chain, monkeypatch):
+    server = SyntheticDeribitServer(chain)
+    port = await server.start("127.0.0.1", 0)
+    monkeypatch.setattr(settings, "deribit_rest", f"http://127.0.0.1:{port}/api/v2")
+    collector = deribit_ws.DeribitCollector(_Redis())
+    try:
+        async with rest_bootstrap.new_session(4) as collector.http:
+            await collector.snapshot_chain(rest_bootstrap.RateLimiter(1000.0))
+    finally:
+        await server.stop()
+    collector.is_authenticated_session, collector.ws = True, _Ws()
+    t0 = time.monotonic()
+    task = collector._start_subscription_manager()
+    while not collector.active_ticker_subscriptions and time.monotonic() - t0 < 5.0:
+        await asyncio.sleep(0.01)
+    waited = time.monotonic() - t0
+    task.cancel()
+    return collector, collector.ws, waited
+
+
+def test_rate_limiter_spaces_requests():
+    async def run():
+        limiter = rest_bootstrap.RateLimiter(50.0, burst=5)
+        loop = asyncio.get_running_loop()
+        t0 = loop.time()
+        for _ in range(15):
+            await limiter.acquire()
+        return loop.time() - t0
+
+    assert asyncio.run(run()) >= 10 / 50.0 * 0.9  # 5 from the burst, 10 at 50/s
@@ -0,0 +1,69 @@
+# dealer_flow/tests/test_rest_service.py
+import asyncio
+import time
+
+import pytest
+from fastapi.testclient import TestClient
+
+try:
+    from dealer_flow import rest_service
+    from dealer_flow.redis_stream import STREAM_KEY_METRICS
+except TypeError:  # aioredis 2.0 does not import on Python >= 3.11; the project pins 3.9
+    pytest.skip("aioredis needs Python < 3.11", allow_module_level=True)
+
+
+class _MetricsStream:
+    """Just enough of the Redis client for tail_stream: XREVRANGE plus a polling blocking XREAD."""
+
+    def __init__(self):
+        self.entries = []
+
+    def add(self, entry_id: bytes, payload: bytes):
+        self.entries.append((entry_id, {b"d": payload}))
+
+    async def xrevrange(self, stream, count=1):
+        return self.entries[-count:][::-1]
+
+    async def xread(self, streams, count=100, block=0):
+        last_id = streams[STREAM_KEY_METRICS]
+        deadline = time.monotonic() + block / 1000.0
+        while time.monotonic() < deadline:
+            newer = [e for e in self.entries if last_id == b"$" or e[0] > last_id]
+            if newer:
+                return [(STREAM_KEY_METRICS.encode(), newer[:count])]
+            await asyncio.sleep(0.01)
+        return []
+
+
+def _wait_for_entry(entry_id: bytes):
+    deadline = time.monotonic() + 2.0
+    while rest_service.metrics_cache.entry_id != entry_id:
+        assert time.monotonic() < deadline, "tail_stream never delivered the entry"
+        time.sleep(0.01)
+
+
+def test_snapshot_etag_304_until_a_new_entry(monkeypatch):
+    stream = _MetricsStream()
+    stream.add(b"1-0", b'{"NGI": 1.0}')
+
+    async def fake_redis():
+        return stream
+
+    monkeypatch.setattr(rest_service, "get_shared_redis", fake_redis)
+    monkeypatch.setattr(rest_service, "local_bus", None)
+    monkeypatch.setattr(rest_service, "metrics_cache", rest_service.MetricsCache())
+    with TestClient(rest_service.app) as client:
+        _wait_for_entry(b"1-0")
+        first = client.get("/snapshot")
+        assert first.status_code == 200 and first.json() == {"NGI": 1.0}
+        etag = first.headers["etag"]
+
+        cached = client.get("/snapshot", headers={"If-None-Match": etag})
+        assert cached.status_code == 304 and cached.headers["etag"] == etag and not cached.content
+        assert client.get("/snapshot", headers={"If-None-Match": f'W/"0-0", {etag}'}).status_code == 304
+
+        stream.add(b"2-0", b'{"NGI": 2.0}')
+        _wait_for_entry(b"2-0")
+        fresh = client.get("/snapshot", headers={"If-None-Match": etag})
+        assert fresh.status_code == 200 and fresh.json() == {"NGI": 2.0}
+        assert fresh.headers["etag"] != etag
@@ -0,0 +1,72 @@
+# dealer_flow/tests/test_shm_ring.py
+import asyncio
+import uuid
+from dealer_flow.shm_ring import ShmRingWriter, ShmRingReader, RingRawTransport
+from dealer_flow.tick_schema import TickEncoder, KIND_TRADE
+
+
+def test_ring_zero_copy_view_and_overrun():
+    name = f"dfr_test_{uuid.uuid4().hex[:8]}"
+    w = ShmRingWriter.create(name, n_slots=8, slot_size=128)
+    try:
+        r = ShmRingReader.attach(name)
+        enc = TickEncoder()
+        for px in (100.0, 101.0, 102.0):
+            w.write(enc.encode("deribit_price_index.btc_usd", {"price": px, "timestamp": 1})[0])
+
+        first, view = r.poll()
+        assert first == 0 and list(view["rec"]["index_price"]) == [100.0, 101.0, 102.0]
+        assert r.release(first, view) and r.lag() == 0
+
+        for i in range(20):
+            w.write(b"x" * 10, b"d")
+        assert r.lag() == 20
+        assert r.poll() is None  # 'latest' policy jumps to the head
+        assert r.stats["overruns"] == 1 and r.lag() == 0
+        r.close()
+    finally:
+        w.close()
+        w.unlink()
+
+
+def test_transport_splits_multi_trade_entries_into_slots():
+    name = f"dfr_test_{uuid.uuid4().hex[:8]}"
+    w = ShmRingWriter.create(name, n_slots=16, slot_size=128)
+    try:
+        r = ShmRingReader.attach(name)
+        transport = RingRawTransport(None, w, "dealer_raw")
+        trades = [{"instrument_name": "BTC-26JUN26-100000-C", "amount": a, "direction": d, "timestamp": 1, "price": 0.1}
+                  for a, d in ((1.0, "buy"), (2.0, "sell"), (3.0, "buy"))]
+        records, _ = TickEncoder().encode_trades(trades)
+        asyncio.run(transport.xadd("dealer_raw", {"b": records}))
+
+        first, view = r.poll()
+        assert transport.dropped_oversize == 0 and len(view) == 3
+        assert list(view["rec"]["kind"]) == [KIND_TRADE] * 3 and list(view["rec"]["open_interest"]) == [1.0, -2.0, 3.0]
+        r.close()
+    finally:
+        w.close()
+        w.unlink()
+
+
+def test_take_drops_slots_overwritten_during_read():
+    name = f"dfr_test_{uuid.uuid4().hex[:8]}"
+    w = ShmRingWriter.create(name, n_slots=8, slot_size=128)
+    try:
+        r = ShmRingReader.attach(name)
+        enc = TickEncoder()
+        for px in (100.0, 101.0, 102.0, 103.0):
+            w.write(enc.encode("deribit_price_index.btc_usd", {"price": px, "timestamp": 1})[0])
+        first, view = r.poll()
+        for px in range(7):  # producer laps slots 0-2 while the consumer still holds the view
+            w.write(enc.encode("deribit_price_index.btc_usd", {"price": 200.0 + px, "timestamp": 1})[0])
+        rows = r.take(first, view)
+        assert r.stats["torn"] == 3 and list(rows["rec"]["index_price"]) == [103.0] and r.cursor == 4
+
+        first, view = r.poll()
+        rows = r.take(first, view)
+        assert first == 4 and list(rows["rec"]["index_price"]) == [200.0, 201.0, 202.0, 203.0]
+        r.close()
+    finally:
+        w.close()
+        w.unlink()
@@ -0,0 +1,63 @@
+# dealer_flow/tests/test_spot_ws.py
+import numpy as np
+from dealer_flow.spot_ws import (
+    L2Book, BinanceDepthSync, RollingVolume, Venue, aggregate, apply_deribit_book, BID, ASK,
+)
+
+
+def test_deribit_book_depth_and_gap():
+    book = L2Book()
+    apply_deribit_book(book, {"type": "snapshot", "change_id": 10,
+                              "bids": [["new", 100000.0, 5e5], ["new", 99500.0, 1e6], ["new", 98000.0, 7e6]],
+                              "asks": [["new", 100010.0, 2e5], ["new", 100900.0, 3e5], ["new", 102000.0, 9e6]]})
+    mid, bid_usd, ask_usd = book.depth(1.0)
+    assert abs(mid / 100005.0 - 1) < 1e-4
+    assert bid_usd == 1.5e6 and ask_usd == 5e5  # 98000 / 102000 are beyond ±1%
+
+    assert apply_deribit_book(book, {"type": "change", "change_id": 11, "prev_change_id": 10,
+                                     "bids": [["delete", 100000.0, 0.0]], "asks": [["change", 100010.0, 1e5]]})
+    assert book.depth(1.0)[1:] == (1e6, 1e5)  # mid now 99755: 100900 is beyond +1%
+    assert not apply_deribit_book(book, {"type": "change", "change_id": 13, "prev_change_id": 12, "bids": [], "asks": []})
+    assert book.depth(1.0) is None and book.resyncs == 1
+    assert apply_deribit_book(book, {"type": "change", "change_id": 14, "prev_change_id": 13, "bids": [], "asks": []})
+    assert book.depth(1.0) is None  # ignored until the resubscribe snapshot
+
+
+def test_recentre_keeps_depth():
+    book = L2Book(window_pct=2.0)
+    book.reset([(99.9, 10.0)], [(100.1, 10.0)], 1)
+    for price in np.arange(100.25, 101.75, 0.25):  # market walks up past the window's central half
+        book.update(ASK, price - 0.15, 0.0)
+        book.update(BID, price - 0.1, 10.0)
+        book.update(ASK, price + 0.1, 10.0)
+        book.depth(1.0)  # once per publish
+    mid, bid_usd, ask_usd = book.depth(1.0)
+    assert abs(mid / 101.5 - 1) < 1e-4 and book.anchor > 101
+    assert bid_usd == 40.0 and ask_usd == 10.0
+
+
+def test_binance_sync_buffers_until_snapshot():
+    book = L2Book()
+    sync = BinanceDepthSync(book)
+    assert not sync.on_event({"U": 95, "u": 99, "b": [["100000", "1"]], "a": []})    # no snapshot yet
+    assert not sync.on_event({"U": 100, "u": 105, "b": [["99990", "2"]], "a": []})
+    sync.on_snapshot({"lastUpdateId": 101, "bids": [["100000", "0.5"]], "asks": [["100010", "1"]]})
+    assert book.synced and book.seq == 105 and book.levels[BID] == {100000.0: 50000.0, 99990.0: 199980.0}
+    assert sync.on_event({"U": 106, "u": 107, "b": [], "a": [["100010", "0"]]})
+    assert book.levels[ASK] == {}
+    assert not sync.on_event({"U": 110, "u": 111, "b": [], "a": []}) and book.resyncs == 1
+
+
+def test_rolling_adv_extrapolates_then_rolls():
+    vol = RollingVolume(min_coverage=300)
+    t0 = 1_780_000_000.0
+    vol.add(t0, 1e6)
+    assert vol.adv(t0 + 100) is None
+    vol.add(t0 + 3600, 1e6)
+    assert vol.adv(t0 + 7200) == 2e6 * 12                  # 2h seen → ×12
+    assert vol.adv(t0 + 86400 + 1800) == 1e6                 # first trade fell out of the window
+
+    venue = Venue("deribit")
+    venue.volume = vol
+    out = aggregate([venue], t0 + 86400 + 1800, 1.0)
+    assert out["adv_usd"] == 1e6 and out["depth_bid_usd"] is None
@@ -0,0 +1,24 @@
+# dealer_flow/tests/test_supervisor.py
+import os
+import pytest
+from dealer_flow.supervisor import parse_cpu_map, plan_affinity, proc_usage, restart_delay
+
+
+def test_pinned_services_get_dedicated_cores():
+    cpu_map = parse_cpu_map("processor=2; collector=3 ;writer=4-5,7")
+    assert cpu_map == {"processor": {2}, "collector": {3}, "writer": {4, 5, 7}}
+    plan = plan_affinity(["collector", "processor", "writer", "api"], cpu_map, set(range(8)))
+    assert plan["processor"] == {2} and plan["api"] == {0, 1, 6}
+    assert plan_affinity(["api"], {"processor": {0, 1}}, {0, 1})["api"] == {0, 1}  # nothing left → float
+    with pytest.raises(ValueError):
+        plan_affinity(["processor"], {"processor": {9}}, {0, 1})
+    with pytest.raises(ValueError):
+        parse_cpu_map("shard7=1")
+
+
+def test_backoff_and_proc_usage():
+    assert [restart_delay(n, 30.0) for n in range(1, 8)] == [1, 2, 4, 8, 16, 30, 30]
+    usage = proc_usage(os.getpid())
+    if usage is not None:  # Linux /proc
+        cpu_s, rss = usage
+        assert cpu_s > 0 and rss > 10 * 2**20
@@ -0,0 +1,29 @@
+# dealer_flow/tests/test_synthetic_feed.py
+import asyncio
+import aiohttp, orjson
+from dealer_flow.synthetic_feed import SyntheticChain, SyntheticDeribitServer
+
+
+def test_subscribe_and_receive_ticker():
+    async def run():
+        chain = SyntheticChain(expiry_days=(7,), strikes_per_expiry=4)
+        server = SyntheticDeribitServer(chain, msgs_per_sec=500)
+        port = await server.start("127.0.0.1", 0)
+        try:
+            async with aiohttp.ClientSession() as sess:
+                async with sess.ws_connect(f"http://127.0.0.1:{port}/ws/api/v2") as ws:
+                    channel = f"ticker.{chain.names[0]}.100ms"
+                    await ws.send_str(orjson.dumps({"jsonrpc": "2.0", "id": 1, "method": "public/subscribe",
+                                                    "params": {"channels": [channel]}}).decode())
+                    seen = []
+                    while len(seen) < 2:
+                        msg = orjson.loads((await asyncio.wait_for(ws.receive(), 2.0)).data)
+                        seen.append(msg)
+                    return seen
+        finally:
+            await server.stop()
+
+    ack, tick = asyncio.run(run())
+    assert ack["id"] == 1 and ack["result"]
+    data = tick["params"]["data"]
+    assert data["greeks"]["gamma"] > 0 and data["open_interest"] >= 0
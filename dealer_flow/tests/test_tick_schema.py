@@ -0,0 +1,105 @@
+# dealer_flow/tests/test_tick_schema.py
+import math
+from dealer_flow.tick_schema import TickEncoder, decode, KIND_TICKER, KIND_INDEX
+
+
+def test_encode_decode_roundtrip():
+    enc = TickEncoder()
+    idx, new = enc.encode("deribit_price_index.btc_usd", {"price": 65000.0, "timestamp": 1})
+    assert new is None
+    tick, new = enc.encode("ticker.BTC-27JUN25-60000-P.100ms", {
+        "instrument_name": "BTC-27JUN25-60000-P", "timestamp": 2, "mark_iv": 55.0,
+        "open_interest": 12.5, "mark_price": 0.01, "greeks": {"gamma": 0.00002},
+    })
+    assert new == ("BTC-27JUN25-60000-P", 0)
+
+    recs = decode([idx, tick])
+    assert list(recs["kind"]) == [KIND_INDEX, KIND_TICKER]
+    assert recs["index_price"][0] == 65000.0
+    t = recs[1]
+    assert t["strike"] == 60000.0 and t["option_type"] == 0 and t["open_interest"] == 12.5
+    assert t["gamma"] == 0.00002 and math.isnan(t["vanna"])
+    assert enc.registry.name(int(t["inst_id"])) == "BTC-27JUN25-60000-P"
+
+
+class _SharedRegistry:
+    """Redis stand-in: eval() does what REGISTER_SCRIPT does, against one shared hash."""
+
+    def __init__(self):
+        self.hash = {}
+        self.next_id = None
+
+    async def eval(self, script, numkeys, key, seq_key, *names):
+        if self.next_id is None:
+            self.next_id = max((int(v) for v in self.hash.values()), default=-1) + 1
+        ids = []
+        for name in names:
+            if name.encode() not in self.hash:
+                self.hash[name.encode()] = str(self.next_id).encode()
+                self.next_id += 1
+            ids.append(int(self.hash[name.encode()]))
+        return ids
+
+    async def hgetall(self, key):
+        return dict(self.hash)
+
+
+def test_register_names_allocates_shared_ids_and_reloads_on_conflict():
+    import asyncio
+    from dealer_flow.tick_schema import InstrumentRegistry, register_names
+
+    redis = _SharedRegistry()
+    redis.hash[b"BTC-27JUN25-60000-P"] = b"0"  # written by an older collector
+    a, b = InstrumentRegistry(), InstrumentRegistry()
+    b.load(redis.hash)
+
+    assert asyncio.run(register_names(redis, a, ["BTC-27JUN25-70000-C", "BTC-27JUN25-70000-C", "BTC-PERPETUAL"])) == 1
+    assert a.ids == {"BTC-27JUN25-70000-C": 1}
+    # b still thinks 1 is free: a local assign would collide, Redis hands out the next id instead.
+    b.assign("BTC-27JUN25-80000-C")
+    assert asyncio.run(register_names(redis, b, ["BTC-27JUN25-90000-C"])) == 1
+    assert b.ids["BTC-27JUN25-90000-C"] == 2
+    assert asyncio.run(register_names(redis, a, ["BTC-27JUN25-90000-C"])) == 1
+    assert a.name(2) == "BTC-27JUN25-90000-C"
+
+    # A stale local entry sharing an id with a Redis allocation forces a full reload.
+    c = InstrumentRegistry()
+    c.load({"BTC-27JUN25-55000-P": 3})
+    redis.hash[b"BTC-27JUN25-55000-P"] = b"4"
+    redis.next_id = 3
+    asyncio.run(register_names(redis, c, ["BTC-27JUN25-65000-P"]))
+    assert c.ids["BTC-27JUN25-65000-P"] == 3 and c.ids["BTC-27JUN25-55000-P"] == 4
+    assert c.name(3) == "BTC-27JUN25-65000-P" and c.name(0) == "BTC-27JUN25-60000-P"
+
+
+class _LocalBus:
+    """single_process.InProcessBus as the shared Redis sees it: HSET and SET, no EVAL."""
+
+    def __init__(self, shared: _SharedRegistry):
+        self.shared = shared
+
+    async def hset(self, key, field, value):
+        self.shared.hash[field.encode()] = str(value).encode()
+
+    async def set(self, key, value):
+        self.shared.next_id = int(value)
+
+
+def test_register_names_fallback_advances_the_shared_sequence():
+    import asyncio
+    from dealer_flow.tick_schema import InstrumentRegistry, register_names
+
+    redis = _SharedRegistry()
+    redis.hash[b"BTC-27JUN25-60000-P"] = b"0"
+    redis.next_id = 1
+    local = InstrumentRegistry()
+    local.load(redis.hash)
+    names = ["BTC-27JUN25-70000-C", "BTC-27JUN25-80000-C"]
+    assert asyncio.run(register_names(_LocalBus(redis), local, names)) == 2
+    assert local.ids["BTC-27JUN25-80000-C"] == 2 and redis.next_id == 3
+
+    # A collector with EVAL on the same Redis allocates past the ids the fallback took.
+    shared = InstrumentRegistry()
+    shared.load(redis.hash)
+    asyncio.run(register_names(redis, shared, ["BTC-27JUN25-90000-C"]))
+    assert shared.ids["BTC-27JUN25-90000-C"] == 3 and shared.name(1) == "BTC-27JUN25-70000-C"
@@ -0,0 +1,30 @@
+# dealer_flow/tests/test_trade_flow.py
+import numpy as np
+import pandas as pd
+from dealer_flow.dealer_net import infer_dealer_net
+from dealer_flow.tick_schema import TickEncoder, decode, KIND_TRADE
+from dealer_flow.trade_flow import TradeFlowBook
+
+
+def test_aggressor_net_reconciled_with_oi():
+    enc = TickEncoder()
+    name = "BTC-27JUN25-60000-P"
+    ticker = lambda oi: enc.encode(f"ticker.{name}.100ms", {"instrument_name": name, "timestamp": 1, "open_interest": oi})[0]
+    trades, new = enc.encode_trades([
+        {"instrument_name": name, "direction": "sell", "amount": 8.0, "price": 0.01, "timestamp": 2},
+        {"instrument_name": name, "direction": "buy", "amount": 2.0, "price": 0.01, "timestamp": 3},
+        {"instrument_name": "BTC-PERPETUAL", "direction": "buy", "amount": 1.0},  # not an option → skipped
+    ])
+    assert new == [(name, 0)]
+    recs = decode([ticker(100.0), trades, ticker(50.0), ticker(4.0)])
+    assert (recs["kind"] == KIND_TRADE).sum() == 2
+
+    book = TradeFlowBook(capacity=1)
+    book.apply(recs[:4])
+    assert book.net[0] == -6.0 * 0.5    # OI halved → half of the customer short closed
+    book.apply(recs[4:])
+    assert book.net[0] == -3.0 * 0.08   # then scaled by 4/50, always within ±OI
+    assert book.stats()["trades"] == 2
+
+    df = pd.DataFrame({"customer_net": book.customer_net(np.array([0, -1, 7]))})
+    assert infer_dealer_net(df)["dealer_side_mult"].tolist() == [-1, 1, 1]
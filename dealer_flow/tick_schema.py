@@ -0,0 +1,246 @@
+# dealer_flow/tick_schema.py
+"""
+Normalized binary tick format shared by collector and processor.
+
+The collector turns each ticker / price-index notification into one fixed-layout record
+(TICK_DTYPE, 94 bytes, little-endian, packed) and XADDs it under field b"b" of dealer_raw.
+The processor concatenates a whole XREADGROUP batch and decodes it with one np.frombuffer.
+
+Instrument names travel once: ids are allocated in Redis by register_names (one Lua script,
+so concurrent collectors / replays never hand out the same id) and kept in the hash
+INSTRUMENT_REGISTRY_KEY (name → id); strike / expiry / option type are parsed once per
+instrument and carried in every record so the processor never splits names on the hot path.
+
+Missing Deribit greeks are encoded as NaN (the JSON path used None).
+
+Option trades (trades.option.<CUR>.* channels) travel as KIND_TRADE records in the same
+layout: open_interest holds the signed amount (+ taker buy, − taker sell), mark_price the
+trade price, mark_iv the trade IV; greeks are NaN. One frame's trades share one XADD.
+"""
+import datetime as dt
+import functools
+import re
+import struct
+import time
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+INSTRUMENT_REGISTRY_KEY = "dealer_instrument_registry"
+INSTRUMENT_REGISTRY_SEQ_KEY = "dealer_instrument_registry:next_id"
+
+# KEYS[1] registry hash, KEYS[2] next-id counter; ARGV names → their ids, allocating missing ones.
+# The counter starts above the largest id already in the hash (registries written before it existed).
+REGISTER_SCRIPT = """
+if redis.call('EXISTS', KEYS[2]) == 0 then
+  local top = -1
+  for _, v in ipairs(redis.call('HVALS', KEYS[1])) do
+    local n = tonumber(v)
+    if n and n > top then top = n end
+  end
+  redis.call('SET', KEYS[2], top + 1)
+end
+local ids = {}
+for i, name in ipairs(ARGV) do
+  local id = redis.call('HGET', KEYS[1], name)
+  if not id then
+    id = redis.call('INCR', KEYS[2]) - 1
+    redis.call('HSET', KEYS[1], name, id)
+  end
+  ids[i] = tonumber(id)
+end
+return ids
+"""
+
+KIND_TICKER = 1
+KIND_INDEX = 2
+KIND_TRADE = 3
+
+TICK_DTYPE = np.dtype([
+    ("kind", "u1"),
+    ("option_type", "u1"),      # 1 call, 0 put (processor convention)
+    ("inst_id", "<u4"),
+    ("ts_ms", "<i8"),           # exchange timestamp, ms
+    ("strike", "<f8"),
+    ("expiry_ts", "<f8"),       # epoch seconds, 08:00 UTC
+    ("mark_iv", "<f8"),         # percent, as Deribit sends it
+    ("open_interest", "<f8"),
+    ("mark_price", "<f8"),
+    ("index_price", "<f8"),
+    ("gamma", "<f8"),
+    ("vanna", "<f8"),
+    ("charm", "<f8"),
+    ("volga", "<f8"),
+])
+_RECORD = struct.Struct("<BBIq10d")
+assert _RECORD.size == TICK_DTYPE.itemsize
+
+_DATE_RE = re.compile(r"(\d{1,2})([A-Z]{3})(\d{2})")
+_NAN = float("nan")
+
+
+def expiry_ts(sym: str) -> float:
+    date_part = sym.split("-")[1]
+    m = _DATE_RE.fullmatch(date_part)
+    if not m: raise ValueError(f"unparsable date {date_part}")
+    day, mon, yy = int(m[1]), m[2], int(m[3])
+    month_num = dt.datetime.strptime(mon, "%b").month
+    dt_exp = dt.datetime(2000 + yy, month_num, day, 8, tzinfo=dt.timezone.utc)
+    return dt_exp.timestamp()
+
+
+@functools.lru_cache(maxsize=None)
+def instrument_fields(name: str) -> Optional[Tuple[float, float, int]]:
+    """(strike, expiry_ts, option_type) for an option name like BTC-27JUN25-60000-C, else None."""
+    parts = name.split("-")
+    if len(parts) < 3:
+        return None
+    try:
+        strike = float(parts[2])
+        exp = expiry_ts(name)
+    except ValueError:
+        return None
+    option_type = 1 if "-C-" in name or name.endswith("-C") else (0 if name.endswith("-P") else 1)
+    return strike, exp, option_type
+
+
+def _f(v) -> float:
+    return _NAN if v is None else float(v)
+
+
+class InstrumentRegistry:
+    """Dense id ↔ name map. ids index straight into `names`."""
+
+    def __init__(self):
+        self.ids: Dict[str, int] = {}
+        self.names: List[Optional[str]] = []
+
+    def __len__(self):
+        return len(self.ids)
+
+    def _set(self, name: str, inst_id: int):
+        if inst_id >= len(self.names):
+            self.names.extend([None] * (inst_id + 1 - len(self.names)))
+        old = self.names[inst_id]
+        if old is not None and old != name and self.ids.get(old) == inst_id:
+            del self.ids[old]
+        self.names[inst_id] = name
+        self.ids[name] = inst_id
+
+    def load(self, mapping: dict):
+        """Merge a HGETALL result (name → id, bytes or str)."""
+        for name, inst_id in mapping.items():
+            self._set(name.decode() if isinstance(name, bytes) else name, int(inst_id))
+
+    def replace(self, mapping: dict):
+        """Drop everything and load a HGETALL result (the Redis hash is authoritative)."""
+        self.ids.clear()
+        self.names.clear()
+        self.load(mapping)
+
+    def assign(self, name: str) -> Tuple[int, bool]:
+        inst_id = self.ids.get(name)
+        if inst_id is not None:
+            return inst_id, False
+        inst_id = len(self.names)
+        self._set(name, inst_id)
+        return inst_id, True
+
+    def name(self, inst_id: int) -> Optional[str]:
+        return self.names[inst_id] if inst_id < len(self.names) else None
+
+
+async def register_names(redis, registry: InstrumentRegistry, names) -> int:
+    """
+    Makes sure every name in `names` has an id in `registry` that matches Redis. Unknown names
+    are allocated atomically by REGISTER_SCRIPT, so two writers never give one id to two names.
+    If Redis returns an id this registry already holds under another name (it was written by a
+    process we have not reloaded from), the whole registry is reloaded. Returns how many names
+    were new to `registry`.
+
+    Clients without EVAL (single_process.InProcessBus, the only writer in that mode) fall back
+    to local assignment plus HSET, and move the sequence key past the ids they took so a later
+    EVAL writer on the same Redis does not hand them out again.
+    """
+    unknown = list(dict.fromkeys(n for n in names if n and n not in registry.ids and instrument_fields(n)))
+    if not unknown:
+        return 0
+    if getattr(redis, "eval", None) is None:
+        for name in unknown:
+            inst_id, _ = registry.assign(name)
+            await redis.hset(INSTRUMENT_REGISTRY_KEY, name, inst_id)
+        await redis.set(INSTRUMENT_REGISTRY_SEQ_KEY, len(registry.names))
+        return len(unknown)
+    ids = await redis.eval(REGISTER_SCRIPT, 2, INSTRUMENT_REGISTRY_KEY, INSTRUMENT_REGISTRY_SEQ_KEY, *unknown)
+    if any(registry.name(int(i)) not in (None, n) for n, i in zip(unknown, ids)):
+        registry.replace(await redis.hgetall(INSTRUMENT_REGISTRY_KEY))
+    else:
+        for name, inst_id in zip(unknown, ids):
+            registry._set(name, int(inst_id))
+    return len(unknown)
+
+
+class TickEncoder:
+    """
+    Collector side. encode() returns (record bytes or None, (name, id) if newly registered).
+    Writers sharing Redis call register_names first, so encode() finds every id already
+    allocated; otherwise the caller must persist new registrations before the record's XADD.
+    """
+
+    def __init__(self, registry: Optional[InstrumentRegistry] = None):
+        self.registry = registry if registry is not None else InstrumentRegistry()
+
+    def encode(self, channel: str, data: dict) -> Tuple[Optional[bytes], Optional[Tuple[str, int]]]:
+        if not isinstance(data, dict):
+            return None, None
+        ts_ms = int(data.get("timestamp") or time.time() * 1000)
+
+        if channel.startswith("deribit_price_index."):
+            px = float(data.get("price") or data.get("index_price") or 0.0)
+            return _RECORD.pack(KIND_INDEX, 0, 0, ts_ms, _NAN, _NAN, _NAN, _NAN, _NAN, px,
+                                _NAN, _NAN, _NAN, _NAN), None
+
+        if channel.startswith("ticker."):
+            name = data.get("instrument_name")
+            fields = instrument_fields(name) if name else None
+            if fields is None:
+                return None, None
+            strike, exp, option_type = fields
+            inst_id, is_new = self.registry.assign(name)
+            g = data.get("greeks") or {}
+            rec = _RECORD.pack(
+                KIND_TICKER, option_type, inst_id, ts_ms, strike, exp,
+                float(data.get("mark_iv") or 0.0), float(data.get("open_interest") or 0.0),
+                float(data.get("mark_price") or 0.0), _f(data.get("index_price")),
+                _f(g.get("gamma")), _f(g.get("vanna")), _f(g.get("charm")), _f(g.get("volga")),
+            )
+            return rec, ((name, inst_id) if is_new else None)
+
+        return None, None
+
+    def encode_trades(self, trades: list) -> Tuple[bytes, List[Tuple[str, int]]]:
+        """All option trades of one trades.* notification → (concatenated records, new registrations)."""
+        out, new = [], []
+        for tr in trades if isinstance(trades, list) else ():
+            name = tr.get("instrument_name") if isinstance(tr, dict) else None
+            fields = instrument_fields(name) if name else None
+            if fields is None:
+                continue
+            strike, exp, option_type = fields
+            inst_id, is_new = self.registry.assign(name)
+            if is_new:
+                new.append((name, inst_id))
+            amount = float(tr.get("amount") or 0.0)
+            out.append(_RECORD.pack(
+                KIND_TRADE, option_type, inst_id, int(tr.get("timestamp") or time.time() * 1000), strike, exp,
+                _f(tr.get("iv")), amount if tr.get("direction") == "buy" else -amount,
+                float(tr.get("price") or 0.0), _f(tr.get("index_price")), _NAN, _NAN, _NAN, _NAN,
+            ))
+        return b"".join(out), new
+
+
+def decode(buffers: List[bytes]) -> np.ndarray:
+    """One structured array for a batch of records (each buffer may hold one or more records)."""
+    if not buffers:
+        return np.empty(0, dtype=TICK_DTYPE)
+    return np.frombuffer(b"".join(buffers), dtype=TICK_DTYPE)
@@ -0,0 +1,107 @@
+# dealer_flow/trade_flow.py
+"""
+Customer net position per option from the trade tape → per-instrument dealer sign.
+
+Deribit trades carry the aggressor (taker) direction. Takers are treated as customers and the
+resting side as dealers: a taker buy of q contracts adds +q to the customer net position,
+a taker sell subtracts q. Ticker open interest reconciles the running total:
+    - OI falling from O to O' closes positions on both sides → net *= O' / O
+    - the customer side can never hold more than OI → net clamped to ±OI
+An instrument without trades yet has net 0 and keeps the default dealer sign.
+
+State is a handful of float64 arrays indexed by the collector's instrument id
+(tick_schema registry), grown by doubling. apply() walks a decoded dealer_raw batch in
+order in one numba pass, O(1) per trade or ticker record.
+"""
+import logging
+
+import numpy as np
+from numba import njit
+
+from dealer_flow.tick_schema import KIND_TICKER, KIND_TRADE
+
+logger = logging.getLogger(__name__)
+
+
+@njit
+def _apply(kind, inst_id, value, net, oi, gross, count):
+    for r in range(kind.shape[0]):
+        j = inst_id[r]
+        v = value[r]
+        if v != v:
+            continue
+        if kind[r] == KIND_TRADE:
+            net[j] += v
+            gross[j] += abs(v)
+            count[j] += 1
+        elif kind[r] == KIND_TICKER:
+            if v < 0:
+                continue
+            old = oi[j]
+            if old > 0 and v < old:
+                net[j] *= v / old
+            if net[j] > v:
+                net[j] = v
+            elif net[j] < -v:
+                net[j] = -v
+            oi[j] = v
+
+
+class TradeFlowBook:
+    def __init__(self, capacity: int = 1024):
+        self.net = np.zeros(capacity)    # customer net contracts (+ long)
+        self.oi = np.zeros(capacity)     # last ticker open interest
+        self.gross = np.zeros(capacity)  # contracts traded
+        self.count = np.zeros(capacity)  # trades seen
+
+    def _ensure(self, max_id: int):
+        size = len(self.net)
+        if max_id < size:
+            return
+        while size <= max_id:
+            size *= 2
+        for name in ("net", "oi", "gross", "count"):
+            old = getattr(self, name)
+            grown = np.zeros(size)
+            grown[:len(old)] = old
+            setattr(self, name, grown)
+
+    def apply(self, records: np.ndarray):
+        """Trade and ticker records (tick_schema.TICK_DTYPE) in arrival order; other kinds are ignored."""
+        sel = (records["kind"] == KIND_TRADE) | (records["kind"] == KIND_TICKER)
+        if not sel.any():
+            return
+        recs = records[sel]
+        ids = recs["inst_id"].astype(np.int64)
+        self._ensure(int(ids.max()))
+        _apply(recs["kind"], ids, recs["open_interest"].astype(np.float64), self.net, self.oi, self.gross, self.count)
+
+    def apply_one(self, kind: int, inst_id: int, value: float):
+        """JSON-path equivalent of apply() for a single trade (signed amount) or ticker (OI)."""
+        self._ensure(inst_id)
+        _apply(np.array([kind], np.uint8), np.array([inst_id], np.int64), np.array([value], np.float64),
+               self.net, self.oi, self.gross, self.count)
+
+    def evict(self, ids):
+        """Forgets settled instruments; their ids stay assigned in the registry."""
+        ids = np.asarray(ids, dtype=np.int64)
+        ids = ids[(ids >= 0) & (ids < len(self.net))]
+        for arr in (self.net, self.oi, self.gross, self.count):
+            arr[ids] = 0.0
+
+    def customer_net(self, ids: np.ndarray) -> np.ndarray:
+        """Customer net contracts for each id; unknown ids (or -1) → 0."""
+        ids = np.asarray(ids, dtype=np.int64)
+        known = (ids >= 0) & (ids < len(self.net))
+        out = np.zeros(len(ids))
+        out[known] = self.net[ids[known]]
+        return out
+
+    def stats(self) -> dict:
+        traded = self.count > 0
+        return {
+            "instruments_traded": int(traded.sum()),
+            "trades": int(self.count.sum()),
+            "customer_short": int((self.net < 0).sum()),
+            "customer_long": int((self.net > 0).sum()),
+        }
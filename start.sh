@@ -1,11 +1,6 @@
 #!/bin/sh
 set -e
 
-echo "Starting Deribit WebSocket collector..."
-python -m dealer_flow.deribit_ws &
-
-echo "Starting Processor..."
-python -m dealer_flow.processor &
-
-echo "Starting Uvicorn API server..."
-uvicorn dealer_flow.rest_service:app --host 0.0.0.0 --port 8000
\ No newline at end of file
+# Collector, liquidity feeds, processor, ClickHouse writer and API as supervised child
+# processes (restart with backoff, optional core pinning via RUN_CPUS).
+exec python -m dealer_flow run